@@ -0,0 +1,82 @@
+import os
+import random
+from typing import Dict, List, Tuple
+
+VOCABULARY = (
+    "transformer attention layer token embedding context window retrieval augmented generation "
+    "benchmark dataset evaluation fine tuning pretraining instruction alignment reward model policy "
+    "gradient loss perplexity decoder encoder sparse mixture experts quantization distillation latency "
+    "throughput inference scaling law parameter compute budget prompt chain reasoning hallucination"
+).split()
+ACRONYMS = ["LLM", "RLHF", "MoE", "RAG", "LoRA", "GPT", "BERT", "MMLU", "KV", "SFT", "DPO", "PPO"]
+
+
+def _escape(text: str) -> str:
+    return text.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+
+
+def write_pdf(path: str, pages: List[List[str]]):
+    """Write a minimal text-only PDF with one list of lines per page."""
+    objects = ["<< /Type /Catalog /Pages 2 0 R >>"]
+    kids = " ".join(f"{3 + 2 * i} 0 R" for i in range(len(pages)))
+    objects.append(f"<< /Type /Pages /Kids [{kids}] /Count {len(pages)} >>")
+    font = 3 + 2 * len(pages)
+    for i, lines in enumerate(pages):
+        objects.append(
+            f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] /Contents {4 + 2 * i} 0 R "
+            f"/Resources << /Font << /F1 {font} 0 R >> >> >>"
+        )
+        stream = "BT /F1 9 Tf 11 TL 36 760 Td " + "".join(f"({_escape(line)}) Tj T* " for line in lines) + "ET"
+        objects.append(f"<< /Length {len(stream)} >>\nstream\n{stream}\nendstream")
+    objects.append("<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>")
+
+    out = "%PDF-1.4\n"
+    offsets = []
+    for i, obj in enumerate(objects):
+        offsets.append(len(out))
+        out += f"{i + 1} 0 obj\n{obj}\nendobj\n"
+    xref = len(out)
+    out += f"xref\n0 {len(objects) + 1}\n0000000000 65535 f \n" + "".join(f"{offset:010d} 00000 n \n" for offset in offsets)
+    out += f"trailer\n<< /Size {len(objects) + 1} /Root 1 0 R >>\nstartxref\n{xref}\n%%EOF\n"
+    with open(path, "w", encoding="latin-1") as f:
+        f.write(out)
+
+
+def synthetic_page(rng: random.Random, doc: int, page: int, lines: int = 60, words_per_line: int = 12) -> List[str]:
+    """Deterministic pseudo-text for one page, mentioning its document id and some acronyms."""
+    page_lines = [f"Paper {doc} section {page}: {rng.choice(ACRONYMS)} {rng.choice(VOCABULARY)} study"]
+    for _ in range(lines - 1):
+        words = [rng.choice(ACRONYMS) if rng.random() < 0.08 else rng.choice(VOCABULARY) for _ in range(words_per_line)]
+        page_lines.append(" ".join(words))
+    return page_lines
+
+
+def generate_corpus(directory: str, documents: int = 20, pages: int = 10, seed: int = 0) -> List[str]:
+    """Generate a deterministic corpus of synthetic PDFs and return their paths."""
+    os.makedirs(directory, exist_ok=True)
+    rng = random.Random(seed)
+    paths = []
+    for doc in range(documents):
+        path = os.path.join(directory, f"paper_{doc:04d}.pdf")
+        write_pdf(path, [synthetic_page(rng, doc, page) for page in range(pages)])
+        paths.append(path)
+    return paths
+
+
+def page_headers(documents: int = 20, pages: int = 10, seed: int = 0) -> Dict[Tuple[int, int], str]:
+    """First line of every page of the corpus generate_corpus writes with the same arguments."""
+    rng = random.Random(seed)
+    return {
+        (doc, page): synthetic_page(rng, doc, page)[0]
+        for doc in range(documents)
+        for page in range(pages)
+    }
+
+
+def synthetic_questions(count: int, seed: int = 1) -> List[str]:
+    """Deterministic questions in the corpus vocabulary."""
+    rng = random.Random(seed)
+    return [
+        f"What does paper {rng.randrange(1000)} say about {rng.choice(ACRONYMS)} {rng.choice(VOCABULARY)} and {rng.choice(VOCABULARY)}?"
+        for _ in range(count)
+    ]
@@ -0,0 +1,100 @@
+import asyncio
+import hashlib
+import re
+import time
+from typing import Any, AsyncIterator, Iterator, List, Optional
+import numpy as np
+from langchain_core.callbacks import AsyncCallbackManagerForLLMRun, CallbackManagerForLLMRun
+from langchain_core.embeddings import Embeddings
+from langchain_core.language_models.llms import LLM
+from langchain_core.outputs import GenerationChunk
+
+
+def _seed(text: str) -> int:
+    return int.from_bytes(hashlib.sha256(text.encode("utf-8")).digest()[:8], "little")
+
+
+class FakeEmbeddings(Embeddings):
+    """Deterministic offline embeddings: hashed bag-of-words vectors.
+
+    Texts sharing words get similar vectors, so retrieval behaves plausibly.
+    `latency` seconds are slept per request to mimic the API round trip.
+    """
+    def __init__(self, size: int = 768, latency: float = 0.0):
+        """Initialize the fake embeddings."""
+        self.size = size
+        self.latency = latency
+        self.calls = 0
+
+    def _embed(self, text: str) -> List[float]:
+        vector = np.zeros(self.size, dtype=np.float32)
+        for word in re.findall(r"\w+", text.lower()):
+            seed = _seed(word)
+            vector[seed % self.size] += 1.0 if (seed >> 32) & 1 else -1.0
+        norm = float(np.linalg.norm(vector))
+        return (vector / norm if norm else vector).tolist()
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        """Embed a batch of texts."""
+        self.calls += 1
+        if self.latency:
+            time.sleep(self.latency)
+        return [self._embed(text) for text in texts]
+
+    def embed_query(self, text: str) -> List[float]:
+        """Embed a query."""
+        return self.embed_documents([text])[0]
+
+    async def aembed_query(self, text: str) -> List[float]:
+        """Embed a query without blocking the event loop."""
+        self.calls += 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        return self._embed(text)
+
+
+class FakeLLM(LLM):
+    """Deterministic offline LLM streaming a canned answer at a configurable token rate."""
+    first_token_latency: float = 0.0
+    tokens_per_second: float = 0.0
+    answer_tokens: int = 100
+    calls: int = 0
+
+    @property
+    def _llm_type(self) -> str:
+        return "fake-benchmark"
+
+    def _tokens(self, prompt: str) -> List[str]:
+        rng = np.random.default_rng(_seed(prompt))
+        words = re.findall(r"\w+", prompt) or ["answer"]
+        return [f"{words[i]} " for i in rng.integers(0, len(words), self.answer_tokens)]
+
+    def _call(self, prompt: str, stop: Optional[List[str]] = None, run_manager: Optional[CallbackManagerForLLMRun] = None, **kwargs: Any) -> str:
+        return "".join(chunk.text for chunk in self._stream(prompt, stop, run_manager, **kwargs))
+
+    def _stream(self, prompt: str, stop: Optional[List[str]] = None, run_manager: Optional[CallbackManagerForLLMRun] = None, **kwargs: Any) -> Iterator[GenerationChunk]:
+        self.calls += 1
+        if self.first_token_latency:
+            time.sleep(self.first_token_latency)
+        for i, token in enumerate(self._tokens(prompt)):
+            if i and self.tokens_per_second:
+                time.sleep(1 / self.tokens_per_second)
+            chunk = GenerationChunk(text=token)
+            if run_manager:
+                run_manager.on_llm_new_token(token, chunk=chunk)
+            yield chunk
+
+    async def _acall(self, prompt: str, stop: Optional[List[str]] = None, run_manager: Optional[AsyncCallbackManagerForLLMRun] = None, **kwargs: Any) -> str:
+        return "".join([chunk.text async for chunk in self._astream(prompt, stop, run_manager, **kwargs)])
+
+    async def _astream(self, prompt: str, stop: Optional[List[str]] = None, run_manager: Optional[AsyncCallbackManagerForLLMRun] = None, **kwargs: Any) -> AsyncIterator[GenerationChunk]:
+        self.calls += 1
+        if self.first_token_latency:
+            await asyncio.sleep(self.first_token_latency)
+        for i, token in enumerate(self._tokens(prompt)):
+            if i and self.tokens_per_second:
+                await asyncio.sleep(1 / self.tokens_per_second)
+            chunk = GenerationChunk(text=token)
+            if run_manager:
+                await run_manager.on_llm_new_token(token, chunk=chunk)
+            yield chunk
@@ -0,0 +1,199 @@
+import argparse
+import itertools
+import json
+import sqlite3
+import time
+import urllib.request
+from typing import Dict, List, Optional
+import numpy as np
+from weaviate.classes.config import Reconfigure
+from src.benchmarks.utils import percentiles
+from src.benchmarks.vector_backends import run_queries
+from src.config.config import Config
+from src.config.logs import logger
+from src.modules.bulk_import import WeaviateBulkWriter
+from src.modules.manifest import chunk_uuid
+from src.modules.vectorstore import collection_schema, connect_weaviate
+
+COLLECTION = "HnswTuning"
+
+
+def normalize(matrix: np.ndarray) -> np.ndarray:
+    """Scale rows to unit length."""
+    return matrix / np.maximum(np.linalg.norm(matrix, axis=1, keepdims=True), 1e-12)
+
+
+def cached_vectors(path: str, model: str, limit: int) -> np.ndarray:
+    """Real document vectors from the ingestion embedding cache (no API calls)."""
+    conn = sqlite3.connect(path)
+    try:
+        rows = conn.execute("SELECT vector FROM embeddings WHERE model = ? LIMIT ?", (model, limit)).fetchall()
+    finally:
+        conn.close()
+    if not rows:
+        raise ValueError(f"No {model} vectors in {path}")
+    return np.stack([np.frombuffer(blob, dtype=np.float32) for blob, in rows])
+
+
+def synthetic_vectors(count: int, dim: int, seed: int = 0) -> np.ndarray:
+    """Clustered vectors, closer to document embeddings than uniform noise."""
+    rng = np.random.default_rng(seed)
+    centers = rng.standard_normal((max(1, count // 50), dim), dtype=np.float32)
+    vectors = centers[rng.integers(0, len(centers), count)] + 0.6 * rng.standard_normal((count, dim), dtype=np.float32)
+    return normalize(vectors)
+
+
+def estimated_memory_mb(count: int, dims: int, quantization: str, max_connections: int, pq_segments: int) -> float:
+    """Estimated in-memory size of the HNSW index.
+
+    Quantized indexes keep only the compressed vectors in memory: PQ one byte per
+    segment, BQ one bit and SQ one byte per dimension. The graph holds up to
+    2 * maxConnections links per object on the bottom layer at about 10 bytes each.
+    """
+    vector_bytes = {
+        "none": dims * 4,
+        "pq": pq_segments or dims,
+        "bq": dims / 8,
+        "sq": dims,
+    }[quantization]
+    graph_bytes = 2 * max_connections * 10
+    return round(count * (vector_bytes + graph_bytes) / 2**20, 2)
+
+
+def heap_mb(metrics_url: Optional[str]) -> Optional[float]:
+    """Weaviate heap in use, read from its Prometheus endpoint when monitoring is enabled."""
+    if not metrics_url:
+        return None
+    try:
+        with urllib.request.urlopen(metrics_url, timeout=5) as response:
+            for line in response.read().decode().splitlines():
+                if line.startswith("go_memstats_heap_inuse_bytes "):
+                    return round(float(line.split()[1]) / 2**20, 2)
+    except OSError as e:
+        logger.warning(f"Could not read Weaviate metrics: {e}")
+    return None
+
+
+def tune(client, vectors: np.ndarray, queries: np.ndarray, truth: List[List[str]], k: int, settings: Dict,
+         efs: List[int], config: Config, metrics_url: Optional[str]) -> List[Dict]:
+    """Build one collection with the given settings and measure it at every query-time ef."""
+    dims = settings["dims"] or vectors.shape[1]
+    data = normalize(vectors[:, :dims])
+    query_data = normalize(queries[:, :dims])
+    tuning_config = config.model_copy(update={
+        "WEAVIATE_QUANTIZATION": settings["quantization"],
+        # Train the quantizer on the benchmark data even when it is smaller than the configured limit
+        "WEAVIATE_QUANTIZATION_TRAINING_LIMIT": min(config.WEAVIATE_QUANTIZATION_TRAINING_LIMIT, len(data)),
+        "HNSW_EF_CONSTRUCTION": settings["ef_construction"],
+        "HNSW_MAX_CONNECTIONS": settings["max_connections"],
+        "HNSW_EF": efs[0],
+    })
+    if client.collections.exists(COLLECTION):
+        client.collections.delete(COLLECTION)
+    heap_before = heap_mb(metrics_url)
+    client.collections.create_from_dict(collection_schema(tuning_config, COLLECTION))
+    try:
+        ids = [chunk_uuid(COLLECTION, str(dims), i) for i in range(len(data))]
+        id_to_row = {object_id: str(row) for row, object_id in enumerate(ids)}
+        writer = WeaviateBulkWriter.from_config(client, COLLECTION, tuning_config)
+        start = time.perf_counter()
+        failed = writer.write(ids, [""] * len(ids), [{} for _ in ids], data)
+        writer.collection.batch.wait_for_vector_indexing()
+        import_s = time.perf_counter() - start
+        heap_after = heap_mb(metrics_url)
+
+        def search(query):
+            result = writer.collection.query.near_vector(query.tolist(), limit=k, return_properties=[])
+            return [id_to_row[str(obj.uuid)] for obj in result.objects]
+
+        results = []
+        for ef in efs:
+            if ef != tuning_config.HNSW_EF:
+                writer.collection.config.update(vector_index_config=Reconfigure.VectorIndex.hnsw(ef=ef))
+            result = {
+                **settings,
+                "dims": dims,
+                "ef": ef,
+                "import_s": round(import_s, 3),
+                "objects_per_s": round(len(data) / import_s, 1),
+                "failed": len(failed),
+                "estimated_memory_mb": estimated_memory_mb(
+                    len(data), dims, settings["quantization"], settings["max_connections"], config.WEAVIATE_PQ_SEGMENTS
+                ),
+                **run_queries(search, query_data, truth, k),
+            }
+            if heap_before is not None and heap_after is not None:
+                result["heap_delta_mb"] = round(heap_after - heap_before, 2)
+            logger.info(f"HNSW tuning: {result}")
+            results.append(result)
+        return results
+    finally:
+        client.collections.delete(COLLECTION)
+
+
+def int_list(value: str) -> List[int]:
+    """Parse a comma-separated list of integers."""
+    return [int(item) for item in value.split(",")]
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Measure index memory, query latency and recall@k of Weaviate index settings against exact search."
+    )
+    parser.add_argument("--embeddings-cache", help="Use real vectors from this embedding cache instead of synthetic ones")
+    parser.add_argument("--vectors", type=int, default=20000)
+    parser.add_argument("--dim", type=int, default=768, help="Size of synthetic vectors")
+    parser.add_argument("--queries", type=int, default=200, help="Held-out vectors used as queries")
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--dims", type=int_list, default=[0], help="Output dimensionalities, 0 for full size")
+    parser.add_argument("--quantization", default="none,pq,bq,sq", help="Comma-separated quantizers")
+    parser.add_argument("--ef", type=int_list, default=[64, 128, 256], help="Query-time ef values")
+    parser.add_argument("--ef-construction", type=int_list, default=[128])
+    parser.add_argument("--max-connections", type=int_list, default=[32])
+    parser.add_argument("--metrics-url", help="Weaviate Prometheus endpoint, e.g. http://localhost:2112/metrics")
+    parser.add_argument("--output", help="Write the JSON results to this file")
+    args = parser.parse_args()
+
+    config = Config()
+    if args.embeddings_cache:
+        vectors = cached_vectors(args.embeddings_cache, config.EMBEDDINGS_MODEL_NAME, args.vectors + args.queries)
+    else:
+        vectors = synthetic_vectors(args.vectors + args.queries, args.dim)
+    rng = np.random.default_rng(0)
+    order = rng.permutation(len(vectors))
+    queries, vectors = vectors[order[:args.queries]], vectors[order[args.queries:]]
+
+    # Exact baseline at full size, so reduced dimensions are charged for the neighbours they lose
+    full, full_queries = normalize(vectors), normalize(queries)
+    truth, exact_latencies = [], []
+    for query in full_queries:
+        start = time.perf_counter()
+        truth.append([str(row) for row in np.argsort(-(full @ query))[:args.k]])
+        exact_latencies.append(time.perf_counter() - start)
+
+    report = {
+        "vectors": len(vectors),
+        "dim": vectors.shape[1],
+        "queries": len(queries),
+        "k": args.k,
+        "exact": {"latency_ms": percentiles(exact_latencies), "memory_mb": round(full.nbytes / 2**20, 2)},
+        "settings": [],
+    }
+    grid = itertools.product(args.dims, args.quantization.split(","), args.ef_construction, args.max_connections)
+    with connect_weaviate(config) as client:
+        for dims, quantization, ef_construction, max_connections in grid:
+            settings = {"dims": dims, "quantization": quantization, "ef_construction": ef_construction, "max_connections": max_connections}
+            try:
+                report["settings"].extend(tune(client, vectors, queries, truth, args.k, settings, args.ef, config, args.metrics_url))
+            except Exception as e:
+                logger.error(f"Error tuning {settings}: {e}")
+
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(output)
+    print(output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,184 @@
+import argparse
+import http.client
+import json
+import os
+import shutil
+import signal
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from typing import Dict, List
+from src.benchmarks.corpus import generate_corpus, synthetic_questions
+from src.benchmarks.fakes import FakeEmbeddings
+from src.benchmarks.utils import percentiles
+from src.config.config import Config
+from src.config.logs import logger
+from src.modules.load_documents import load_documents
+
+
+def chat_turn(conn: http.client.HTTPConnection, question: str, session_id: str, user_id: str, user_header: str) -> Dict:
+    """POST one question as `user_id` and read its SSE stream to the end."""
+    start = time.perf_counter()
+    conn.request(
+        "POST", "/chat",
+        body=json.dumps({"question": question, "session_id": session_id}),
+        headers={"Content-Type": "application/json", user_header: user_id},
+    )
+    response = conn.getresponse()
+    if response.status != 200:
+        response.read()
+        return {"status": response.status}
+    first = None
+    event = None
+    result = {"status": 200}
+    while True:
+        line = response.readline()
+        if not line:
+            break
+        line = line.decode("utf-8").rstrip("\n")
+        if line.startswith("event: "):
+            event = line[len("event: "):]
+        elif line.startswith("data: "):
+            data = json.loads(line[len("data: "):])
+            if event == "token" and first is None:
+                first = time.perf_counter() - start
+            elif event == "session":
+                result["session_id"] = data["session_id"]
+            elif event == "error":
+                result["error"] = data["detail"]
+    result["total"] = time.perf_counter() - start
+    result["ttft"] = first if first is not None else result["total"]
+    return result
+
+
+def run_user(port: int, user: int, questions: List[str], results: List[Dict], user_header: str = "X-User-Id"):
+    """One simulated user: a keep-alive connection asking its questions in one session."""
+    conn = http.client.HTTPConnection("127.0.0.1", port, timeout=120)
+    session_id = None
+    try:
+        for question in questions:
+            result = chat_turn(conn, question, session_id, f"load-user-{user}", user_header)
+            session_id = result.get("session_id", session_id)
+            results.append(result)
+    except Exception as e:
+        results.append({"status": "exception", "error": str(e)})
+    finally:
+        conn.close()
+
+
+def wait_ready(port: int, timeout: float = 60.0):
+    """Wait until the server answers /health."""
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            conn = http.client.HTTPConnection("127.0.0.1", port, timeout=2)
+            conn.request("GET", "/health")
+            if conn.getresponse().status == 200:
+                return
+        except OSError:
+            time.sleep(0.2)
+    raise TimeoutError(f"API not ready on port {port}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test the HTTP API locally with stand-in model backends.")
+    parser.add_argument("--users", type=int, default=50, help="Concurrent simulated users")
+    parser.add_argument("--turns", type=int, default=4, help="Questions per user")
+    parser.add_argument("--workers", type=int, default=2, help="API worker processes")
+    parser.add_argument("--max-concurrent-chats", type=int, default=32, help="Chat streams per worker")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--documents", type=int, default=10)
+    parser.add_argument("--pages", type=int, default=5)
+    parser.add_argument("--output", help="Write the JSON results to this file")
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="rag_load_")
+    env = {
+        **os.environ,
+        "VECTOR_STORE_BACKEND": "local",
+        "LOCAL_INDEX_PATH": os.path.join(workdir, "index"),
+        "MANIFEST_PATH": os.path.join(workdir, "manifest.json"),
+        "KEYWORD_INDEX_PATH": os.path.join(workdir, "keywords.db"),
+        "IMPORT_CHECKPOINT_PATH": os.path.join(workdir, "import_checkpoint.json"),
+        "EMBEDDING_CACHE_PATH": "",
+        "DB_PATH": os.path.join(workdir, "chat.db"),
+        "MODEL_BACKEND": "fake",
+        "API_MAX_CONCURRENT_CHATS": str(args.max_concurrent_chats),
+    }
+    server = None
+    try:
+        config = Config(
+            VECTOR_STORE_BACKEND="local",
+            LOCAL_INDEX_PATH=env["LOCAL_INDEX_PATH"],
+            MANIFEST_PATH=env["MANIFEST_PATH"],
+            KEYWORD_INDEX_PATH=env["KEYWORD_INDEX_PATH"],
+            IMPORT_CHECKPOINT_PATH=env["IMPORT_CHECKPOINT_PATH"],
+            EMBEDDING_CACHE_PATH="",
+        )
+        corpus_dir = os.path.join(workdir, "corpus")
+        generate_corpus(corpus_dir, args.documents, args.pages)
+        load_documents(os.path.join(corpus_dir, "*.pdf"), config, FakeEmbeddings())
+
+        server = subprocess.Popen(
+            [sys.executable, "-m", "src.modules.api", "--host", "127.0.0.1", "--port", str(args.port), "--workers", str(args.workers)],
+            env=env,
+        )
+        wait_ready(args.port)
+
+        questions = synthetic_questions(args.users * args.turns + 1)
+        results: List[Dict] = []
+        threads = [
+            threading.Thread(
+                target=run_user,
+                args=(args.port, user, questions[user * args.turns:(user + 1) * args.turns], results, config.API_USER_HEADER),
+            )
+            for user in range(args.users)
+        ]
+        start = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - start
+
+        ok = [result for result in results if result["status"] == 200 and "error" not in result]
+        report = {
+            "users": args.users,
+            "workers": args.workers,
+            "turns": len(results),
+            "ok": len(ok),
+            "rejected": sum(1 for result in results if result["status"] == 503),
+            "failed": len(results) - len(ok) - sum(1 for result in results if result["status"] == 503),
+            "turns_per_s": round(len(ok) / elapsed, 1),
+            "ttft_ms": percentiles([result["ttft"] for result in ok]),
+            "total_ms": percentiles([result["total"] for result in ok]),
+        }
+
+        # Graceful shutdown: SIGTERM while a turn is in flight, which should still complete
+        inflight: List[Dict] = []
+        thread = threading.Thread(target=run_user, args=(args.port, args.users, questions[-1:], inflight, config.API_USER_HEADER))
+        thread.start()
+        time.sleep(0.5)
+        start = time.perf_counter()
+        server.send_signal(signal.SIGTERM)
+        server.wait(timeout=60)
+        thread.join()
+        report["shutdown_s"] = round(time.perf_counter() - start, 3)
+        report["inflight_turn_completed"] = bool(inflight) and inflight[0].get("status") == 200 and "error" not in inflight[0]
+    finally:
+        if server is not None and server.poll() is None:
+            server.kill()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(output)
+    logger.info(f"Load test finished: {report['ok']}/{report['turns']} turns ok")
+    print(output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,116 @@
+import argparse
+import json
+import logging
+import os
+import random
+import shutil
+import tempfile
+import time
+from typing import Dict, List
+from src.benchmarks.corpus import generate_corpus, page_headers
+from src.benchmarks.fakes import FakeEmbeddings
+from src.benchmarks.utils import percentiles
+from src.config.config import Config
+from src.modules.keyword_index import KeywordIndex
+from src.modules.load_documents import load_documents
+from src.modules.retrieval import Retriever
+from src.modules.vectorstore import create_store_manager
+
+MODES = {
+    "vector": {"RETRIEVAL_MODE": "vector"},
+    "keyword": {"RETRIEVAL_MODE": "keyword"},
+    "hybrid": {"RETRIEVAL_MODE": "hybrid"},
+    "hybrid_mmr": {"RETRIEVAL_MODE": "hybrid", "MMR_ENABLED": True},
+}
+
+
+def evaluation_set(documents: int, pages: int, count: int, seed: int = 2) -> List[Dict]:
+    """Identifier-heavy questions, each answered by the first chunk of one known page."""
+    rng = random.Random(seed)
+    headers = page_headers(documents, pages)
+    questions = []
+    for doc, page in rng.sample(sorted(headers), min(count, len(headers))):
+        # "Paper 3 section 1: RLHF decoder study"
+        acronym, word = headers[(doc, page)].split(": ", 1)[1].split()[:2]
+        questions.append({
+            "question": f"What does paper {doc} section {page} report about {acronym} and {word}?",
+            "source": f"paper_{doc:04d}.pdf",
+            "prefix": headers[(doc, page)],
+        })
+    return questions
+
+
+def recall_at_k(config: Config, embeddings: FakeEmbeddings, keyword_index: KeywordIndex, questions: List[Dict], ks: List[int]) -> Dict:
+    """Recall@k and latency of one retrieval configuration."""
+    retriever = Retriever(config, keyword_index, document_embeddings=embeddings)
+    manager = create_store_manager(config)
+    hits = {k: 0 for k in ks}
+    latencies = []
+    try:
+        vectorstore = manager.vectorstore(embeddings)
+        for item in questions:
+            start = time.perf_counter()
+            documents = retriever.retrieve(vectorstore, item["question"], k=max(ks))
+            latencies.append(time.perf_counter() - start)
+            ranks = [
+                i for i, doc in enumerate(documents)
+                if os.path.basename(str(doc.metadata.get("source", ""))) == item["source"]
+                and doc.page_content.startswith(item["prefix"])
+            ]
+            for k in ks:
+                hits[k] += bool(ranks) and ranks[0] < k
+    finally:
+        manager.close()
+    return {
+        "recall": {f"@{k}": round(hits[k] / len(questions), 3) for k in ks},
+        "latency_ms": percentiles(latencies),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Recall-vs-k of vector, keyword, hybrid and hybrid+MMR retrieval on a synthetic corpus.")
+    parser.add_argument("--documents", type=int, default=50)
+    parser.add_argument("--pages", type=int, default=10)
+    parser.add_argument("--questions", type=int, default=200)
+    parser.add_argument("--ks", default="1,3,5,10,20")
+    parser.add_argument("--output", help="Write the JSON results to this file")
+    args = parser.parse_args()
+    logging.getLogger("rag").setLevel(logging.WARNING)
+    ks = [int(k) for k in args.ks.split(",")]
+
+    workdir = tempfile.mkdtemp(prefix="rag_recall_")
+    try:
+        base = {
+            "VECTOR_STORE_BACKEND": "local",
+            "LOCAL_INDEX_PATH": os.path.join(workdir, "index"),
+            "MANIFEST_PATH": os.path.join(workdir, "manifest.json"),
+            "KEYWORD_INDEX_PATH": os.path.join(workdir, "keywords.db"),
+            "IMPORT_CHECKPOINT_PATH": os.path.join(workdir, "import_checkpoint.json"),
+            "EMBEDDING_CACHE_PATH": "",
+        }
+        embeddings = FakeEmbeddings()
+        corpus_dir = os.path.join(workdir, "corpus")
+        generate_corpus(corpus_dir, args.documents, args.pages)
+        load_documents(os.path.join(corpus_dir, "*.pdf"), Config(**base), embeddings)
+
+        questions = evaluation_set(args.documents, args.pages, args.questions)
+        keyword_index = KeywordIndex(base["KEYWORD_INDEX_PATH"])
+        try:
+            results = {
+                mode: recall_at_k(Config(**base, **overrides), embeddings, keyword_index, questions, ks)
+                for mode, overrides in MODES.items()
+            }
+        finally:
+            keyword_index.close()
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    output = json.dumps({"questions": len(questions), "modes": results}, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(output)
+    print(output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,369 @@
+import argparse
+import asyncio
+import glob
+import json
+import logging
+import os
+import platform
+import shutil
+import tempfile
+import time
+import uuid
+from typing import Dict, List
+from src.benchmarks.corpus import generate_corpus, synthetic_questions
+from src.benchmarks.fakes import FakeEmbeddings, FakeLLM
+from src.benchmarks.utils import compare, git_commit, percentiles
+from src.config.config import Config
+from src.config.logs import logger
+from src.modules.context import pack_context
+from src.modules.db import Database
+from src.modules.load_documents import load_documents
+from src.modules.manifest import IngestionManifest
+from src.modules.rag import Rag
+from src.modules.render import StreamRenderer, render_markdown, to_html
+from src.modules.vectorstore import create_store_manager
+
+
+def bench_ingestion(config: Config, corpus_dir: str, embeddings: FakeEmbeddings, pages: int) -> Dict:
+    """Ingestion throughput of a fresh corpus, then the cost of an unchanged re-run."""
+    pattern = os.path.join(corpus_dir, "*.pdf")
+    documents = len(glob.glob(pattern))
+    start = time.perf_counter()
+    load_documents(pattern, config, embeddings)
+    elapsed = time.perf_counter() - start
+    chunks = sum(len(entry["chunk_ids"]) for entry in IngestionManifest(config.MANIFEST_PATH).load().entries.values())
+
+    calls = embeddings.calls
+    start = time.perf_counter()
+    load_documents(pattern, config, embeddings)
+    rerun = time.perf_counter() - start
+    return {
+        "documents": documents,
+        "pages": documents * pages,
+        "chunks": chunks,
+        "seconds": round(elapsed, 3),
+        "pages_per_s": round(documents * pages / elapsed, 1),
+        "chunks_per_s": round(chunks / elapsed, 1),
+        "rerun_seconds": round(rerun, 3),
+        "rerun_embedding_calls": embeddings.calls - calls,
+    }
+
+
+def bench_retrieval(config: Config, embeddings: FakeEmbeddings, questions: List[str], k: int = 5) -> Dict:
+    """Latency of vector search for distinct questions, and prompt context size before/after packing."""
+    manager = create_store_manager(config)
+    try:
+        store = manager.vectorstore(embeddings)
+        latencies, packing = [], []
+        raw_tokens, packed_tokens, passages = 0, 0, 0
+        for question in questions:
+            start = time.perf_counter()
+            documents = store.similarity_search(question, k=config.RETRIEVAL_CANDIDATES)
+            latencies.append(time.perf_counter() - start)
+            start = time.perf_counter()
+            _, stats = pack_context(documents, config.CONTEXT_TOKEN_BUDGET, config.CONTEXT_DUPLICATE_THRESHOLD)
+            packing.append(time.perf_counter() - start)
+            # Baseline: the raw top-k documents as they used to be put in the prompt
+            raw_tokens += sum(len(doc.page_content) + len(str(doc.metadata)) for doc in documents[:k]) // 4
+            packed_tokens += stats["tokens_packed"]
+            passages += stats["passages"]
+    finally:
+        manager.close()
+    return {
+        "queries": len(questions),
+        "latency_ms": percentiles(latencies),
+        "packing_ms": percentiles(packing),
+        "context_tokens_raw_top_k": round(raw_tokens / len(questions), 1),
+        "context_tokens_packed": round(packed_tokens / len(questions), 1),
+        "context_passages": round(passages / len(questions), 1),
+    }
+
+
+def bench_chat(rag: Rag, questions: List[str], turns_per_session: int) -> Dict:
+    """Time-to-first-token and total latency of get_response over multi-turn sessions."""
+    ttft, total = [], []
+    messages = []
+    session_id = str(uuid.uuid4())
+    for i, question in enumerate(questions):
+        if i % turns_per_session == 0:
+            session_id, messages = str(uuid.uuid4()), []
+        start = time.perf_counter()
+        first = None
+        answer = ""
+        for chunk in rag.get_response(question, session_id, messages):
+            if first is None:
+                first = time.perf_counter() - start
+            answer += chunk
+        total.append(time.perf_counter() - start)
+        ttft.append(first if first is not None else total[-1])
+        messages = messages + [{"role": "user", "content": question}, {"role": "bot", "content": answer}]
+        rag.db.save_session(session_id, messages, "benchmark")
+
+    # Repeat the first question of a fresh session to measure an answer cache hit
+    start = time.perf_counter()
+    list(rag.get_response(questions[0], str(uuid.uuid4()), []))
+    cached = time.perf_counter() - start
+    return {
+        "turns": len(questions),
+        "ttft_ms": percentiles(ttft),
+        "total_ms": percentiles(total),
+        "cached_answer_ms": round(cached * 1000, 3),
+        "cache": rag.cache_stats(),
+    }
+
+
+def bench_async_chat(rag: Rag, questions: List[str], concurrency: int) -> Dict:
+    """Time-to-first-token and total latency of aget_response with `concurrency` turns in flight."""
+    for cache in (rag.query_cache, rag.retrieval_cache, rag.answer_cache):
+        cache.clear()
+    ttft, total = [], []
+
+    async def turn(question: str, semaphore: asyncio.Semaphore):
+        async with semaphore:
+            start = time.perf_counter()
+            first = None
+            async for _ in rag.aget_response(question, str(uuid.uuid4()), []):
+                if first is None:
+                    first = time.perf_counter() - start
+            total.append(time.perf_counter() - start)
+            ttft.append(first if first is not None else total[-1])
+
+    async def run() -> float:
+        semaphore = asyncio.Semaphore(concurrency)
+        start = time.perf_counter()
+        try:
+            await asyncio.gather(*(turn(question, semaphore) for question in questions))
+        finally:
+            await rag.aclose()
+        return time.perf_counter() - start
+
+    elapsed = asyncio.run(run())
+    return {
+        "turns": len(questions),
+        "concurrency": concurrency,
+        "turns_per_s": round(len(questions) / elapsed, 1),
+        "ttft_ms": percentiles(ttft),
+        "total_ms": percentiles(total),
+    }
+
+
+def bench_burst(rag: Rag, questions: List[str], users: int, duplicates: int) -> Dict:
+    """A burst of concurrent async turns from `users` users, each question asked `duplicates` times.
+
+    Reports the model calls saved by coalescing identical turns and how long turns
+    queued for a generation slot.
+    """
+    for cache in (rag.query_cache, rag.retrieval_cache, rag.answer_cache):
+        cache.clear()
+    burst = [question for question in questions for _ in range(duplicates)]
+    calls = rag.model.calls
+    ttft, positions = [], []
+
+    async def turn(index: int, question: str):
+        start = time.perf_counter()
+        first = None
+        queued = [0]
+        async for _ in rag.aget_response(question, str(uuid.uuid4()), [], user_id=f"user-{index % users}", on_queued=queued.append):
+            if first is None:
+                first = time.perf_counter() - start
+        ttft.append(first if first is not None else time.perf_counter() - start)
+        positions.append(max(queued))
+
+    async def run() -> float:
+        start = time.perf_counter()
+        try:
+            await asyncio.gather(*(turn(index, question) for index, question in enumerate(burst)))
+        finally:
+            await rag.aclose()
+        return time.perf_counter() - start
+
+    elapsed = asyncio.run(run())
+    return {
+        "turns": len(burst),
+        "users": users,
+        "max_concurrent": rag.admission.max_concurrent,
+        "model_calls": rag.model.calls - calls,
+        "queued_turns": sum(1 for position in positions if position),
+        "max_queue_position": max(positions, default=0),
+        "turns_per_s": round(len(burst) / elapsed, 1),
+        "ttft_ms": percentiles(ttft),
+    }
+
+
+class _Placeholder:
+    """Stand-in for st.empty() counting redraws."""
+    def __init__(self):
+        self.draws = 0
+
+    def markdown(self, body: str, unsafe_allow_html: bool = False):
+        self.draws += 1
+
+
+def bench_rendering(answer_chars: int = 20000, chunk_chars: int = 20, history_messages: int = 200) -> Dict:
+    """Per-chunk cost of rendering a streamed answer, and of re-rendering the chat history on a rerun."""
+    paragraph = "Retrieval **augmented** generation with `embeddings`, attention and context windows. " * 4
+    answer = "\n\n".join(paragraph for _ in range(answer_chars // len(paragraph) + 1))[:answer_chars]
+    chunks = [answer[i:i + chunk_chars] for i in range(0, len(answer), chunk_chars)]
+
+    start = time.perf_counter()
+    text = ""
+    for chunk in chunks:
+        text += chunk
+        to_html(text)
+    full = time.perf_counter() - start
+
+    placeholder = _Placeholder()
+    renderer = StreamRenderer(placeholder)
+    start = time.perf_counter()
+    for chunk in chunks:
+        renderer.feed(chunk)
+    renderer.finish()
+    incremental = time.perf_counter() - start
+
+    history = [f"{paragraph}\n\n{i}" for i in range(history_messages)]
+    rerun = []
+    for _ in range(2):
+        start = time.perf_counter()
+        for message in history:
+            render_markdown(message)
+        rerun.append(time.perf_counter() - start)
+    return {
+        "chunks": len(chunks),
+        "full_reconvert_ms_per_chunk": round(full / len(chunks) * 1000, 4),
+        "incremental_ms_per_chunk": round(incremental / len(chunks) * 1000, 4),
+        "placeholder_draws": placeholder.draws,
+        "history_first_render_ms": round(rerun[0] * 1000, 3),
+        "history_rerun_ms": round(rerun[1] * 1000, 3),
+    }
+
+
+def bench_persistence(db_path: str, history_sizes: List[int], session_counts: List[int]) -> Dict:
+    """save_session latency versus conversation length, and get_user_sessions and search_messages latency versus history size."""
+    db = Database(db_path)
+    db.init_db()
+    save = {}
+    for size in history_sizes:
+        session_id = str(uuid.uuid4())
+        messages = [{"role": "user" if i % 2 == 0 else "bot", "content": f"message {i} " * 40} for i in range(size)]
+        db.save_session(session_id, messages, "persistence")
+        latencies = []
+        for _ in range(20):
+            messages = messages + [{"role": "user", "content": "follow up " * 40}, {"role": "bot", "content": "answer " * 80}]
+            start = time.perf_counter()
+            db.save_session(session_id, messages, "persistence")
+            latencies.append(time.perf_counter() - start)
+        save[str(size)] = percentiles(latencies)
+
+    sessions, search = {}, {}
+    created = 0
+    for count in session_counts:
+        user_id = f"user-{count}"
+        for i in range(count):
+            db.save_session(
+                str(uuid.uuid4()),
+                [{"role": "user", "content": f"question about topic{i % 50} " * 5}, {"role": "bot", "content": "answer " * 80}],
+                user_id,
+            )
+            created += 1
+        latencies = []
+        for _ in range(20):
+            start = time.perf_counter()
+            db.get_user_sessions(user_id)
+            latencies.append(time.perf_counter() - start)
+        sessions[str(count)] = percentiles(latencies)
+        latencies = []
+        for i in range(20):
+            start = time.perf_counter()
+            db.search_messages(user_id, f"topic{i}")
+            latencies.append(time.perf_counter() - start)
+        search[str(count)] = percentiles(latencies)
+    return {
+        "save_session_ms_by_history": save,
+        "get_user_sessions_ms_by_sessions": sessions,
+        "search_messages_ms_by_sessions": search,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline benchmarks for ingestion, retrieval, chat turns and persistence.")
+    parser.add_argument("--documents", type=int, default=20)
+    parser.add_argument("--pages", type=int, default=10)
+    parser.add_argument("--questions", type=int, default=50)
+    parser.add_argument("--turns-per-session", type=int, default=10)
+    parser.add_argument("--workers", type=int, default=0, help="Parser processes, 0 for one per core")
+    parser.add_argument("--embedding-latency", type=float, default=0.0, help="Seconds per fake embedding request")
+    parser.add_argument("--llm-first-token", type=float, default=0.0, help="Seconds before the fake LLM's first token")
+    parser.add_argument("--llm-tokens-per-second", type=float, default=0.0, help="Fake LLM streaming rate, 0 for unthrottled")
+    parser.add_argument("--concurrency", type=int, default=20, help="Concurrent turns in the async chat benchmark")
+    parser.add_argument("--burst-users", type=int, default=5, help="Users sharing the admission queue in the burst benchmark")
+    parser.add_argument("--burst-duplicates", type=int, default=3, help="Times each question is asked at once in the burst benchmark")
+    parser.add_argument("--history-sizes", default="10,100,1000")
+    parser.add_argument("--session-counts", default="10,100,1000")
+    parser.add_argument("--output", help="Write the JSON results to this file")
+    parser.add_argument("--compare", help="Baseline results JSON to compare against")
+    parser.add_argument("--keep", action="store_true", help="Keep the working directory")
+    args = parser.parse_args()
+    logging.getLogger("rag").setLevel(logging.WARNING)
+
+    workdir = tempfile.mkdtemp(prefix="rag_bench_")
+    try:
+        config = Config(
+            VECTOR_STORE_BACKEND="local",
+            LOCAL_INDEX_PATH=os.path.join(workdir, "index"),
+            MANIFEST_PATH=os.path.join(workdir, "manifest.json"),
+            KEYWORD_INDEX_PATH=os.path.join(workdir, "keywords.db"),
+            IMPORT_CHECKPOINT_PATH=os.path.join(workdir, "import_checkpoint.json"),
+            EMBEDDING_CACHE_PATH="",
+            INGEST_WORKERS=args.workers,
+        )
+        embeddings = FakeEmbeddings(latency=args.embedding_latency)
+        llm = FakeLLM(first_token_latency=args.llm_first_token, tokens_per_second=args.llm_tokens_per_second)
+        corpus_dir = os.path.join(workdir, "corpus")
+        generate_corpus(corpus_dir, args.documents, args.pages)
+        questions = synthetic_questions(args.questions)
+
+        results = {
+            "commit": git_commit(),
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "python": platform.python_version(),
+            "params": vars(args),
+        }
+        results["ingestion"] = bench_ingestion(config, corpus_dir, embeddings, args.pages)
+        results["retrieval"] = bench_retrieval(config, embeddings, questions)
+        rag = Rag(config, embeddings=embeddings, model=llm, db=Database(os.path.join(workdir, "chat.db")))
+        rag.db.init_db()
+        try:
+            results["chat"] = bench_chat(rag, questions, args.turns_per_session)
+            results["async_chat"] = bench_async_chat(rag, questions, args.concurrency)
+        finally:
+            rag.close()
+        # The async benchmarks close the engine's clients on their event loop: start a fresh engine
+        rag = Rag(config, embeddings=embeddings, model=llm, db=rag.db)
+        try:
+            results["burst"] = bench_burst(rag, questions[:args.concurrency], args.burst_users, args.burst_duplicates)
+        finally:
+            rag.close()
+        results["rendering"] = bench_rendering()
+        results["persistence"] = bench_persistence(
+            os.path.join(workdir, "persistence.db"),
+            [int(size) for size in args.history_sizes.split(",")],
+            [int(count) for count in args.session_counts.split(",")],
+        )
+    finally:
+        if args.keep:
+            logger.warning(f"Benchmark files kept in {workdir}")
+        else:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    output = json.dumps(results, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(output)
+    print(output)
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as f:
+            print("\n".join(compare(json.load(f), results)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,42 @@
+import subprocess
+from typing import Dict, List
+import numpy as np
+
+
+def percentiles(samples: List[float]) -> Dict[str, float]:
+    """p50/p95/p99 of latency samples in seconds, reported in milliseconds."""
+    if not samples:
+        return {}
+    values = np.asarray(samples) * 1000
+    return {f"p{p}": round(float(np.percentile(values, p)), 3) for p in (50, 95, 99)}
+
+
+def git_commit() -> str:
+    """Current git commit, so results can be compared between commits."""
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+    except Exception:
+        return "unknown"
+
+
+def flatten(results: Dict, prefix: str = "") -> Dict[str, float]:
+    """Flatten nested results into dotted keys, keeping numeric leaves only."""
+    flat = {}
+    for key, value in results.items():
+        name = f"{prefix}{key}"
+        if isinstance(value, dict):
+            flat.update(flatten(value, f"{name}."))
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            flat[name] = value
+    return flat
+
+
+def compare(baseline: Dict, current: Dict) -> List[str]:
+    """Human-readable relative change of every numeric metric present in both results."""
+    base, new = flatten(baseline), flatten(current)
+    lines = []
+    for key in sorted(base.keys() & new.keys()):
+        if base[key]:
+            change = (new[key] - base[key]) / abs(base[key]) * 100
+            lines.append(f"{key}: {base[key]} -> {new[key]} ({change:+.1f}%)")
+    return lines
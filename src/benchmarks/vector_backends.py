@@ -0,0 +1,121 @@
+import argparse
+import json
+import shutil
+import tempfile
+import time
+from typing import Callable, Dict, List
+import numpy as np
+from src.config.config import Config
+from src.config.logs import logger
+from src.modules.local_index import LocalVectorStore
+from src.benchmarks.utils import percentiles
+
+
+def run_queries(search: Callable[[np.ndarray], List[str]], queries: np.ndarray, truth: List[List[str]], k: int) -> Dict:
+    """Time `search` over all queries and compute recall@k against the exact results."""
+    latencies, recalls = [], []
+    for query, expected in zip(queries, truth):
+        start = time.perf_counter()
+        found = search(query)
+        latencies.append(time.perf_counter() - start)
+        recalls.append(len(set(found[:k]) & set(expected)) / k)
+    return {"latency_ms": percentiles(latencies), f"recall@{k}": round(float(np.mean(recalls)), 4)}
+
+
+def benchmark_local(vectors: np.ndarray, queries: np.ndarray, k: int, ivf_lists: int, ivf_probes: int) -> Dict:
+    """Benchmark the local index: exact search, then IVF search."""
+    path = tempfile.mkdtemp(prefix="local_index_bench_")
+    ids = [str(i) for i in range(len(vectors))]
+    try:
+        store = LocalVectorStore(path, embedding=None, ivf_probes=ivf_probes)
+        start = time.perf_counter()
+        for i in range(0, len(vectors), 10000):
+            store.add_vectors(vectors[i:i + 10000], ids[i:i + 10000], [{} for _ in ids[i:i + 10000]], ids[i:i + 10000])
+        insert_s = time.perf_counter() - start
+        store.close()
+
+        start = time.perf_counter()
+        store = LocalVectorStore(path, embedding=None, ivf_probes=ivf_probes)
+        open_ms = (time.perf_counter() - start) * 1000
+
+        def search(query):
+            return [ids[row] for row, _ in store.search_by_vector(query, k)]
+
+        truth = [search(query) for query in queries]
+        results = {
+            "insert_s": round(insert_s, 3),
+            "open_ms": round(open_ms, 3),
+            "exact": run_queries(search, queries, truth, k),
+        }
+        if ivf_lists:
+            start = time.perf_counter()
+            store.build_ivf(ivf_lists)
+            results["ivf_build_s"] = round(time.perf_counter() - start, 3)
+            results[f"ivf_{ivf_lists}_lists_{ivf_probes}_probes"] = run_queries(search, queries, truth, k)
+        store.close()
+        return results, truth
+    finally:
+        shutil.rmtree(path, ignore_errors=True)
+
+
+def benchmark_weaviate(vectors: np.ndarray, queries: np.ndarray, truth: List[List[str]], k: int) -> Dict:
+    """Benchmark the configured Weaviate instance on the same vectors."""
+    from weaviate.classes.config import Configure, VectorDistances
+    from weaviate.util import generate_uuid5
+    from src.modules.vectorstore import connect_weaviate
+
+    name = "BenchmarkVectors"
+    with connect_weaviate(Config()) as client:
+        if client.collections.exists(name):
+            client.collections.delete(name)
+        collection = client.collections.create(
+            name,
+            vector_config=Configure.Vectors.self_provided(
+                vector_index_config=Configure.VectorIndex.hnsw(distance_metric=VectorDistances.COSINE)
+            ),
+        )
+        try:
+            start = time.perf_counter()
+            with collection.batch.fixed_size(batch_size=500) as batch:
+                for i, vector in enumerate(vectors):
+                    batch.add_object(properties={"n": i}, uuid=generate_uuid5(i), vector=vector.tolist())
+            insert_s = time.perf_counter() - start
+            id_to_n = {str(generate_uuid5(i)): str(i) for i in range(len(vectors))}
+
+            def search(query):
+                result = collection.query.near_vector(query.tolist(), limit=k)
+                return [id_to_n[str(obj.uuid)] for obj in result.objects]
+
+            return {"insert_s": round(insert_s, 3), "hnsw": run_queries(search, queries, truth, k)}
+        finally:
+            client.collections.delete(name)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the local vector index against Weaviate.")
+    parser.add_argument("--vectors", type=int, default=20000)
+    parser.add_argument("--dim", type=int, default=768)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--ivf-lists", type=int, default=128)
+    parser.add_argument("--ivf-probes", type=int, default=8)
+    parser.add_argument("--weaviate", action="store_true", help="Also benchmark the configured Weaviate instance")
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    vectors = rng.standard_normal((args.vectors, args.dim), dtype=np.float32)
+    # Queries near existing vectors, like real questions near their answers
+    queries = vectors[rng.choice(args.vectors, args.queries)] + 0.5 * rng.standard_normal((args.queries, args.dim), dtype=np.float32)
+
+    local, truth = benchmark_local(vectors, queries, args.k, args.ivf_lists, args.ivf_probes)
+    results = {"vectors": args.vectors, "dim": args.dim, "queries": args.queries, "local": local}
+    if args.weaviate:
+        try:
+            results["weaviate"] = benchmark_weaviate(vectors, queries, truth, args.k)
+        except Exception as e:
+            logger.error(f"Error benchmarking Weaviate: {e}")
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
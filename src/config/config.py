@@ -8,6 +8,74 @@ class Config(BaseSettings):
     CHUNK_OVERLAP: int = 200
     WEAVIATE_URL: str = ""
     WEAVIATE_API_KEY: str = ""
+    WEAVIATE_GRPC_PORT: int = 50051
+    EMBEDDING_DIMENSIONS: int = 0
+    WEAVIATE_QUANTIZATION: str = "none"
+    WEAVIATE_PQ_SEGMENTS: int = 0
+    WEAVIATE_QUANTIZATION_TRAINING_LIMIT: int = 100000
+    WEAVIATE_RESCORE_LIMIT: int = 0
+    HNSW_EF: int = -1
+    HNSW_EF_CONSTRUCTION: int = 128
+    HNSW_MAX_CONNECTIONS: int = 32
+    CORPUS: str = "default"
+    CORPUS_PARTITIONING: str = "collections"
+    CORPUS_TENANT_COLLECTION: str = "Corpora"
+    CORPUS_IDLE_SECONDS: int = 0
+    CORPUS_IDLE_STATUS: str = "inactive"
+    VECTOR_STORE_BACKEND: str = "weaviate"
+    LOCAL_INDEX_PATH: str = "local_index"
+    LOCAL_INDEX_IVF_LISTS: int = 0
+    LOCAL_INDEX_IVF_PROBES: int = 8
+    MANIFEST_PATH: str = "ingestion_manifest.json"
+    INGEST_WORKERS: int = 0
+    INGEST_BATCH_SIZE: int = 200
+    INGEST_QUEUE_SIZE: int = 4
+    IMPORT_CHECKPOINT_PATH: str = "import_checkpoint.json"
+    WEAVIATE_BATCH_MODE: str = "fixed_size"
+    WEAVIATE_BATCH_SIZE: int = 200
+    WEAVIATE_BATCH_CONCURRENCY: int = 2
+    WEAVIATE_BATCH_RETRIES: int = 3
+    EMBEDDING_CACHE_PATH: str = "embeddings_cache.db"
+    EMBED_BATCH_SIZE: int = 50
+    EMBED_CONCURRENCY: int = 4
+    EMBED_REQUESTS_PER_MINUTE: int = 0
+    EMBED_TOKENS_PER_MINUTE: int = 0
+    LLM_MAX_CONCURRENT: int = 8
+    LLM_QUEUE_TIMEOUT: float = 60.0
+    LLM_REQUESTS_PER_MINUTE: int = 0
+    LLM_TOKENS_PER_MINUTE: int = 0
+    LLM_RETRIES: int = 4
+    QUERY_CACHE_SIZE: int = 1024
+    QUERY_CACHE_TTL: int = 3600
+    ANSWER_CACHE_SIZE: int = 256
+    ANSWER_CACHE_TTL: int = 3600
+    HISTORY_MAX_TURNS: int = 6
+    HISTORY_TOKEN_BUDGET: int = 2000
+    HISTORY_SUMMARY_BATCH: int = 6
+    RETRIEVAL_MODE: str = "hybrid"
+    RETRIEVAL_CANDIDATES: int = 20
+    KEYWORD_INDEX_PATH: str = "keyword_index.db"
+    RRF_K: int = 60
+    HYBRID_KEYWORD_WEIGHT: float = 1.0
+    MMR_ENABLED: bool = False
+    MMR_LAMBDA: float = 0.7
+    CONTEXT_TOKEN_BUDGET: int = 1200
+    CONTEXT_DUPLICATE_THRESHOLD: float = 0.8
+    METRICS_ENABLED: bool = False
+    METRICS_PORT: int = 0
+    MODEL_BACKEND: str = "gemini"
+    DB_PATH: str = "chat_history.db"
+    API_HOST: str = "127.0.0.1"
+    API_PORT: int = 8000
+    API_WORKERS: int = 1
+    API_MAX_CONCURRENT_CHATS: int = 32
+    API_QUEUE_TIMEOUT: float = 10.0
+    API_HEARTBEAT_INTERVAL: float = 15.0
+    API_KEEPALIVE_TIMEOUT: int = 30
+    API_SHUTDOWN_TIMEOUT: int = 30
+    API_AUTH_TOKEN: str = ""
+    API_USER_HEADER: str = "X-User-Id"
+    API_STREAM_BUFFER: int = 64
 
     model_config = {
         "env_file": ".env",
@@ -0,0 +1,194 @@
+import functools
+import json
+import logging
+import threading
+import time
+from bisect import bisect_left
+from collections import deque
+from contextlib import contextmanager, nullcontext
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Optional, Tuple
+from src.config.config import Config
+
+request_logger = logging.getLogger("rag.requests")
+
+# Latency buckets in seconds, from sub-millisecond cache hits to slow LLM answers
+BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+_NOOP = nullcontext()
+
+
+def _label_key(labels: Dict[str, str]) -> Tuple:
+    return tuple(sorted((key, str(value)) for key, value in labels.items()))
+
+
+def _format_labels(key: Tuple, extra: str = "") -> str:
+    parts = [f'{name}="{value}"' for name, value in key]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+class Histogram:
+    """Cumulative-bucket histogram plus a bounded window of recent samples for percentiles."""
+    def __init__(self, window: int = 2048):
+        """Initialize an empty histogram."""
+        self.counts = [0] * (len(BUCKETS) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.recent = deque(maxlen=window)
+
+    def observe(self, value: float):
+        """Record one sample."""
+        self.counts[bisect_left(BUCKETS, value)] += 1
+        self.count += 1
+        self.sum += value
+        self.recent.append(value)
+
+    def percentile(self, p: float) -> float:
+        """Percentile over the recent samples window."""
+        if not self.recent:
+            return 0.0
+        values = sorted(self.recent)
+        return values[min(len(values) - 1, int(round(p / 100 * (len(values) - 1))))]
+
+
+class Metrics:
+    """Process-wide counters, latency histograms and tracing spans.
+
+    When disabled every call returns immediately, so instrumentation can stay in hot paths.
+    """
+    def __init__(self, enabled: bool = False):
+        """Initialize the registry."""
+        self.enabled = enabled
+        self._counters: Dict[Tuple[str, Tuple], float] = {}
+        self._histograms: Dict[Tuple[str, Tuple], Histogram] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, name: str, value: float = 1, **labels):
+        """Increment a counter."""
+        if not self.enabled:
+            return
+        key = (name, _label_key(labels))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def observe(self, name: str, seconds: float, **labels):
+        """Record a duration in a histogram."""
+        if not self.enabled:
+            return
+        key = (name, _label_key(labels))
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = Histogram()
+            histogram.observe(seconds)
+
+    def span(self, stage: str, trace: Optional[Dict] = None):
+        """Time a block as one stage; errors are counted and the duration is added to `trace`."""
+        if not self.enabled:
+            return _NOOP
+        return self._span(stage, trace)
+
+    @contextmanager
+    def _span(self, stage: str, trace: Optional[Dict]):
+        start = time.perf_counter()
+        try:
+            yield
+        except Exception:
+            # Cancellation (an abandoned async turn) is not an error of the stage
+            self.inc("rag_errors_total", stage=stage)
+            raise
+        finally:
+            elapsed = time.perf_counter() - start
+            self.observe("rag_stage_seconds", elapsed, stage=stage)
+            if trace is not None:
+                trace[stage] = round(trace.get(stage, 0) + elapsed * 1000, 3)
+
+    def timed(self, stage: str):
+        """Decorator timing every call of a function as `stage`."""
+        def decorator(fn):
+            @functools.wraps(fn)
+            def wrapper(*args, **kwargs):
+                if not self.enabled:
+                    return fn(*args, **kwargs)
+                with self._span(stage, None):
+                    return fn(*args, **kwargs)
+            return wrapper
+        return decorator
+
+    def log_request(self, **fields):
+        """Emit one structured (JSON) log line for a request."""
+        if self.enabled:
+            request_logger.info(json.dumps(fields, default=str))
+
+    def snapshot(self) -> Dict:
+        """Counters and p50/p95/p99 of every histogram, as plain data."""
+        with self._lock:
+            counters = {f"{name}{_format_labels(key)}": value for (name, key), value in self._counters.items()}
+            histograms = {
+                f"{name}{_format_labels(key)}": {
+                    "count": histogram.count,
+                    "p50": histogram.percentile(50),
+                    "p95": histogram.percentile(95),
+                    "p99": histogram.percentile(99),
+                }
+                for (name, key), histogram in self._histograms.items()
+            }
+        return {"counters": counters, "histograms": histograms}
+
+    def render_prometheus(self) -> str:
+        """Render all metrics in the Prometheus text exposition format."""
+        lines = []
+        with self._lock:
+            for name in sorted({name for name, _ in self._counters}):
+                lines.append(f"# TYPE {name} counter")
+                for (counter_name, key), value in self._counters.items():
+                    if counter_name == name:
+                        lines.append(f"{name}{_format_labels(key)} {value}")
+            for name in sorted({name for name, _ in self._histograms}):
+                lines.append(f"# TYPE {name} histogram")
+                for (histogram_name, key), histogram in self._histograms.items():
+                    if histogram_name != name:
+                        continue
+                    cumulative = 0
+                    for bound, count in zip(BUCKETS, histogram.counts):
+                        cumulative += count
+                        le = f'le="{bound}"'
+                        lines.append(f"{name}_bucket{_format_labels(key, le)} {cumulative}")
+                    le = 'le="+Inf"'
+                    lines.append(f"{name}_bucket{_format_labels(key, le)} {histogram.count}")
+                    lines.append(f"{name}_sum{_format_labels(key)} {histogram.sum}")
+                    lines.append(f"{name}_count{_format_labels(key)} {histogram.count}")
+                # Recent-window quantiles for quick reading without a Prometheus server
+                lines.append(f"# TYPE {name}_recent summary")
+                for (histogram_name, key), histogram in self._histograms.items():
+                    if histogram_name == name:
+                        for quantile in (50, 95, 99):
+                            label = f'quantile="{quantile / 100}"'
+                            lines.append(f"{name}_recent{_format_labels(key, label)} {histogram.percentile(quantile)}")
+        return "\n".join(lines) + "\n"
+
+
+def start_metrics_server(port: int) -> ThreadingHTTPServer:
+    """Serve /metrics in Prometheus format on a background thread."""
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split("?")[0] != "/metrics":
+                self.send_error(404)
+                return
+            body = metrics.render_prometheus().encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer(("0.0.0.0", port), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+metrics = Metrics(enabled=Config().METRICS_ENABLED)
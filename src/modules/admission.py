@@ -0,0 +1,270 @@
+import asyncio
+import threading
+import time
+from collections import OrderedDict, deque
+from contextlib import asynccontextmanager, contextmanager
+from typing import AsyncIterator, Callable, Dict, Hashable, Iterator, List, Optional, Tuple
+from src.config.logs import logger
+
+
+class AdmissionTimeout(TimeoutError):
+    """No generation slot became free within the queue timeout."""
+
+
+class Ticket:
+    """A turn waiting for, or holding, a generation slot."""
+    def __init__(self, user_id: str):
+        """Initialize the ticket."""
+        self.user_id = user_id
+        self.granted = False
+        self.waited = 0.0
+        self.wakeup: Optional[Tuple[asyncio.AbstractEventLoop, asyncio.Event]] = None
+
+
+class AdmissionController:
+    """Process-wide limit on concurrent model calls with a fair per-user queue.
+
+    Waiting turns are queued per user and free slots are handed out round-robin across
+    users, so one user's burst cannot starve everyone else. Slots can be taken from
+    threads (Streamlit sessions) and from event loops (the HTTP API) alike.
+    Args:
+        max_concurrent: Turns allowed to call the model at the same time.
+        queue_timeout: Seconds a turn may wait for a slot before AdmissionTimeout is raised.
+    """
+    def __init__(self, max_concurrent: int, queue_timeout: float = 60.0):
+        """Initialize the controller."""
+        self.max_concurrent = max_concurrent
+        self.queue_timeout = queue_timeout
+        self.active = 0
+        self._queues: "OrderedDict[str, deque]" = OrderedDict()
+        self._async_tickets = set()
+        self._cond = threading.Condition()
+
+    def _enqueue(self, user_id: str) -> Ticket:
+        ticket = Ticket(user_id)
+        if self.active < self.max_concurrent and not self._queues:
+            ticket.granted = True
+            self.active += 1
+        else:
+            self._queues.setdefault(user_id, deque()).append(ticket)
+        return ticket
+
+    def _dispatch(self):
+        """Grant free slots round-robin across users (FIFO within a user) and wake the waiters."""
+        while self.active < self.max_concurrent and self._queues:
+            user_id, queue = next(iter(self._queues.items()))
+            ticket = queue.popleft()
+            if queue:
+                self._queues.move_to_end(user_id)
+            else:
+                del self._queues[user_id]
+            ticket.granted = True
+            self.active += 1
+        self._cond.notify_all()
+        for ticket in self._async_tickets:
+            loop, event = ticket.wakeup
+            try:
+                loop.call_soon_threadsafe(event.set)
+            except RuntimeError:
+                # The waiter's event loop is gone; its ticket is released when it unwinds
+                pass
+
+    def _release(self, ticket: Ticket):
+        self._async_tickets.discard(ticket)
+        if ticket.granted:
+            self.active -= 1
+        else:
+            queue = self._queues.get(ticket.user_id)
+            if queue is not None:
+                queue.remove(ticket)
+                if not queue:
+                    del self._queues[ticket.user_id]
+        self._dispatch()
+
+    def _position(self, ticket: Ticket) -> int:
+        """Place of a waiting ticket in line (1 = next to be admitted)."""
+        index = self._queues[ticket.user_id].index(ticket)
+        # Every user gets one turn per round: count the tickets served in earlier rounds,
+        # then the users ahead of this one in the current round
+        position = sum(min(len(queue), index) for queue in self._queues.values())
+        for user_id, queue in self._queues.items():
+            if user_id == ticket.user_id:
+                break
+            if len(queue) > index:
+                position += 1
+        return position + 1
+
+    def _waiting_position(self, ticket: Ticket) -> Optional[int]:
+        with self._cond:
+            return None if ticket.granted else self._position(ticket)
+
+    @contextmanager
+    def slot(self, user_id: str, on_wait: Optional[Callable[[int], None]] = None) -> Iterator[Ticket]:
+        """Hold a slot for the duration of the block, queueing fairly while all are busy.
+
+        on_wait(position) is called whenever the turn's place in line changes.
+        """
+        start = time.monotonic()
+        with self._cond:
+            ticket = self._enqueue(user_id)
+        try:
+            reported = None
+            while True:
+                with self._cond:
+                    if ticket.granted:
+                        break
+                    position = self._position(ticket)
+                    if position == reported:
+                        remaining = start + self.queue_timeout - time.monotonic()
+                        if remaining <= 0:
+                            raise AdmissionTimeout(f"No generation slot free after {self.queue_timeout:g}s")
+                        self._cond.wait(remaining)
+                        continue
+                reported = position
+                if on_wait is not None:
+                    on_wait(position)
+            ticket.waited = time.monotonic() - start
+            yield ticket
+        finally:
+            with self._cond:
+                self._release(ticket)
+
+    @asynccontextmanager
+    async def aslot(self, user_id: str, on_wait: Optional[Callable[[int], None]] = None) -> AsyncIterator[Ticket]:
+        """Async variant of slot; waiting does not block the event loop."""
+        loop = asyncio.get_running_loop()
+        start = time.monotonic()
+        event = asyncio.Event()
+        with self._cond:
+            ticket = self._enqueue(user_id)
+            if not ticket.granted:
+                ticket.wakeup = (loop, event)
+                self._async_tickets.add(ticket)
+        try:
+            reported = None
+            while True:
+                position = self._waiting_position(ticket)
+                if position is None:
+                    break
+                if position != reported:
+                    reported = position
+                    if on_wait is not None:
+                        on_wait(position)
+                    continue
+                remaining = start + self.queue_timeout - time.monotonic()
+                if remaining <= 0:
+                    raise AdmissionTimeout(f"No generation slot free after {self.queue_timeout:g}s")
+                try:
+                    await asyncio.wait_for(event.wait(), remaining)
+                except asyncio.TimeoutError:
+                    pass
+                event.clear()
+            ticket.waited = time.monotonic() - start
+            yield ticket
+        finally:
+            with self._cond:
+                self._release(ticket)
+
+    def stats(self) -> Dict[str, int]:
+        """Turns holding a slot and turns waiting for one."""
+        with self._cond:
+            return {"active": self.active, "waiting": sum(len(queue) for queue in self._queues.values())}
+
+
+class Flight:
+    """One answer stream shared by every concurrent request for the same prompt."""
+    def __init__(self):
+        """Initialize an empty flight."""
+        self.chunks: List[str] = []
+        self.done = False
+        self.abandoned = False
+        self.status = "ok"
+        self._cond = threading.Condition()
+        self._waiters = set()
+
+    def _notify(self):
+        self._cond.notify_all()
+        for loop, event in list(self._waiters):
+            try:
+                loop.call_soon_threadsafe(event.set)
+            except RuntimeError:
+                pass
+
+    def publish(self, chunk: str):
+        """Hand a chunk to every follower."""
+        with self._cond:
+            self.chunks.append(chunk)
+            self._notify()
+
+    def finish(self, abandoned: bool = False, status: str = "ok"):
+        """End the stream; an abandoned flight stopped before the answer was complete.
+
+        status: How the leader's turn ended ("ok", or the error that the stream reports).
+        """
+        with self._cond:
+            self.done = True
+            self.abandoned = abandoned
+            self.status = status
+            self._notify()
+
+    def follow(self) -> Iterator[str]:
+        """Replay the chunks so far, then stream new ones until the flight ends."""
+        sent = 0
+        while True:
+            with self._cond:
+                while sent == len(self.chunks) and not self.done:
+                    self._cond.wait()
+                chunks = self.chunks[sent:]
+                done = self.done
+            yield from chunks
+            sent += len(chunks)
+            if done and sent == len(self.chunks):
+                return
+
+    async def afollow(self) -> AsyncIterator[str]:
+        """Async variant of follow."""
+        waiter = (asyncio.get_running_loop(), asyncio.Event())
+        with self._cond:
+            self._waiters.add(waiter)
+        try:
+            sent = 0
+            while True:
+                with self._cond:
+                    chunks = self.chunks[sent:]
+                    done = self.done
+                for chunk in chunks:
+                    yield chunk
+                sent += len(chunks)
+                if done and sent == len(self.chunks):
+                    return
+                if not chunks:
+                    await waiter[1].wait()
+                    waiter[1].clear()
+        finally:
+            with self._cond:
+                self._waiters.discard(waiter)
+
+
+class SingleFlight:
+    """Coalesces identical concurrent requests: the first one runs, the others follow its stream."""
+    def __init__(self):
+        """Initialize the registry of flights in progress."""
+        self._flights: Dict[Hashable, Flight] = {}
+        self._lock = threading.Lock()
+
+    def join(self, key: Hashable) -> Tuple[Flight, bool]:
+        """Return the flight for `key` and whether the caller leads it (must produce the stream)."""
+        with self._lock:
+            flight = self._flights.get(key)
+            if flight is not None and not flight.done:
+                return flight, False
+            flight = self._flights[key] = Flight()
+            return flight, True
+
+    def leave(self, key: Hashable, flight: Flight):
+        """Forget a finished flight; later requests are served by the answer cache."""
+        with self._lock:
+            if self._flights.get(key) is flight:
+                del self._flights[key]
+        if flight.abandoned:
+            logger.info("Shared answer stream abandoned by its leader")
@@ -0,0 +1,311 @@
+import argparse
+import asyncio
+import hmac
+import ipaddress
+import json
+import time
+import uuid
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Dict, Optional
+import uvicorn
+from fastapi import Depends, FastAPI, HTTPException, Query, Request
+from fastapi.responses import PlainTextResponse, StreamingResponse
+from pydantic import BaseModel
+from src.config.config import Config
+from src.config.logs import logger
+from src.config.metrics import metrics
+from src.modules.db import Database
+
+
+class ChatRequest(BaseModel):
+    """Body of POST /chat; the user is the authenticated caller."""
+    question: str
+    session_id: Optional[str] = None
+    corpus: Optional[str] = None
+    filters: Optional[Dict] = None
+
+
+class ChatSlot:
+    """One admitted chat stream; releasing it is idempotent."""
+    def __init__(self, semaphore: asyncio.Semaphore):
+        """Initialize the slot for an acquired semaphore."""
+        self._semaphore = semaphore
+        self._released = False
+
+    def release(self):
+        """Give the slot back."""
+        if not self._released:
+            self._released = True
+            self._semaphore.release()
+
+
+class SSEResponse(StreamingResponse):
+    """Streaming response that always closes its event stream and frees its chat slot.
+
+    The stream is closed even when the client disconnects before the first event,
+    so the turn is cancelled and the slot is not leaked.
+    """
+    media_type = "text/event-stream"
+
+    def __init__(self, content: AsyncIterator[str], slot: ChatSlot, **kwargs):
+        """Initialize the response."""
+        super().__init__(content, headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}, **kwargs)
+        self.slot = slot
+
+    async def __call__(self, scope, receive, send):
+        try:
+            await super().__call__(scope, receive, send)
+        finally:
+            await self.body_iterator.aclose()
+            self.slot.release()
+
+
+def sse_event(event: str, data: dict) -> str:
+    """Format one server-sent event."""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+def is_loopback(host: str) -> bool:
+    """Whether binding to `host` only accepts connections from this machine."""
+    if host == "localhost":
+        return True
+    try:
+        return ipaddress.ip_address(host).is_loopback
+    except ValueError:
+        return False
+
+
+def create_backends(config: Config) -> dict:
+    """Model backends for Config.MODEL_BACKEND: Gemini by default, offline stand-ins for load tests."""
+    if config.MODEL_BACKEND == "fake":
+        from src.benchmarks.fakes import FakeEmbeddings, FakeLLM
+        return {
+            "embeddings": FakeEmbeddings(latency=0.05),
+            "model": FakeLLM(first_token_latency=0.3, tokens_per_second=50),
+        }
+    if config.MODEL_BACKEND != "gemini":
+        raise ValueError(f"Unknown model backend: {config.MODEL_BACKEND}")
+    return {}
+
+
+def create_app(config: Optional[Config] = None) -> FastAPI:
+    """Build the HTTP API around one Rag engine and Database per worker process."""
+    config = config or Config()
+
+    @asynccontextmanager
+    async def lifespan(app: FastAPI):
+        from src.modules.rag import Rag
+        db = Database(config.DB_PATH)
+        db.init_db()
+        app.state.db = db
+        app.state.rag = Rag(config, db=db, **create_backends(config))
+        app.state.chat_slots = asyncio.Semaphore(config.API_MAX_CONCURRENT_CHATS)
+        logger.info(f"API worker ready ({config.MODEL_BACKEND} backend, {config.API_MAX_CONCURRENT_CHATS} concurrent chats)")
+        try:
+            yield
+        finally:
+            # In-flight streams have finished or hit the graceful shutdown timeout by now
+            await app.state.rag.aclose()
+            logger.info("API worker stopped")
+
+    app = FastAPI(title="RAG API", lifespan=lifespan)
+
+    def authenticated_user(request: Request) -> str:
+        """The calling user, as asserted by the authenticating proxy in front of the API.
+
+        With API_AUTH_TOKEN set, only callers presenting it as a bearer token (the proxy)
+        may assert an identity through the API_USER_HEADER header.
+        """
+        if config.API_AUTH_TOKEN:
+            authorization = request.headers.get("Authorization", "")
+            if not hmac.compare_digest(authorization.encode(), f"Bearer {config.API_AUTH_TOKEN}".encode()):
+                raise HTTPException(status_code=401, detail="Invalid or missing API token", headers={"WWW-Authenticate": "Bearer"})
+        user_id = request.headers.get(config.API_USER_HEADER, "").strip()
+        if not user_id:
+            raise HTTPException(status_code=401, detail=f"Missing {config.API_USER_HEADER} header")
+        return user_id
+
+    async def owned_session(request: Request, session_id: str, user_id: str) -> bool:
+        """Whether the session exists; 404 if it belongs to someone else (without revealing that it exists)."""
+        exists, owner = await asyncio.to_thread(request.app.state.db.get_session_owner, session_id)
+        if exists and owner != user_id:
+            raise HTTPException(status_code=404, detail="Session not found")
+        return exists
+
+    async def acquire_slot(request: Request) -> ChatSlot:
+        semaphore = request.app.state.chat_slots
+        try:
+            await asyncio.wait_for(semaphore.acquire(), timeout=config.API_QUEUE_TIMEOUT)
+        except asyncio.TimeoutError:
+            metrics.inc("api_rejected_total")
+            raise HTTPException(
+                status_code=503,
+                detail="Too many concurrent chats, retry later",
+                headers={"Retry-After": str(max(1, int(config.API_QUEUE_TIMEOUT)))},
+            )
+        return ChatSlot(semaphore)
+
+    async def chat_events(request: Request, body: ChatRequest, session_id: str, user_id: str) -> AsyncIterator[str]:
+        """Stream a turn as SSE events, sending keep-alive comments while the model is silent."""
+        from src.modules.rag import ANSWERED_STATUSES
+        rag = request.app.state.rag
+        # Bounded so a slow client holds back the model stream instead of buffering the whole answer
+        queue: asyncio.Queue = asyncio.Queue(maxsize=config.API_STREAM_BUFFER)
+        outcome = {}
+
+        def queued(position: int):
+            try:
+                queue.put_nowait(("queued", position))
+            except asyncio.QueueFull:
+                # Only the latest position matters; the client is behind anyway
+                pass
+
+        async def produce():
+            try:
+                async for chunk in rag.aget_response(
+                    body.question,
+                    session_id,
+                    user_id=user_id,
+                    on_queued=queued,
+                    corpus=body.corpus,
+                    filters=body.filters,
+                    outcome=outcome,
+                ):
+                    await queue.put(("token", chunk))
+                await queue.put(("done", None))
+            except Exception as e:
+                await queue.put(("error", e))
+
+        producer = asyncio.create_task(produce())
+        answer = ""
+        try:
+            yield sse_event("session", {"session_id": session_id})
+            while True:
+                try:
+                    kind, value = await asyncio.wait_for(queue.get(), timeout=config.API_HEARTBEAT_INTERVAL)
+                except asyncio.TimeoutError:
+                    yield ": keep-alive\n\n"
+                    continue
+                if kind == "token":
+                    answer += value
+                    yield sse_event("token", {"text": value})
+                elif kind == "queued":
+                    yield sse_event("queued", {"position": value})
+                elif kind == "error":
+                    logger.error(f"Chat stream failed for session {session_id}: {value}")
+                    yield sse_event("error", {"detail": str(value)})
+                    return
+                else:
+                    break
+            status = outcome.get("status", "ok")
+            if status in ANSWERED_STATUSES:
+                await asyncio.to_thread(
+                    request.app.state.db.append_messages,
+                    session_id,
+                    [{"role": "user", "content": body.question}, {"role": "bot", "content": answer}],
+                    user_id,
+                )
+            else:
+                # A rejection or error notice is not a reply worth keeping in the conversation
+                logger.info(f"Turn of session {session_id} ended with {status}, not saved")
+            yield sse_event("done", {"session_id": session_id, "status": status})
+        finally:
+            # Client went away or the server is stopping: abandon the turn
+            producer.cancel()
+
+    @app.post("/chat")
+    async def chat(body: ChatRequest, request: Request, user_id: str = Depends(authenticated_user)):
+        """Answer a question from a corpus, optionally filtered by source, pages or date, streaming tokens as server-sent events."""
+        from src.modules.corpora import MetadataFilter, resolve_corpus
+        try:
+            resolve_corpus(config, body.corpus)
+            MetadataFilter.from_dict(body.filters)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        # Session ids are issued here: a client may only continue one of its own sessions
+        if body.session_id and not await owned_session(request, body.session_id, user_id):
+            raise HTTPException(status_code=404, detail="Session not found")
+        slot = await acquire_slot(request)
+        session_id = body.session_id
+        if session_id is None:
+            session_id = str(uuid.uuid4())
+            try:
+                # Stored up front so the id stays usable even if this turn is not saved
+                await asyncio.to_thread(request.app.state.db.append_messages, session_id, [], user_id)
+            except BaseException:
+                slot.release()
+                raise
+        return SSEResponse(chat_events(request, body, session_id, user_id), slot)
+
+    @app.get("/sessions")
+    async def list_sessions(
+        request: Request,
+        user_id: str = Depends(authenticated_user),
+        limit: int = Query(20, ge=1, le=100),
+        offset: int = Query(0, ge=0),
+    ):
+        """Summaries of the caller's sessions, newest first."""
+        sessions = await asyncio.to_thread(request.app.state.db.get_user_sessions, user_id, limit, offset)
+        return {"sessions": sessions, "limit": limit, "offset": offset}
+
+    @app.get("/search")
+    async def search_messages(
+        request: Request,
+        q: str = Query(..., min_length=1),
+        limit: int = Query(20, ge=1, le=100),
+        offset: int = Query(0, ge=0),
+        user_id: str = Depends(authenticated_user),
+    ):
+        """The caller's messages matching the search terms, best first, with highlighted snippets."""
+        results = await asyncio.to_thread(request.app.state.db.search_messages, user_id, q, limit, offset)
+        return {"results": results, "limit": limit, "offset": offset}
+
+    @app.get("/sessions/{session_id}")
+    async def get_session(session_id: str, request: Request, user_id: str = Depends(authenticated_user)):
+        """Messages of one of the caller's sessions."""
+        if not await owned_session(request, session_id, user_id):
+            raise HTTPException(status_code=404, detail="Session not found")
+        messages = await asyncio.to_thread(request.app.state.db.get_session, session_id)
+        if not messages:
+            raise HTTPException(status_code=404, detail="Session not found")
+        return {"session_id": session_id, "messages": messages}
+
+    @app.get("/health")
+    async def health():
+        """Liveness probe."""
+        return {"status": "ok", "time": time.time()}
+
+    @app.get("/metrics", response_class=PlainTextResponse)
+    async def prometheus_metrics():
+        """Metrics of this worker in Prometheus format (empty unless METRICS_ENABLED)."""
+        return metrics.render_prometheus()
+
+    return app
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve the RAG engine over HTTP.")
+    config = Config()
+    parser.add_argument("--host", default=config.API_HOST)
+    parser.add_argument("--port", type=int, default=config.API_PORT)
+    parser.add_argument("--workers", type=int, default=config.API_WORKERS)
+    args = parser.parse_args()
+    if not is_loopback(args.host) and not config.API_AUTH_TOKEN:
+        logger.warning(
+            f"Serving on {args.host} without API_AUTH_TOKEN: anyone who can reach the API can act as any user "
+            f"through the {config.API_USER_HEADER} header"
+        )
+    # Each worker process builds its own app, Rag engine and database connections
+    uvicorn.run(
+        "src.modules.api:create_app",
+        factory=True,
+        host=args.host,
+        port=args.port,
+        workers=args.workers,
+        timeout_keep_alive=config.API_KEEPALIVE_TIMEOUT,
+        timeout_graceful_shutdown=config.API_SHUTDOWN_TIMEOUT,
+    )
+
+
+if __name__ == "__main__":
+    main()
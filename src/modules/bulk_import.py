@@ -0,0 +1,187 @@
+import datetime
+import json
+import os
+import time
+from typing import Dict, List, Optional, Set
+import weaviate
+from src.config.logs import logger
+
+BATCH_MODES = ("fixed_size", "dynamic")
+
+
+def _json_serializable(value):
+    """Weaviate properties cannot hold datetimes (same conversion as langchain-weaviate)."""
+    if isinstance(value, datetime.datetime):
+        return value.isoformat()
+    return value
+
+
+class ImportCheckpoint:
+    """Ids of the objects already stored for files whose import has not finished yet.
+
+    The manifest only records a file once all of its chunks are stored; the checkpoint
+    covers the chunks in between, so a restarted import neither re-embeds nor re-sends
+    them. Entries are keyed by the file's content hash and dropped once it is finished.
+    """
+    def __init__(self, path: str = "import_checkpoint.json"):
+        """Initialize the checkpoint; an empty path keeps it in memory only."""
+        self.path = path
+        self.files: Dict[str, Dict] = {}
+
+    def load(self) -> "ImportCheckpoint":
+        """Load the checkpoint from disk, starting empty if it does not exist."""
+        if self.path and os.path.exists(self.path):
+            with open(self.path, "r", encoding="utf-8") as f:
+                self.files = {
+                    source: {"sha256": entry["sha256"], "ids": set(entry["ids"])}
+                    for source, entry in json.load(f).get("files", {}).items()
+                }
+            if self.files:
+                logger.info(f"Resuming import of {len(self.files)} partially stored files")
+        return self
+
+    def save(self):
+        """Atomically write the checkpoint to disk, removing it when nothing is in progress."""
+        if not self.path:
+            return
+        if not self.files:
+            if os.path.exists(self.path):
+                os.remove(self.path)
+            return
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"files": {
+                source: {"sha256": entry["sha256"], "ids": sorted(entry["ids"])}
+                for source, entry in self.files.items()
+            }}, f)
+        os.replace(tmp_path, self.path)
+
+    def sources(self) -> List[str]:
+        """Return all files with a partial import."""
+        return list(self.files)
+
+    def written(self, source: str, content_hash: str) -> Set[str]:
+        """Ids already stored for this version of the file."""
+        entry = self.files.get(source)
+        return entry["ids"] if entry and entry["sha256"] == content_hash else set()
+
+    def stale(self, source: str, content_hash: str) -> Set[str]:
+        """Ids stored for another version of the file by an interrupted import."""
+        entry = self.files.get(source)
+        return entry["ids"] if entry and entry["sha256"] != content_hash else set()
+
+    def add(self, source: str, content_hash: str, ids: List[str]):
+        """Record stored objects of a file."""
+        entry = self.files.get(source)
+        if entry is None or entry["sha256"] != content_hash:
+            entry = self.files[source] = {"sha256": content_hash, "ids": set()}
+        entry["ids"].update(ids)
+
+    def remove(self, source: str) -> List[str]:
+        """Drop a file (finished or deleted) and return the ids recorded for it."""
+        entry = self.files.pop(source, None)
+        return sorted(entry["ids"]) if entry else []
+
+
+class WeaviateBulkWriter:
+    """Bulk import of pre-embedded chunks with the v4 client's gRPC batching.
+
+    Objects are sent under their deterministic chunk ids, so retrying or repeating a
+    write overwrites objects instead of duplicating them. Objects rejected by the server
+    are collected after each batch and retried with exponential backoff.
+    Args:
+        client: Connected Weaviate client.
+        index_name: Existing collection to write to.
+        mode: "fixed_size" (batch_size objects per request, concurrency requests in flight)
+            or "dynamic" (the client sizes batches from the server's queue length).
+        retries: Retries of rejected objects before they are reported as failed.
+        tenant: Tenant to write to in a multi-tenant collection.
+    """
+    def __init__(self, client: weaviate.WeaviateClient, index_name: str = "Documents", text_key: str = "text",
+                 mode: str = "fixed_size", batch_size: int = 200, concurrency: int = 2, retries: int = 3,
+                 backoff: float = 1.0, tenant: Optional[str] = None):
+        """Initialize the bulk writer."""
+        if mode not in BATCH_MODES:
+            raise ValueError(f"Unknown Weaviate batch mode: {mode}")
+        self.collection = client.collections.get(index_name)
+        if tenant:
+            self.collection = self.collection.with_tenant(tenant)
+        self.text_key = text_key
+        self.mode = mode
+        self.batch_size = batch_size
+        self.concurrency = concurrency
+        self.retries = retries
+        self.backoff = backoff
+        self.stats = {"objects": 0, "failed": 0, "retried": 0, "seconds": 0.0}
+
+    @classmethod
+    def from_config(cls, client: weaviate.WeaviateClient, index_name: str, config, tenant: Optional[str] = None) -> "WeaviateBulkWriter":
+        """Build the writer from the WEAVIATE_BATCH_* settings in Config."""
+        return cls(
+            client,
+            index_name,
+            mode=config.WEAVIATE_BATCH_MODE,
+            batch_size=config.WEAVIATE_BATCH_SIZE,
+            concurrency=config.WEAVIATE_BATCH_CONCURRENCY,
+            retries=config.WEAVIATE_BATCH_RETRIES,
+            tenant=tenant,
+        )
+
+    def _batch(self):
+        if self.mode == "dynamic":
+            return self.collection.batch.dynamic()
+        return self.collection.batch.fixed_size(batch_size=self.batch_size, concurrent_requests=self.concurrency)
+
+    def _send(self, objects: Dict[str, Dict]) -> Dict[str, str]:
+        """Send objects and return the error message of each rejected id."""
+        try:
+            with self._batch() as batch:
+                for object_id, obj in objects.items():
+                    batch.add_object(properties=obj["properties"], uuid=object_id, vector=obj["vector"])
+        except Exception as e:
+            # e.g. the connection dropped mid-batch: ids are deterministic, so resend everything
+            return {object_id: str(e) for object_id in objects}
+        return {
+            str(error.original_uuid or error.object_.uuid): error.message
+            for error in self.collection.batch.failed_objects
+        }
+
+    def write(self, ids: List[str], texts: List[str], metadatas: List[Dict], vectors: List[List[float]]) -> List[str]:
+        """Store objects, retrying rejected ones.
+
+        Returns:
+            The ids that still failed after all retries.
+        """
+        start = time.perf_counter()
+        objects = {}
+        for object_id, text, metadata, vector in zip(ids, texts, metadatas, vectors):
+            properties = {key: _json_serializable(value) for key, value in (metadata or {}).items()}
+            properties[self.text_key] = text
+            objects[object_id] = {"properties": properties, "vector": list(vector)}
+
+        pending = objects
+        for attempt in range(self.retries + 1):
+            errors = self._send(pending)
+            if not errors:
+                break
+            pending = {object_id: objects[object_id] for object_id in errors if object_id in objects}
+            if attempt < self.retries:
+                delay = self.backoff * 2 ** attempt
+                logger.warning(
+                    f"Weaviate rejected {len(errors)} objects, retrying in {delay:.1f}s: {next(iter(errors.values()))}"
+                )
+                self.stats["retried"] += len(errors)
+                time.sleep(delay)
+        failed = list(errors)
+        for object_id in failed[:5]:
+            logger.error(f"Failed to import object {object_id}: {errors[object_id]}")
+
+        self.stats["objects"] += len(objects) - len(failed)
+        self.stats["failed"] += len(failed)
+        self.stats["seconds"] += time.perf_counter() - start
+        return failed
+
+    @property
+    def objects_per_second(self) -> float:
+        """Stored objects per second spent writing."""
+        return self.stats["objects"] / self.stats["seconds"] if self.stats["seconds"] else 0.0
@@ -0,0 +1,123 @@
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, List, Optional
+from langchain_core.embeddings import Embeddings
+from src.config.metrics import metrics
+
+_MISSING = object()
+
+
+def normalize_question(question: str) -> str:
+    """Normalize a question for cache lookups (case, whitespace, trailing punctuation)."""
+    return re.sub(r"\s+", " ", question).strip().rstrip("?!. ").lower()
+
+
+def text_digest(text: str) -> str:
+    """Short stable digest of a text, used in cache keys."""
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()[:16]
+
+
+class TTLCache:
+    """Thread-safe LRU cache with a size bound, per-entry TTL and hit/miss counters."""
+    def __init__(self, maxsize: int = 1024, ttl: float = 3600):
+        """Initialize the cache."""
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._data: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        """Return a cached value, or default if missing or expired."""
+        with self._lock:
+            item = self._data.get(key, _MISSING)
+            if item is not _MISSING and (not self.ttl or time.monotonic() - item[1] < self.ttl):
+                self._data.move_to_end(key)
+                self.hits += 1
+                return item[0]
+            if item is not _MISSING:
+                del self._data[key]
+            self.misses += 1
+            return default
+
+    def set(self, key: Hashable, value: Any):
+        """Store a value, evicting the least recently used entries over maxsize."""
+        if self.maxsize <= 0:
+            return
+        with self._lock:
+            self._data[key] = (value, time.monotonic())
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def clear(self):
+        """Drop all entries (counters are kept)."""
+        with self._lock:
+            self._data.clear()
+
+    def stats(self) -> Dict[str, int]:
+        """Hit/miss counters and current size."""
+        return {"hits": self.hits, "misses": self.misses, "size": len(self._data)}
+
+
+class CachedQueryEmbeddings(Embeddings):
+    """Embeddings wrapper caching query vectors by normalized question text."""
+    def __init__(self, embeddings: Embeddings, cache: TTLCache):
+        """Initialize the wrapper."""
+        self.embeddings = embeddings
+        self.cache = cache
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        """Documents are not cached here, see BatchEmbeddings."""
+        return self.embeddings.embed_documents(texts)
+
+    def embed_query(self, text: str) -> List[float]:
+        """Return the cached vector of a query, embedding it on a miss."""
+        key = normalize_question(text)
+        vector = self.cache.get(key)
+        if vector is None:
+            with metrics.span("query_embedding"):
+                vector = self.embeddings.embed_query(text)
+            self.cache.set(key, vector)
+        return vector
+
+    async def aembed_query(self, text: str) -> List[float]:
+        """Async variant of embed_query."""
+        key = normalize_question(text)
+        vector = self.cache.get(key)
+        if vector is None:
+            with metrics.span("query_embedding"):
+                vector = await self.embeddings.aembed_query(text)
+            self.cache.set(key, vector)
+        return vector
+
+
+class CorpusVersion:
+    """Reads the corpus version written by ingestion, re-reading only when the manifest changes."""
+    def __init__(self, manifest_path: str):
+        """Initialize the corpus version reader."""
+        self.manifest_path = manifest_path
+        self._mtime: Optional[float] = None
+        self._version = ""
+
+    def get(self) -> str:
+        """Return the current corpus version ("" if nothing was ingested)."""
+        try:
+            mtime = os.stat(self.manifest_path).st_mtime
+        except OSError:
+            return ""
+        if mtime != self._mtime:
+            try:
+                with open(self.manifest_path, "r", encoding="utf-8") as f:
+                    self._version = json.load(f).get("version", "")
+                self._mtime = mtime
+            except (OSError, ValueError):
+                # Manifest is being rewritten, keep the previous version
+                pass
+        return self._version
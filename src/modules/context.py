@@ -0,0 +1,170 @@
+import os
+import re
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Set, Tuple
+from langchain_core.documents import Document
+from src.modules.embeddings import estimate_tokens
+
+# Shortest passage tail worth truncating into the remaining budget
+MIN_TRUNCATED_TOKENS = 100
+_WORD = re.compile(r"\w+")
+
+
+@dataclass
+class Passage:
+    """Merged text of one or more retrieved chunks from the same source page."""
+    text: str
+    rank: int
+    source: str
+    page: Optional[str]
+    start: Optional[int] = None
+    end: Optional[int] = None
+    chunks: int = 1
+    _shingles: Optional[Set[Tuple[str, ...]]] = field(default=None, repr=False)
+
+    @property
+    def shingles(self) -> Set[Tuple[str, ...]]:
+        if self._shingles is None:
+            words = _WORD.findall(self.text.lower())
+            self._shingles = {tuple(words[i:i + 3]) for i in range(max(1, len(words) - 2))}
+        return self._shingles
+
+    def citation(self) -> str:
+        """Compact citation: file name and page."""
+        name = os.path.basename(self.source) if self.source else "unknown source"
+        return f"{name}, p. {self.page}" if self.page else name
+
+
+def _page(metadata: Dict) -> Optional[str]:
+    """1-based page label of a chunk (PyPDF pages are 0-based)."""
+    if metadata.get("page_label"):
+        return str(metadata["page_label"])
+    if metadata.get("page") is not None:
+        return str(int(metadata["page"]) + 1)
+    return None
+
+
+def _join(first: str, second: str) -> Optional[str]:
+    """Join two chunks if `second` continues `first` with overlapping text, else None."""
+    if second in first:
+        return first
+    probe = second[:64]
+    position = first.rfind(probe)
+    if position >= 0 and first[position:] == second[:len(first) - position]:
+        return first[:position] + second
+    return None
+
+
+def _merge(passage: Passage, other: Passage) -> bool:
+    """Merge `other` into `passage` if they overlap or are adjacent in the source."""
+    merged = _join(passage.text, other.text)
+    if merged is not None:
+        text, start, end = merged, passage.start, max(filter(None, (passage.end, other.end)), default=None)
+    else:
+        merged = _join(other.text, passage.text)
+        if merged is not None:
+            text, start, end = merged, other.start, max(filter(None, (passage.end, other.end)), default=None)
+        elif passage.end is not None and other.start is not None and 0 <= other.start - passage.end <= 2:
+            text, start, end = f"{passage.text}\n{other.text}", passage.start, other.end
+        elif other.end is not None and passage.start is not None and 0 <= passage.start - other.end <= 2:
+            text, start, end = f"{other.text}\n{passage.text}", other.start, passage.end
+        else:
+            return False
+    passage.text, passage.start, passage.end = text, start, end
+    passage.rank = min(passage.rank, other.rank)
+    passage.chunks += other.chunks
+    passage._shingles = None
+    return True
+
+
+def _covered(passage: Passage, kept: Passage) -> float:
+    """Fraction of the passage's word 3-shingles already present in a kept passage."""
+    if not passage.shingles:
+        return 1.0
+    return len(passage.shingles & kept.shingles) / len(passage.shingles)
+
+
+def _truncate(text: str, tokens: int) -> str:
+    """Cut text to about `tokens` tokens at a sentence or word boundary."""
+    cut = text[:tokens * 4]
+    end = max(cut.rfind(". "), cut.rfind(".\n"))
+    if end < len(cut) // 2:
+        end = cut.rfind(" ")
+    if end <= 0:
+        # No boundary to cut at (e.g. a long URL or a table flattened without spaces)
+        return cut.rstrip() + " …"
+    return cut[:end + 1].rstrip() + " …"
+
+
+def pack_context(documents: List[Document], token_budget: int, duplicate_threshold: float = 0.8) -> Tuple[str, Dict]:
+    """Turn ranked retrieval candidates into a compact, deduplicated prompt context.
+
+    Overlapping and adjacent chunks of the same source page are merged, passages mostly
+    repeating a better-ranked one (share of word 3-shingles >= duplicate_threshold) are
+    dropped, and the rest are formatted as numbered text with a short citation, best
+    first, until the token budget is used up.
+    Args:
+        documents: Retrieved chunks, best first.
+        token_budget: Maximum estimated tokens of the packed context.
+        duplicate_threshold: Fraction of repeated text above which a lower-ranked passage is dropped.
+    Returns:
+        The context text and before/after statistics.
+    """
+    groups: Dict[Tuple[str, Optional[str]], List[Passage]] = {}
+    merged = 0
+    for rank, doc in enumerate(documents):
+        metadata = doc.metadata or {}
+        start = metadata.get("start_index")
+        start = int(start) if start is not None else None
+        passage = Passage(
+            text=doc.page_content.strip(),
+            rank=rank,
+            source=str(metadata.get("source", "")),
+            page=_page(metadata),
+            start=start,
+            end=start + len(doc.page_content) if start is not None else None,
+        )
+        group = groups.setdefault((passage.source, passage.page), [])
+        # A new chunk may bridge two passages already in the group, so keep merging
+        while True:
+            target = next((existing for existing in group if _merge(existing, passage)), None)
+            if target is None:
+                break
+            merged += 1
+            group.remove(target)
+            passage = target
+        group.append(passage)
+
+    # Best passages first; duplicates are only checked against passages that made it in
+    kept: List[Passage] = []
+    parts = []
+    duplicates = 0
+    used = 0
+    for passage in sorted((p for group in groups.values() for p in group), key=lambda p: p.rank):
+        if any(_covered(passage, other) >= duplicate_threshold for other in kept):
+            duplicates += 1
+            continue
+        header = f"[{len(parts) + 1}] ({passage.citation()})"
+        tokens = estimate_tokens(f"{header}\n{passage.text}\n\n")
+        if used + tokens > token_budget:
+            remaining = token_budget - used - estimate_tokens(header) - 1
+            if remaining >= MIN_TRUNCATED_TOKENS:
+                part = f"{header}\n{_truncate(passage.text, remaining)}"
+                parts.append(part)
+                used += estimate_tokens(part)
+            break
+        kept.append(passage)
+        parts.append(f"{header}\n{passage.text}")
+        used += tokens
+
+    context = "\n\n".join(parts)
+    stats = {
+        "candidates": len(documents),
+        "merged": merged,
+        "duplicates": duplicates,
+        "passages": len(parts),
+        # What the candidates cost as raw documents with their metadata
+        "tokens_raw": sum(len(doc.page_content) + len(str(doc.metadata)) for doc in documents) // 4,
+        "tokens_packed": estimate_tokens(context),
+    }
+    return context, stats
@@ -0,0 +1,246 @@
+import argparse
+import datetime
+import os
+import re
+import threading
+import time
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Tuple
+from weaviate.classes.query import Filter
+from src.config.config import Config
+from src.modules.vectorstore import WeaviateClientManager
+
+DEFAULT_CORPUS = "default"
+PARTITIONINGS = ("collections", "tenants")
+# CLI command -> tenant activity status
+TENANT_COMMANDS = {"activate": "active", "deactivate": "inactive", "offload": "offloaded"}
+_CORPUS_NAME = re.compile(r"^[A-Za-z0-9_]{1,64}$")
+
+
+def parse_date(value: Any) -> Optional[datetime.datetime]:
+    """Parse an ISO date or datetime (e.g. a PDF creation date) as UTC, None if it is not one."""
+    if isinstance(value, datetime.datetime):
+        parsed = value
+    elif isinstance(value, datetime.date):
+        parsed = datetime.datetime.combine(value, datetime.time())
+    else:
+        try:
+            parsed = datetime.datetime.fromisoformat(str(value).strip())
+        except ValueError:
+            return None
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=datetime.timezone.utc)
+    return parsed.astimezone(datetime.timezone.utc)
+
+
+@dataclass(frozen=True)
+class MetadataFilter:
+    """Restricts retrieval to chunks of some source files, a page range or a document date range.
+
+    Pages are 1-based and inclusive, as in citations; dates are inclusive days. The filter is
+    hashable so it can be part of cache keys.
+    """
+    sources: Tuple[str, ...] = ()
+    page_from: Optional[int] = None
+    page_to: Optional[int] = None
+    date_from: Optional[datetime.date] = None
+    date_to: Optional[datetime.date] = None
+
+    @classmethod
+    def from_dict(cls, filters: Optional[Dict]) -> Optional["MetadataFilter"]:
+        """Build a filter from keyword form, e.g. {"sources": [...], "page_from": 3, "date_from": "2024-01-01"}."""
+        if not filters:
+            return None
+        if isinstance(filters, MetadataFilter):
+            return filters
+        unknown = set(filters) - {"sources", "page_from", "page_to", "date_from", "date_to"}
+        if unknown:
+            raise ValueError(f"Unknown filters: {sorted(unknown)}")
+        sources = filters.get("sources") or ()
+        dates = {}
+        for key in ("date_from", "date_to"):
+            if filters.get(key):
+                parsed = parse_date(filters[key])
+                if parsed is None:
+                    raise ValueError(f"Invalid {key}: {filters[key]}")
+                dates[key] = parsed.date()
+        return cls(
+            sources=(sources,) if isinstance(sources, str) else tuple(sorted(sources)),
+            page_from=int(filters["page_from"]) if filters.get("page_from") is not None else None,
+            page_to=int(filters["page_to"]) if filters.get("page_to") is not None else None,
+            **dates,
+        )
+
+    def _date_bounds(self) -> Tuple[Optional[str], Optional[str]]:
+        """[start, end) of the date range as RFC 3339 strings, comparable with stored dates."""
+        start = f"{self.date_from.isoformat()}T00:00:00Z" if self.date_from else None
+        end = f"{(self.date_to + datetime.timedelta(days=1)).isoformat()}T00:00:00Z" if self.date_to else None
+        return start, end
+
+    def to_sql(self, column: str = "metadata") -> Tuple[str, List]:
+        """WHERE clause and parameters over a JSON metadata column (local index, keyword index)."""
+        clauses, params = [], []
+        if self.sources:
+            clauses.append(f"json_extract({column}, '$.source') IN ({','.join('?' * len(self.sources))})")
+            params.extend(self.sources)
+        # Stored pages are 0-based
+        if self.page_from is not None:
+            clauses.append(f"json_extract({column}, '$.page') >= ?")
+            params.append(self.page_from - 1)
+        if self.page_to is not None:
+            clauses.append(f"json_extract({column}, '$.page') <= ?")
+            params.append(self.page_to - 1)
+        start, end = self._date_bounds()
+        if start:
+            clauses.append(f"json_extract({column}, '$.date') >= ?")
+            params.append(start)
+        if end:
+            clauses.append(f"json_extract({column}, '$.date') < ?")
+            params.append(end)
+        return " AND ".join(clauses) or "1", params
+
+    def matches(self, metadata: Dict) -> bool:
+        """Whether a retrieved chunk's metadata passes the filter (the same test as to_sql)."""
+        if self.sources and metadata.get("source") not in self.sources:
+            return False
+        if self.page_from is not None or self.page_to is not None:
+            page = metadata.get("page")
+            if page is None:
+                return False
+            if self.page_from is not None and int(page) < self.page_from - 1:
+                return False
+            if self.page_to is not None and int(page) > self.page_to - 1:
+                return False
+        start, end = self._date_bounds()
+        if start or end:
+            date = parse_date(metadata["date"]) if metadata.get("date") else None
+            if date is None:
+                return False
+            if start and date < parse_date(start):
+                return False
+            if end and date >= parse_date(end):
+                return False
+        return True
+
+    def to_weaviate(self):
+        """Weaviate filter on the indexed source, page and date properties."""
+        filters = []
+        if self.sources:
+            filters.append(Filter.any_of([Filter.by_property("source").equal(source) for source in self.sources])
+                           if len(self.sources) > 1 else Filter.by_property("source").equal(self.sources[0]))
+        if self.page_from is not None:
+            filters.append(Filter.by_property("page").greater_or_equal(self.page_from - 1))
+        if self.page_to is not None:
+            filters.append(Filter.by_property("page").less_or_equal(self.page_to - 1))
+        start, end = self._date_bounds()
+        if start:
+            filters.append(Filter.by_property("date").greater_or_equal(parse_date(start)))
+        if end:
+            filters.append(Filter.by_property("date").less_than(parse_date(end)))
+        if not filters:
+            return None
+        return filters[0] if len(filters) == 1 else Filter.all_of(filters)
+
+
+@dataclass(frozen=True)
+class Corpus:
+    """A named partition of the documents and where it lives.
+
+    Args:
+        name: Corpus name.
+        index_name: Weaviate collection (or local index directory) holding its chunks.
+        tenant: Weaviate tenant of the corpus when corpora are tenants of one collection.
+        config: Config with this corpus' manifest, import checkpoint and keyword index paths.
+    """
+    name: str
+    index_name: str
+    tenant: Optional[str]
+    config: Config
+
+    @property
+    def store_kwargs(self) -> Dict:
+        """Keyword arguments scoping vectorstore calls (add, delete, search) to the corpus."""
+        return {"tenant": self.tenant} if self.tenant else {}
+
+
+def _suffixed(path: str, name: str) -> str:
+    """Per-corpus variant of a file path: ingestion_manifest.json -> ingestion_manifest.<name>.json."""
+    if not path:
+        return path
+    root, ext = os.path.splitext(path)
+    return f"{root}.{name}{ext}"
+
+
+def resolve_corpus(config: Config, name: Optional[str] = None) -> Corpus:
+    """Map a corpus name (Config.CORPUS by default) to its collection, tenant and file paths.
+
+    The default corpus keeps the original `Documents` collection and file names, so an
+    existing deployment is the default corpus. Other corpora get their own collection
+    (`Documents_<name>`), or with CORPUS_PARTITIONING=tenants all corpora are tenants of
+    the CORPUS_TENANT_COLLECTION multi-tenant collection.
+    """
+    name = name or config.CORPUS
+    if not _CORPUS_NAME.match(name):
+        raise ValueError(f"Invalid corpus name {name!r}: use letters, digits and underscores")
+    if config.CORPUS_PARTITIONING not in PARTITIONINGS:
+        raise ValueError(f"Unknown corpus partitioning: {config.CORPUS_PARTITIONING}")
+    if name == DEFAULT_CORPUS:
+        corpus_config = config
+    else:
+        corpus_config = config.model_copy(update={
+            "MANIFEST_PATH": _suffixed(config.MANIFEST_PATH, name),
+            "IMPORT_CHECKPOINT_PATH": _suffixed(config.IMPORT_CHECKPOINT_PATH, name),
+            "KEYWORD_INDEX_PATH": _suffixed(config.KEYWORD_INDEX_PATH, name),
+        })
+    if config.CORPUS_PARTITIONING == "tenants" and config.VECTOR_STORE_BACKEND == "weaviate":
+        return Corpus(name, config.CORPUS_TENANT_COLLECTION, name, corpus_config)
+    return Corpus(name, "Documents" if name == DEFAULT_CORPUS else f"Documents_{name}", None, corpus_config)
+
+
+class TenantActivity:
+    """Last use of each tenant in this process, to find tenants that can be offloaded."""
+    def __init__(self):
+        """Initialize the activity tracker."""
+        self._last_used: Dict[str, float] = {}
+        self._lock = threading.Lock()
+
+    def touch(self, tenant: str):
+        """Record that a tenant was just queried."""
+        with self._lock:
+            self._last_used[tenant] = time.monotonic()
+
+    def idle(self, seconds: float) -> List[str]:
+        """Tenants not queried for `seconds`, forgotten once returned."""
+        now = time.monotonic()
+        with self._lock:
+            tenants = [tenant for tenant, used in self._last_used.items() if now - used >= seconds]
+            for tenant in tenants:
+                del self._last_used[tenant]
+        return tenants
+
+
+def main():
+    parser = argparse.ArgumentParser(description="List corpora or change the activity status of corpus tenants.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    commands.add_parser("list", help="Corpora of the tenant collection and their status")
+    for command, status in TENANT_COMMANDS.items():
+        command_parser = commands.add_parser(command, help=f"Mark corpus tenants {status}")
+        command_parser.add_argument("corpora", nargs="+")
+    args = parser.parse_args()
+
+    config = Config()
+    if config.CORPUS_PARTITIONING != "tenants":
+        parser.error("Corpus tenants need CORPUS_PARTITIONING=tenants")
+    manager = WeaviateClientManager(config)
+    try:
+        if args.command == "list":
+            for name, status in sorted(manager.tenant_statuses(config.CORPUS_TENANT_COLLECTION).items()):
+                print(f"{name}\t{status}")
+        else:
+            manager.set_tenant_status(config.CORPUS_TENANT_COLLECTION, args.corpora, TENANT_COMMANDS[args.command])
+    finally:
+        manager.close()
+
+
+if __name__ == "__main__":
+    main()
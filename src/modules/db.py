@@ -1,83 +1,368 @@
+import hashlib
+import re
 import sqlite3
 import json
-from typing import List, Dict
+import threading
+from typing import List, Dict, Optional, Tuple
 from src.config.logs import logger
+from src.config.metrics import metrics
+
+_TERM = re.compile(r"\w+")
+
+
+def search_query(text: str) -> str:
+    """FTS5 query matching messages that contain every term, the last one as a prefix (search as you type)."""
+    terms = [term.lower() for term in _TERM.findall(text)]
+    if not terms:
+        return ""
+    return " ".join([f'"{term}"' for term in terms[:-1]] + [f'"{terms[-1]}"*'])
+
+
+def owner_token(user_id: Optional[str]) -> Optional[str]:
+    """Single full-text token standing for a user; messages are indexed with it so searches only visit the user's own."""
+    if user_id is None:
+        return None
+    return "u" + hashlib.sha256(user_id.encode("utf-8")).hexdigest()[:24]
+
 
 class Database:
     """Database class for storing and retrieving conversation history."""
-    def __init__(self):
+    PREVIEW_LENGTH = 100
+
+    def __init__(self, db_path: str = "chat_history.db"):
         """Initialize the database class."""
-        self.DB_PATH = "chat_history.db"
+        self.DB_PATH = db_path
+        self._local = threading.local()
+
+    def _connection(self) -> sqlite3.Connection:
+        """Return this thread's connection, opening it on first use."""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.DB_PATH)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
 
+    @metrics.timed("db.init_db")
     def init_db(self):
-        """Initialize the database with sessions table."""
-        conn = sqlite3.connect(self.DB_PATH)
+        """Initialize the database with sessions and messages tables."""
+        conn = self._connection()
         cursor = conn.cursor()
-        
+
         cursor.execute("""
             CREATE TABLE IF NOT EXISTS sessions (
                 pk INTEGER PRIMARY KEY AUTOINCREMENT,
                 session_id TEXT NOT NULL UNIQUE,
                 user_id TEXT,
-                messages TEXT NOT NULL,
-                dt_created TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                message_count INTEGER NOT NULL DEFAULT 0,
+                preview TEXT,
+                summary TEXT,
+                summary_upto INTEGER NOT NULL DEFAULT 0,
+                dt_created TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                dt_updated TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+        """)
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS messages (
+                pk INTEGER PRIMARY KEY AUTOINCREMENT,
+                session_id TEXT NOT NULL,
+                seq INTEGER NOT NULL,
+                role TEXT NOT NULL,
+                content TEXT NOT NULL,
+                owner TEXT,
+                dt_created TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                UNIQUE (session_id, seq)
             )
         """)
-        logger.info("Database initialized successfully")
         conn.commit()
-        conn.close()
+        self._migrate_message_blobs(conn)
+        self._migrate_summary_fields(conn)
+        self._migrate_history_summary(conn)
+        self._migrate_message_owner(conn)
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_sessions_user_created ON sessions (user_id, dt_created)")
+        conn.commit()
+        self._create_search_index(conn)
+        logger.info("Database initialized successfully")
+
+    def _create_search_index(self, conn: sqlite3.Connection):
+        """Create the FTS5 index over message content and owner, kept in sync by triggers, and fill it once."""
+        columns = [row[1] for row in conn.execute("PRAGMA table_info(messages_fts)")]
+        with conn:
+            if columns and "owner" not in columns:
+                # Index from before searches were scoped by owner
+                conn.execute("DROP TRIGGER IF EXISTS messages_fts_insert")
+                conn.execute("DROP TRIGGER IF EXISTS messages_fts_delete")
+                conn.execute("DROP TRIGGER IF EXISTS messages_fts_update")
+                conn.execute("DROP TABLE messages_fts")
+            conn.execute("""
+                CREATE VIRTUAL TABLE IF NOT EXISTS messages_fts USING fts5(
+                    content, owner, content='messages', content_rowid='pk',
+                    tokenize='unicode61 remove_diacritics 2', prefix='2 3'
+                )
+            """)
+            conn.execute("""
+                CREATE TRIGGER IF NOT EXISTS messages_fts_insert AFTER INSERT ON messages BEGIN
+                    INSERT INTO messages_fts (rowid, content, owner) VALUES (new.pk, new.content, new.owner);
+                END
+            """)
+            conn.execute("""
+                CREATE TRIGGER IF NOT EXISTS messages_fts_delete AFTER DELETE ON messages BEGIN
+                    INSERT INTO messages_fts (messages_fts, rowid, content, owner) VALUES ('delete', old.pk, old.content, old.owner);
+                END
+            """)
+            conn.execute("""
+                CREATE TRIGGER IF NOT EXISTS messages_fts_update AFTER UPDATE OF content, owner ON messages BEGIN
+                    INSERT INTO messages_fts (messages_fts, rowid, content, owner) VALUES ('delete', old.pk, old.content, old.owner);
+                    INSERT INTO messages_fts (rowid, content, owner) VALUES (new.pk, new.content, new.owner);
+                END
+            """)
+            if "owner" not in columns:
+                # Messages stored before the index existed
+                conn.execute("INSERT INTO messages_fts (messages_fts) VALUES ('rebuild')")
+                logger.info("Built the message search index")
+
+    def _migrate_message_blobs(self, conn: sqlite3.Connection):
+        """Move messages stored as JSON blobs in sessions.messages into the messages table."""
+        columns = [row[1] for row in conn.execute("PRAGMA table_info(sessions)")]
+        if "messages" not in columns:
+            return
+
+        logger.info("Migrating session message blobs to the messages table")
+        with conn:
+            if "message_count" not in columns:
+                conn.execute("ALTER TABLE sessions ADD COLUMN message_count INTEGER NOT NULL DEFAULT 0")
+            rows = conn.execute("SELECT session_id, user_id, messages FROM sessions").fetchall()
+            for session_id, user_id, blob in rows:
+                messages = json.loads(blob) if blob else []
+                conn.executemany(
+                    "INSERT OR IGNORE INTO messages (session_id, seq, role, content, owner) VALUES (?, ?, ?, ?, ?)",
+                    [(session_id, seq, msg["role"], msg["content"], owner_token(user_id)) for seq, msg in enumerate(messages)],
+                )
+                conn.execute("UPDATE sessions SET message_count = ? WHERE session_id = ?", (len(messages), session_id))
+            # Rebuild the table without the blob column
+            conn.execute("""
+                CREATE TABLE sessions_migrated (
+                    pk INTEGER PRIMARY KEY AUTOINCREMENT,
+                    session_id TEXT NOT NULL UNIQUE,
+                    user_id TEXT,
+                    message_count INTEGER NOT NULL DEFAULT 0,
+                    dt_created TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                )
+            """)
+            conn.execute("""
+                INSERT INTO sessions_migrated (pk, session_id, user_id, message_count, dt_created)
+                SELECT pk, session_id, user_id, message_count, dt_created FROM sessions
+            """)
+            conn.execute("DROP TABLE sessions")
+            conn.execute("ALTER TABLE sessions_migrated RENAME TO sessions")
+        logger.info(f"Migrated {len(rows)} sessions")
+
+    def _migrate_summary_fields(self, conn: sqlite3.Connection):
+        """Add and backfill the preview and dt_updated summary columns of sessions."""
+        columns = [row[1] for row in conn.execute("PRAGMA table_info(sessions)")]
+        if "preview" in columns and "dt_updated" in columns:
+            return
+
+        logger.info("Adding session summary fields")
+        with conn:
+            if "preview" not in columns:
+                conn.execute("ALTER TABLE sessions ADD COLUMN preview TEXT")
+            if "dt_updated" not in columns:
+                # SQLite does not allow non-constant defaults in ADD COLUMN, backfilled below
+                conn.execute("ALTER TABLE sessions ADD COLUMN dt_updated TIMESTAMP")
+            conn.execute(f"""
+                UPDATE sessions SET
+                    preview = (
+                        SELECT substr(content, 1, {self.PREVIEW_LENGTH}) FROM messages
+                        WHERE messages.session_id = sessions.session_id AND role = 'user'
+                        ORDER BY seq LIMIT 1
+                    ),
+                    dt_updated = COALESCE(
+                        (SELECT MAX(dt_created) FROM messages WHERE messages.session_id = sessions.session_id),
+                        dt_created
+                    )
+            """)
+
+    def _migrate_history_summary(self, conn: sqlite3.Connection):
+        """Add the rolling chat history summary columns of sessions."""
+        columns = [row[1] for row in conn.execute("PRAGMA table_info(sessions)")]
+        with conn:
+            if "summary" not in columns:
+                conn.execute("ALTER TABLE sessions ADD COLUMN summary TEXT")
+            if "summary_upto" not in columns:
+                conn.execute("ALTER TABLE sessions ADD COLUMN summary_upto INTEGER NOT NULL DEFAULT 0")
 
+    def _migrate_message_owner(self, conn: sqlite3.Connection):
+        """Add and backfill the owner token of messages (see owner_token)."""
+        columns = [row[1] for row in conn.execute("PRAGMA table_info(messages)")]
+        if "owner" in columns:
+            return
+        with conn:
+            conn.execute("ALTER TABLE messages ADD COLUMN owner TEXT")
+            sessions = conn.execute("SELECT session_id, user_id FROM sessions WHERE user_id IS NOT NULL").fetchall()
+            conn.executemany(
+                "UPDATE messages SET owner = ? WHERE session_id = ?",
+                [(owner_token(user_id), session_id) for session_id, user_id in sessions],
+            )
 
+    @metrics.timed("db.save_session")
     def save_session(self, session_id: str, messages: List[Dict], user_id: str = None):
-        """Save a session with its messages and optional user_id (upsert)."""
-        conn = sqlite3.connect(self.DB_PATH)
-        cursor = conn.cursor()
-        
-        cursor.execute("""
-            INSERT INTO sessions (session_id, user_id, messages) VALUES (?, ?, ?)
-            ON CONFLICT(session_id) DO UPDATE SET 
-                messages = excluded.messages,
-                user_id = COALESCE(excluded.user_id, sessions.user_id)
-        """, (session_id, user_id, json.dumps(messages)))
-        logger.info(f"Session saved: {session_id}")
-        conn.commit()
-        conn.close()
+        """Save a session with its messages and optional user_id.
+
+        Only messages that are not stored yet are appended, so the cost of saving a turn
+        does not depend on the length of the conversation.
+        """
+        self._append(session_id, messages, user_id, conversation=True)
+
+    @metrics.timed("db.append_messages")
+    def append_messages(self, session_id: str, messages: List[Dict], user_id: str = None):
+        """Append new messages to a session, creating the session if needed."""
+        self._append(session_id, messages, user_id, conversation=False)
 
+    def _append(self, session_id: str, messages: List[Dict], user_id: Optional[str], conversation: bool):
+        """Store messages after the session's last one; with `conversation`, `messages` is the whole conversation.
+
+        The stored count is read in the same write transaction as the inserts, so concurrent
+        saves of one session (two tabs, the API and the UI) cannot claim the same positions.
+        """
+        conn = self._connection()
+        with conn:
+            conn.execute("BEGIN IMMEDIATE")
+            row = conn.execute("SELECT message_count, user_id FROM sessions WHERE session_id = ?", (session_id,)).fetchone()
+            if row is None:
+                conn.execute("INSERT INTO sessions (session_id, user_id) VALUES (?, ?)", (session_id, user_id))
+                start_seq, owner = 0, user_id
+            else:
+                start_seq, owner = row
+                if owner is None and user_id is not None:
+                    # A session saved before its user was known: its messages become searchable by them
+                    owner = user_id
+                    conn.execute("UPDATE sessions SET user_id = ? WHERE session_id = ?", (user_id, session_id))
+                    conn.execute("UPDATE messages SET owner = ? WHERE session_id = ?", (owner_token(owner), session_id))
+            if conversation:
+                messages = messages[start_seq:]
+            if messages:
+                conn.executemany(
+                    "INSERT INTO messages (session_id, seq, role, content, owner) VALUES (?, ?, ?, ?, ?)",
+                    [(session_id, start_seq + i, msg["role"], msg["content"], owner_token(owner)) for i, msg in enumerate(messages)],
+                )
+                preview = next((msg["content"][:self.PREVIEW_LENGTH] for msg in messages if msg["role"] == "user"), None)
+                conn.execute("""
+                    UPDATE sessions SET
+                        message_count = ?,
+                        preview = COALESCE(preview, ?),
+                        dt_updated = CURRENT_TIMESTAMP
+                    WHERE session_id = ?
+                """, (start_seq + len(messages), preview, session_id))
+        logger.info(f"Session saved: {session_id} (+{len(messages)} messages)")
+
+    @metrics.timed("db.get_session")
     def get_session(self, session_id: str) -> List[Dict]:
         """Retrieve messages for a given session. Returns list of message dicts."""
-        conn = sqlite3.connect(self.DB_PATH)
-        cursor = conn.cursor()
-        
-        cursor.execute("SELECT messages FROM sessions WHERE session_id = ?", (session_id,))
-        result = cursor.fetchone()
-        
-        conn.close()
-        
-        if result:
+        cursor = self._connection().execute(
+            "SELECT role, content FROM messages WHERE session_id = ? ORDER BY seq", (session_id,)
+        )
+        messages = [{"role": role, "content": content} for role, content in cursor.fetchall()]
+        if messages:
             logger.info(f"Session successfully retrieved for session: {session_id}")
-            return json.loads(result[0])
-        return []
+        return messages
 
-    def get_user_sessions(self, user_id: str) -> List[Dict]:
-        """Retrieve all sessions for a given user. Returns list of session dicts with metadata."""
-        conn = sqlite3.connect(self.DB_PATH)
-        cursor = conn.cursor()
-        
-        cursor.execute("""
-            SELECT session_id, messages, dt_created 
-            FROM sessions 
-            WHERE user_id = ? 
+    @metrics.timed("db.get_session_owner")
+    def get_session_owner(self, session_id: str) -> Tuple[bool, Optional[str]]:
+        """Whether a session exists and the user it belongs to."""
+        row = self._connection().execute("SELECT user_id FROM sessions WHERE session_id = ?", (session_id,)).fetchone()
+        return (True, row[0]) if row else (False, None)
+
+    @metrics.timed("db.get_history_summary")
+    def get_history_summary(self, session_id: str) -> Tuple[str, int]:
+        """Return the rolling summary of a session and how many messages it covers."""
+        row = self._connection().execute(
+            "SELECT summary, summary_upto FROM sessions WHERE session_id = ?", (session_id,)
+        ).fetchone()
+        if not row:
+            return "", 0
+        return row[0] or "", row[1]
+
+    @metrics.timed("db.save_history_summary")
+    def save_history_summary(self, session_id: str, summary: str, summary_upto: int) -> bool:
+        """Store the rolling summary of the first `summary_upto` messages of a session.
+
+        Returns False (nothing stored) if the session does not exist.
+        """
+        conn = self._connection()
+        with conn:
+            cursor = conn.execute(
+                "UPDATE sessions SET summary = ?, summary_upto = ? WHERE session_id = ?",
+                (summary, summary_upto, session_id),
+            )
+        return cursor.rowcount > 0
+
+    @metrics.timed("db.get_user_sessions")
+    def get_user_sessions(self, user_id: str, limit: int = 20, offset: int = 0) -> List[Dict]:
+        """Retrieve a page of session summaries for a given user, newest first.
+
+        Messages are not loaded; use get_session to fetch them when a session is opened.
+        """
+        cursor = self._connection().execute("""
+            SELECT session_id, preview, message_count, dt_created, dt_updated
+            FROM sessions
+            WHERE user_id = ?
             ORDER BY dt_created DESC
-        """, (user_id,))
-        results = cursor.fetchall()
-        logger.info(f"User sessions successfully retrieved for user: {user_id}")
-        conn.close()
-        
-        sessions = []
-        for row in results:
-            sessions.append({
+            LIMIT ? OFFSET ?
+        """, (user_id, limit, offset))
+        sessions = [
+            {
                 "session_id": row[0],
-                "messages": json.loads(row[1]),
-                "dt_created": row[2]
-            })
+                "preview": row[1] or "",
+                "message_count": row[2],
+                "dt_created": row[3],
+                "dt_updated": row[4],
+            }
+            for row in cursor.fetchall()
+        ]
+        logger.info(f"User sessions successfully retrieved for user: {user_id}")
         return sessions
+
+    @metrics.timed("db.search_messages")
+    def search_messages(self, user_id: str, text: str, limit: int = 20, offset: int = 0,
+                        highlight: Tuple[str, str] = ("<mark>", "</mark>"), snippet_tokens: int = 12) -> List[Dict]:
+        """Search a user's messages, best matches first.
+
+        Results come from the full-text index with a snippet around the matched terms
+        wrapped in `highlight`; no conversation is loaded.
+        Args:
+            user_id: Whose sessions to search.
+            text: Search terms; messages must contain all of them (the last one as a prefix).
+            snippet_tokens: Tokens of context in each snippet.
+        Returns:
+            A page of matching messages with their session id, position, role, snippet and BM25 score.
+        """
+        query = search_query(text)
+        if not query:
+            return []
+        # Matching the owner token in the index itself keeps matching and ranking within the user's messages
+        query = f'owner : "{owner_token(user_id)}" AND content : ({query})'
+        cursor = self._connection().execute("""
+            SELECT m.session_id, m.seq, m.role, snippet(messages_fts, 0, ?, ?, '…', ?),
+                   s.preview, s.dt_created, bm25(messages_fts, 1.0, 0.0) AS score
+            FROM messages_fts
+            JOIN messages m ON m.pk = messages_fts.rowid
+            JOIN sessions s ON s.session_id = m.session_id
+            WHERE messages_fts MATCH ?
+            ORDER BY score, m.pk DESC
+            LIMIT ? OFFSET ?
+        """, (highlight[0], highlight[1], snippet_tokens, query, limit, offset))
+        return [
+            {
+                "session_id": row[0],
+                "seq": row[1],
+                "role": row[2],
+                "snippet": row[3],
+                "preview": row[4] or "",
+                "dt_created": row[5],
+                # bm25() is lower for better matches
+                "score": round(-row[6], 4),
+            }
+            for row in cursor.fetchall()
+        ]
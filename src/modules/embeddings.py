@@ -0,0 +1,304 @@
+import asyncio
+import hashlib
+import inspect
+import random
+import sqlite3
+import threading
+import time
+from array import array
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional
+import numpy as np
+from langchain_core.embeddings import Embeddings
+from src.config.logs import logger
+
+TRANSIENT_ERROR_MARKERS = ("429", "quota", "resource_exhausted", "resourceexhausted", "rate limit",
+                           "503", "unavailable", "deadline", "timeout", "timed out")
+
+
+def is_transient_error(error: Exception) -> bool:
+    """Whether an upstream error is worth retrying (quota, overload, timeouts)."""
+    text = f"{type(error).__name__} {error}".lower()
+    return any(marker in text for marker in TRANSIENT_ERROR_MARKERS)
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count (about 4 characters per token)."""
+    return max(1, len(text) // 4)
+
+
+class RateLimiter:
+    """Thread-safe token bucket limiting requests and tokens per minute (0 disables a limit)."""
+    def __init__(self, requests_per_minute: int = 0, tokens_per_minute: int = 0):
+        """Initialize the rate limiter with full buckets."""
+        self.requests_per_minute = requests_per_minute
+        self.tokens_per_minute = tokens_per_minute
+        self._requests = float(requests_per_minute)
+        self._tokens = float(tokens_per_minute)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self, now: float):
+        elapsed = now - self._updated
+        self._updated = now
+        if self.requests_per_minute:
+            self._requests = min(self.requests_per_minute, self._requests + elapsed * self.requests_per_minute / 60)
+        if self.tokens_per_minute:
+            self._tokens = min(self.tokens_per_minute, self._tokens + elapsed * self.tokens_per_minute / 60)
+
+    def reserve(self, tokens: int = 0) -> float:
+        """Take one request and `tokens` tokens from the buckets, returning how long to wait first."""
+        with self._lock:
+            self._refill(time.monotonic())
+            wait = 0.0
+            if self.requests_per_minute:
+                self._requests -= 1
+                if self._requests < 0:
+                    wait = max(wait, -self._requests * 60 / self.requests_per_minute)
+            if self.tokens_per_minute:
+                # A single request larger than the whole bucket can never fit, cap it
+                self._tokens -= min(tokens, self.tokens_per_minute)
+                if self._tokens < 0:
+                    wait = max(wait, -self._tokens * 60 / self.tokens_per_minute)
+            return wait
+
+    def acquire(self, tokens: int = 0):
+        """Block until one request of `tokens` tokens is allowed."""
+        wait = self.reserve(tokens)
+        if wait > 0:
+            time.sleep(wait)
+
+    async def aacquire(self, tokens: int = 0):
+        """Wait without blocking the event loop until one request of `tokens` tokens is allowed."""
+        wait = self.reserve(tokens)
+        if wait > 0:
+            await asyncio.sleep(wait)
+
+
+def call_with_retry(fn, *args, retries: int = 5, base_delay: float = 1.0, max_delay: float = 60.0):
+    """Call fn(*args), retrying transient errors with exponential backoff and jitter."""
+    for attempt in range(retries + 1):
+        try:
+            return fn(*args)
+        except Exception as e:
+            if attempt == retries or not is_transient_error(e):
+                raise
+            delay = min(max_delay, base_delay * 2 ** attempt) * (0.5 + random.random() / 2)
+            logger.warning(f"Transient error ({e}), retrying in {delay:.1f}s (attempt {attempt + 1}/{retries})")
+            time.sleep(delay)
+
+
+async def acall_with_retry(fn, *args, retries: int = 5, base_delay: float = 1.0, max_delay: float = 60.0):
+    """Async variant of call_with_retry for a coroutine function."""
+    for attempt in range(retries + 1):
+        try:
+            return await fn(*args)
+        except Exception as e:
+            if attempt == retries or not is_transient_error(e):
+                raise
+            delay = min(max_delay, base_delay * 2 ** attempt) * (0.5 + random.random() / 2)
+            logger.warning(f"Transient error ({e}), retrying in {delay:.1f}s (attempt {attempt + 1}/{retries})")
+            await asyncio.sleep(delay)
+
+
+def embedding_model_name(config) -> str:
+    """Name of the configured embedding space; reduced vectors are kept apart from full-size ones."""
+    if config.EMBEDDING_DIMENSIONS:
+        return f"{config.EMBEDDINGS_MODEL_NAME}@{config.EMBEDDING_DIMENSIONS}"
+    return config.EMBEDDINGS_MODEL_NAME
+
+
+class EmbeddingCache:
+    """On-disk cache of embedding vectors keyed by (model name, text hash)."""
+    def __init__(self, path: str = "embeddings_cache.db"):
+        """Initialize the cache database."""
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS embeddings (
+                model TEXT NOT NULL,
+                text_hash TEXT NOT NULL,
+                vector BLOB NOT NULL,
+                PRIMARY KEY (model, text_hash)
+            )
+        """)
+        self._conn.commit()
+
+    @staticmethod
+    def text_hash(text: str) -> str:
+        """Hash used as the cache key for a text."""
+        return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+    def get_many(self, model: str, hashes: List[str]) -> Dict[str, List[float]]:
+        """Return the cached vectors for the given hashes."""
+        found = {}
+        with self._lock:
+            # Stay below SQLite's bound-parameter limit
+            for i in range(0, len(hashes), 500):
+                part = hashes[i:i + 500]
+                rows = self._conn.execute(
+                    f"SELECT text_hash, vector FROM embeddings WHERE model = ? AND text_hash IN ({','.join('?' * len(part))})",
+                    (model, *part),
+                ).fetchall()
+                for text_hash, blob in rows:
+                    vector = array("f")
+                    vector.frombytes(blob)
+                    found[text_hash] = vector.tolist()
+        return found
+
+    def put_many(self, model: str, items: Dict[str, List[float]]):
+        """Store vectors for the given hashes."""
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO embeddings (model, text_hash, vector) VALUES (?, ?, ?)",
+                [(model, text_hash, array("f", vector).tobytes()) for text_hash, vector in items.items()],
+            )
+            self._conn.commit()
+
+    def close(self):
+        """Close the cache database."""
+        self._conn.close()
+
+
+class BatchEmbeddings(Embeddings):
+    """Embeddings wrapper adding batching, bounded concurrency, rate limiting, retries and a disk cache.
+
+    Any langchain `Embeddings` can be used as the backend, e.g.
+    `langchain_core.embeddings.DeterministicFakeEmbedding` to run offline.
+    """
+    def __init__(self, backend: Embeddings, model_name: str, cache: Optional[EmbeddingCache] = None,
+                 batch_size: int = 50, concurrency: int = 4, rate_limiter: Optional[RateLimiter] = None,
+                 retries: int = 5):
+        """Initialize the embedding layer."""
+        self.backend = backend
+        self.model_name = model_name
+        self.cache = cache
+        self.batch_size = batch_size
+        self.concurrency = concurrency
+        self.rate_limiter = rate_limiter or RateLimiter()
+        self.retries = retries
+        self.stats = {"chunks": 0, "cached": 0, "embedded": 0, "requests": 0, "seconds": 0.0}
+
+    @classmethod
+    def from_config(cls, backend: Embeddings, config) -> "BatchEmbeddings":
+        """Build the embedding layer from the EMBED_* settings in Config."""
+        return cls(
+            backend,
+            model_name=embedding_model_name(config),
+            cache=EmbeddingCache(config.EMBEDDING_CACHE_PATH) if config.EMBEDDING_CACHE_PATH else None,
+            batch_size=config.EMBED_BATCH_SIZE,
+            concurrency=config.EMBED_CONCURRENCY,
+            rate_limiter=RateLimiter(config.EMBED_REQUESTS_PER_MINUTE, config.EMBED_TOKENS_PER_MINUTE),
+        )
+
+    def _embed_batch(self, texts: List[str]) -> List[List[float]]:
+        def call():
+            self.rate_limiter.acquire(sum(estimate_tokens(text) for text in texts))
+            return self.backend.embed_documents(texts)
+        return call_with_retry(call, retries=self.retries)
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        """Embed texts, only sending cache misses upstream."""
+        start = time.perf_counter()
+        hashes = [EmbeddingCache.text_hash(text) for text in texts]
+        vectors = self.cache.get_many(self.model_name, list(set(hashes))) if self.cache else {}
+        cached = sum(1 for text_hash in hashes if text_hash in vectors)
+
+        # Embed each distinct missing text once
+        missing = {}
+        for text_hash, text in zip(hashes, texts):
+            if text_hash not in vectors:
+                missing.setdefault(text_hash, text)
+        missing_hashes = list(missing)
+        batches = [missing_hashes[i:i + self.batch_size] for i in range(0, len(missing_hashes), self.batch_size)]
+        if batches:
+            with ThreadPoolExecutor(max_workers=self.concurrency) as executor:
+                results = executor.map(lambda batch: self._embed_batch([missing[h] for h in batch]), batches)
+                for batch, batch_vectors in zip(batches, results):
+                    new_vectors = dict(zip(batch, batch_vectors))
+                    vectors.update(new_vectors)
+                    if self.cache:
+                        self.cache.put_many(self.model_name, new_vectors)
+
+        elapsed = time.perf_counter() - start
+        self.stats["chunks"] += len(texts)
+        self.stats["cached"] += cached
+        self.stats["embedded"] += len(missing)
+        self.stats["requests"] += len(batches)
+        self.stats["seconds"] += elapsed
+        logger.info(
+            f"Embedded {len(texts)} chunks ({cached} cached, {len(missing)} sent in {len(batches)} requests) "
+            f"in {elapsed:.2f}s ({len(texts) / max(elapsed, 1e-9):.1f} chunks/s)"
+        )
+        return [vectors[text_hash] for text_hash in hashes]
+
+    def embed_query(self, text: str) -> List[float]:
+        """Embed a query through the rate limiter and retry policy."""
+        def call():
+            self.rate_limiter.acquire(estimate_tokens(text))
+            return self.backend.embed_query(text)
+        return call_with_retry(call, retries=self.retries)
+
+    async def aembed_query(self, text: str) -> List[float]:
+        """Async variant of embed_query."""
+        async def call():
+            await self.rate_limiter.aacquire(estimate_tokens(text))
+            return await self.backend.aembed_query(text)
+        return await acall_with_retry(call, retries=self.retries)
+
+    @property
+    def chunks_per_second(self) -> float:
+        """Overall throughput of this embedding layer."""
+        return self.stats["chunks"] / max(self.stats["seconds"], 1e-9)
+
+
+class ReducedEmbeddings(Embeddings):
+    """Embeddings shortened to their first `dimensions` components and re-normalized.
+
+    Gemini embedding models are trained so that a prefix of the vector is itself a good
+    embedding (Matryoshka representation learning) and return it directly when given
+    `output_dimensionality`; for backends without that option the full vector is cut here.
+    """
+    def __init__(self, backend: Embeddings, dimensions: int):
+        """Initialize the reduced embeddings."""
+        self.backend = backend
+        self.dimensions = dimensions
+        self._native = "output_dimensionality" in inspect.signature(backend.embed_documents).parameters
+
+    def _kwargs(self) -> Dict:
+        return {"output_dimensionality": self.dimensions} if self._native else {}
+
+    def _reduce(self, vectors: List[List[float]]) -> List[List[float]]:
+        # Reduced Gemini vectors are not unit length either
+        matrix = np.asarray(vectors, dtype=np.float32)[:, :self.dimensions]
+        matrix /= np.maximum(np.linalg.norm(matrix, axis=1, keepdims=True), 1e-12)
+        return matrix.tolist()
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        """Embed texts at the reduced dimensionality."""
+        if not texts:
+            return []
+        return self._reduce(self.backend.embed_documents(texts, **self._kwargs()))
+
+    def embed_query(self, text: str) -> List[float]:
+        """Embed a query at the reduced dimensionality."""
+        return self._reduce([self.backend.embed_query(text, **self._kwargs())])[0]
+
+    async def aembed_documents(self, texts: List[str]) -> List[List[float]]:
+        """Async variant of embed_documents."""
+        if not texts:
+            return []
+        return self._reduce(await self.backend.aembed_documents(texts, **self._kwargs()))
+
+    async def aembed_query(self, text: str) -> List[float]:
+        """Async variant of embed_query."""
+        return self._reduce([await self.backend.aembed_query(text, **self._kwargs())])[0]
+
+
+def with_dimensions(backend: Embeddings, config) -> Embeddings:
+    """Apply Config.EMBEDDING_DIMENSIONS (0 keeps the model's full size)."""
+    if not config.EMBEDDING_DIMENSIONS:
+        return backend
+    return ReducedEmbeddings(backend, config.EMBEDDING_DIMENSIONS)
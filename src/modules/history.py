@@ -0,0 +1,162 @@
+import threading
+from pathlib import Path
+from typing import Dict, List, Optional, Set, Tuple
+from langchain_core.prompts import PromptTemplate
+from langchain_core.output_parsers import StrOutputParser
+from src.config.logs import logger
+from src.modules.admission import AdmissionController, AdmissionTimeout
+from src.modules.db import Database
+from src.modules.embeddings import RateLimiter, call_with_retry, estimate_tokens
+
+# Admission queue of summarization calls: as one more user in the round-robin, background
+# folds get at most one slot per round however many of them are waiting
+SUMMARY_USER = "__history_summary__"
+
+
+def format_messages(messages: List[Dict]) -> str:
+    """Render messages the way they appear in the prompt."""
+    return "\n".join([f"{msg['role']}: {msg['content']}" for msg in messages])
+
+
+class HistoryManager:
+    """Builds a token-budgeted chat history: recent turns verbatim, older turns as a rolling summary.
+
+    The summary is stored with the session and only extended with the messages that
+    fell out of the verbatim window, in batches, on a background thread. Until their
+    batch has been folded in, messages that left the window stay in the prompt verbatim;
+    if they no longer fit the token budget on their own, they are folded before answering.
+    Args:
+        admission: Shared limit on concurrent model calls; summaries queue for a slot like answers do.
+        limiter: Shared requests/tokens per minute limit of the model.
+        retries: Retries of rate-limited or transient summarization errors.
+    """
+    def __init__(self, model, db: Database, max_turns: int = 6, token_budget: int = 2000,
+                 summary_batch: int = 6, summary_words: int = 250, admission: Optional[AdmissionController] = None,
+                 limiter: Optional[RateLimiter] = None, retries: int = 4):
+        """Initialize the history manager."""
+        self.model = model
+        self.db = db
+        self.max_messages = max_turns * 2
+        self.token_budget = token_budget
+        self.summary_batch = summary_batch
+        self.summary_words = summary_words
+        self.admission = admission
+        self.limiter = limiter
+        self.retries = retries
+        template_path = Path(__file__).parent / "../prompts" / "summary.jinja2"
+        with open(template_path, 'r', encoding='utf-8') as f:
+            prompt = PromptTemplate(
+                input_variables=["summary", "messages", "max_words"],
+                template=f.read()
+            )
+        self.summary_chain = prompt | model | StrOutputParser()
+        # Sessions with a fold in progress
+        self._folding: Set[str] = set()
+        self._folding_done = threading.Condition()
+
+    def _fitting_start(self, messages: List[Dict], lo: int, hi: int, max_messages: Optional[int] = None) -> int:
+        """Index of the first of the last messages of messages[lo:hi] that fit the token budget."""
+        start = hi
+        tokens = 0
+        while start > lo and (max_messages is None or hi - start < max_messages):
+            tokens += estimate_tokens(messages[start - 1]["content"])
+            if tokens > self.token_budget:
+                break
+            start -= 1
+        return start
+
+    def _window_start(self, messages: List[Dict]) -> int:
+        """Index of the first message kept verbatim (last turns that fit the budget)."""
+        return self._fitting_start(messages, 0, len(messages), self.max_messages)
+
+    def build(self, session_id: str, messages: Optional[List[Dict]] = None) -> str:
+        """Return the chat history for the prompt.
+
+        Args:
+            session_id: The session the history belongs to.
+            messages: The conversation so far if the caller already holds it, else it is read from the database.
+        """
+        if messages is None:
+            messages = self.db.get_session(session_id)
+        if not messages:
+            return ""
+
+        summary, summarized = self.db.get_history_summary(session_id)
+        summarized = min(summarized, len(messages))
+        start = self._window_start(messages)
+        # Messages already folded into the summary are never repeated verbatim. Messages that left
+        # the window are carried verbatim, within their own token budget, until they are folded in
+        if start > summarized and self._fitting_start(messages, summarized, start) > summarized:
+            folded = self.fold(session_id, messages, start, wait=True)
+            if folded is not None:
+                summary, summarized = folded
+        carried = self._fitting_start(messages, summarized, start) if start > summarized else summarized
+        pending = max(0, start - summarized)
+        verbatim = messages[carried:]
+
+        chat_history = format_messages(verbatim)
+        if summary:
+            chat_history = f"Summary of the earlier conversation: {summary}\n{chat_history}"
+        logger.info(
+            f"Chat history for {session_id}: ~{estimate_tokens(chat_history)} tokens "
+            f"({len(verbatim)} verbatim messages, {summarized} summarized, {pending} waiting to be summarized, "
+            f"{carried - summarized} dropped)"
+        )
+
+        # A summary of a session that is not stored yet could not be saved, it is folded once the turn is
+        if pending >= self.summary_batch and self.db.get_session_owner(session_id)[0]:
+            threading.Thread(target=self.fold, args=(session_id, messages, start), name=f"history-fold-{session_id}", daemon=True).start()
+        return chat_history
+
+    def _summarize(self, inputs: Dict) -> str:
+        """Run the summary chain in an admission slot and within the model's rate limit."""
+        tokens = estimate_tokens(f"{inputs['summary']}{inputs['messages']}")
+
+        def invoke():
+            if self.limiter is not None:
+                self.limiter.acquire(tokens)
+            return self.summary_chain.invoke(inputs)
+
+        if self.admission is None:
+            return call_with_retry(invoke, retries=self.retries).strip()
+        with self.admission.slot(SUMMARY_USER):
+            return call_with_retry(invoke, retries=self.retries).strip()
+
+    def fold(self, session_id: str, messages: List[Dict], upto: int, wait: bool = False) -> Optional[Tuple[str, int]]:
+        """Fold messages[summarized:upto] into the stored rolling summary.
+
+        Args:
+            wait: Wait for a fold of the session already in progress instead of leaving the work to it.
+        Returns:
+            The summary and how many messages it covers, None if nothing was folded.
+        """
+        with self._folding_done:
+            while session_id in self._folding:
+                if not wait:
+                    # Another turn of this session is already folding
+                    return None
+                self._folding_done.wait()
+            self._folding.add(session_id)
+        try:
+            summary, summarized = self.db.get_history_summary(session_id)
+            if upto <= summarized:
+                return summary, summarized
+            summary = self._summarize({
+                "summary": summary or "(empty)",
+                "messages": format_messages(messages[summarized:upto]),
+                "max_words": self.summary_words,
+            })
+            if not self.db.save_history_summary(session_id, summary, upto):
+                logger.warning(f"Session {session_id} is not stored yet, its summary of messages {summarized}-{upto} is not saved")
+            else:
+                logger.info(f"Folded messages {summarized}-{upto} of {session_id} into the summary")
+            return summary, upto
+        except AdmissionTimeout as e:
+            logger.warning(f"Summary of {session_id} postponed: {e}")
+        except Exception as e:
+            logger.error(f"Error summarizing conversation history: {e}")
+        finally:
+            with self._folding_done:
+                self._folding.discard(session_id)
+                self._folding_done.notify_all()
+        return None
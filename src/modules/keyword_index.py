@@ -0,0 +1,142 @@
+import json
+import re
+import sqlite3
+import threading
+from typing import Dict, Iterable, List, Optional, Tuple
+from langchain_core.documents import Document
+from src.config.logs import logger
+
+# Frequent question words that only add noise to a keyword query
+STOPWORDS = frozenset(
+    "a an and are as at be by can do does did for from has have how i in is it its me my of on or "
+    "say says said tell than that the their them then there these they this to was were what when "
+    "where which who why will with would you your about into paper papers".split()
+)
+_TERM = re.compile(r"\w+")
+
+
+def keyword_query(question: str) -> str:
+    """FTS5 query matching any significant term of the question."""
+    terms = []
+    for term in _TERM.findall(question):
+        lowered = term.lower()
+        if lowered not in STOPWORDS and lowered not in terms:
+            terms.append(lowered)
+    return " OR ".join(f'"{term}"' for term in terms)
+
+
+class KeywordIndex:
+    """BM25 keyword index of chunk texts in SQLite FTS5, maintained alongside the vectorstore.
+
+    Chunks are keyed by the same deterministic ids as in the vectorstore so that updates and
+    deletions of a document can be mirrored. Sources are recorded with their content hash
+    so ingestion can tell which documents are missing from the index.
+    """
+    def __init__(self, path: str = "keyword_index.db"):
+        """Open (or create) the keyword index."""
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript("""
+            CREATE TABLE IF NOT EXISTS chunks (
+                rowid INTEGER PRIMARY KEY,
+                id TEXT NOT NULL UNIQUE,
+                text TEXT NOT NULL,
+                metadata TEXT NOT NULL
+            );
+            CREATE VIRTUAL TABLE IF NOT EXISTS chunks_fts USING fts5(
+                text, content='chunks', content_rowid='rowid', tokenize='unicode61 remove_diacritics 2'
+            );
+            CREATE TABLE IF NOT EXISTS sources (
+                source TEXT PRIMARY KEY,
+                content_hash TEXT NOT NULL
+            );
+        """)
+        self._conn.commit()
+
+    def add(self, ids: List[str], texts: List[str], metadatas: List[Dict]):
+        """Index chunks, replacing any chunk with the same id."""
+        with self._lock, self._conn:
+            self._delete(ids)
+            for chunk_id, text, metadata in zip(ids, texts, metadatas):
+                cursor = self._conn.execute(
+                    "INSERT INTO chunks (id, text, metadata) VALUES (?, ?, ?)",
+                    (chunk_id, text, json.dumps(metadata, default=str)),
+                )
+                self._conn.execute("INSERT INTO chunks_fts (rowid, text) VALUES (?, ?)", (cursor.lastrowid, text))
+
+    def _delete(self, ids: Iterable[str]):
+        ids = list(ids)
+        for i in range(0, len(ids), 500):
+            batch = ids[i:i + 500]
+            placeholders = ",".join("?" * len(batch))
+            rows = self._conn.execute(f"SELECT rowid, text FROM chunks WHERE id IN ({placeholders})", batch).fetchall()
+            self._conn.executemany("INSERT INTO chunks_fts (chunks_fts, rowid, text) VALUES ('delete', ?, ?)", rows)
+            self._conn.execute(f"DELETE FROM chunks WHERE id IN ({placeholders})", batch)
+
+    def delete(self, ids: List[str]):
+        """Remove chunks by id."""
+        with self._lock, self._conn:
+            self._delete(ids)
+
+    def record_source(self, source: str, content_hash: str):
+        """Mark a document as fully indexed at this content hash."""
+        with self._lock, self._conn:
+            self._conn.execute("INSERT OR REPLACE INTO sources (source, content_hash) VALUES (?, ?)", (source, content_hash))
+
+    def remove_source(self, source: str):
+        """Forget a deleted document."""
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM sources WHERE source = ?", (source,))
+
+    def source_hashes(self) -> Dict[str, str]:
+        """Content hash of every indexed document."""
+        with self._lock:
+            return dict(self._conn.execute("SELECT source, content_hash FROM sources"))
+
+    def search_with_score(self, question: str, k: int = 20, filters=None) -> List[Tuple[Document, float]]:
+        """Top-k chunks by BM25 for the question's significant terms (higher score is better).
+
+        filters: optional MetadataFilter restricting the chunks considered.
+        """
+        query = keyword_query(question)
+        if not query:
+            return []
+        clause, params = filters.to_sql("chunks.metadata") if filters is not None else ("1", [])
+        try:
+            with self._lock:
+                rows = self._conn.execute(f"""
+                    SELECT chunks.id, chunks.text, chunks.metadata, bm25(chunks_fts) AS score
+                    FROM chunks_fts JOIN chunks ON chunks.rowid = chunks_fts.rowid
+                    WHERE chunks_fts MATCH ? AND {clause}
+                    ORDER BY score
+                    LIMIT ?
+                """, (query, *params, k)).fetchall()
+        except sqlite3.OperationalError as e:
+            logger.warning(f"Keyword search failed for {query!r}: {e}")
+            return []
+        # FTS5 bm25() is negative, lower is better
+        return [
+            (Document(id=chunk_id, page_content=text, metadata=json.loads(metadata)), -score)
+            for chunk_id, text, metadata, score in rows
+        ]
+
+    def search(self, question: str, k: int = 20, filters=None) -> List[Document]:
+        """Top-k chunks by BM25."""
+        return [doc for doc, _ in self.search_with_score(question, k, filters)]
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM chunks").fetchone()[0]
+
+    def close(self):
+        """Close the index database."""
+        self._conn.close()
+
+
+def open_keyword_index(config) -> Optional[KeywordIndex]:
+    """The keyword index when Config.RETRIEVAL_MODE uses one, else None."""
+    if config.RETRIEVAL_MODE == "vector" or not config.KEYWORD_INDEX_PATH:
+        return None
+    return KeywordIndex(config.KEYWORD_INDEX_PATH)
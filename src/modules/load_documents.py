@@ -1,84 +1,216 @@
+import argparse
 import glob
-from langchain_community.document_loaders import PyPDFLoader
-from langchain_text_splitters import RecursiveCharacterTextSplitter
-from langchain_weaviate import WeaviateVectorStore
+import sys
+from typing import Dict, Optional
+from langchain_core.embeddings import Embeddings
 from langchain_google_genai import GoogleGenerativeAIEmbeddings
-import weaviate
-from weaviate.classes.init import Auth
-from config.config import Config
+from src.config.config import Config
 import os
 from dotenv import load_dotenv
 from src.config.logs import logger
+from src.config.metrics import metrics
+from src.modules.bulk_import import ImportCheckpoint
+from src.modules.corpora import resolve_corpus
+from src.modules.embeddings import BatchEmbeddings, with_dimensions
+from src.modules.keyword_index import open_keyword_index
+from src.modules.manifest import IngestionManifest
+from src.modules.pipeline import IngestBatch, run_pipeline
+from src.modules.local_index import LocalVectorStore
+from src.modules.vectorstore import create_store_manager
 load_dotenv()
 
-def load_documents(path: str):
-    """Load documents from the documents directory."""
-    config = Config()
-    os.environ["GOOGLE_API_KEY"] = config.GOOGLE_API_KEY
 
-    try:
-        pdf_paths = glob.glob(path, recursive=True)
-        
-        all_docs = []
-        for path in pdf_paths:
-            loader = PyPDFLoader(path)
-            docs = loader.load()
-            all_docs.extend(docs)
-        logger.info(f"Loaded {len(all_docs)} documents")
-    except Exception as e:
-        logger.error(f"Error loading documents: {e}")
-        return None
+def ingest_stats(corpus: str, documents: int = 0, deleted: int = 0, chunks: int = 0, resumed: int = 0, failed: int = 0) -> Dict:
+    """Summary of an ingestion run; all zeros when the corpus was already up to date."""
+    return {"corpus": corpus, "documents": documents, "deleted": deleted, "chunks": chunks, "resumed": resumed, "failed": failed}
 
-    # print the number of documents loaded
-    logger.info(f"Loaded {len(all_docs)} documents")
 
+def load_documents(path: str, config: Optional[Config] = None, embeddings: Optional[Embeddings] = None,
+                   corpus: Optional[str] = None) -> Optional[Dict]:
+    """Incrementally load documents from the documents directory.
+
+    Only PDFs that are new or whose content changed since the last run are parsed
+    and embedded; chunks of deleted PDFs are removed from the vectorstore. The BM25
+    keyword index used by hybrid retrieval is kept in sync with the vectorstore.
+    Stored chunks are checkpointed batch by batch, so an interrupted run resumes
+    where it stopped; Weaviate imports go through the gRPC bulk writer.
+    Gemini embeddings are used unless an embeddings backend is given. Documents go into
+    the named corpus (Config.CORPUS by default), which has its own collection or tenant,
+    manifest and keyword index.
+    Returns:
+        The run's ingest_stats (zero counts if nothing changed), or None if the run failed.
+    """
+    target = resolve_corpus(config or Config(), corpus)
+    config = target.config
+    os.environ["GOOGLE_API_KEY"] = config.GOOGLE_API_KEY
+    manifest = IngestionManifest(config.MANIFEST_PATH).load()
+    checkpoint = ImportCheckpoint(config.IMPORT_CHECKPOINT_PATH).load()
+    keyword_index = open_keyword_index(config)
+    indexed = keyword_index.source_hashes() if keyword_index is not None else None
+
+    trace = {}
     try:
-        text_splitter = RecursiveCharacterTextSplitter(chunk_size=config.CHUNK_SIZE)
-        chunks = text_splitter.split_documents(all_docs)
-        logger.info(f"Split {len(all_docs)} documents into {len(chunks)} chunks")
-        
-        # Sanitize metadata keys to be valid GraphQL property names
-        # Replace dots and other invalid characters with underscores
-        for chunk in chunks:
-            if chunk.metadata:
-                sanitized_metadata = {}
-                for key, value in chunk.metadata.items():
-                    # Replace dots and other invalid chars with underscores
-                    sanitized_key = key.replace('.', '_').replace('-', '_').replace(' ', '_')
-                    # Ensure it starts with a letter or underscore
-                    if sanitized_key and not sanitized_key[0].isalpha() and sanitized_key[0] != '_':
-                        sanitized_key = '_' + sanitized_key
-                    # Truncate to 230 characters (GraphQL limit)
-                    sanitized_key = sanitized_key[:230]
-                    sanitized_metadata[sanitized_key] = value
-                chunk.metadata = sanitized_metadata
+        with metrics.span("ingest.scan", trace):
+            pdf_paths = sorted(glob.glob(path, recursive=True))
+            changed = {}
+            for pdf_path in pdf_paths:
+                content_hash = manifest.check(pdf_path)
+                if content_hash:
+                    changed[pdf_path] = content_hash
+                elif indexed is not None and indexed.get(pdf_path) != manifest.get(pdf_path)["sha256"]:
+                    # Stored before the keyword index existed: re-ingest (embeddings come from the cache)
+                    changed[pdf_path] = manifest.get(pdf_path)["sha256"]
+            deleted = [source for source in dict.fromkeys(manifest.sources() + checkpoint.sources()) if not os.path.exists(source)]
     except Exception as e:
-        logger.error(f"Error splitting documents: {e}")
+        logger.error(f"Error scanning documents: {e}")
         return None
 
+    logger.info(
+        f"Found {len(pdf_paths)} documents: {len(changed)} new or changed, "
+        f"{len(deleted)} deleted, {len(pdf_paths) - len(changed)} unchanged"
+    )
+    if not changed and not deleted:
+        # Persist refreshed stat info of touched files
+        manifest.save()
+        logger.info("Vectorstore is up to date")
+        if keyword_index is not None:
+            keyword_index.close()
+        return ingest_stats(target.name)
+
     try:
-        embeddings = GoogleGenerativeAIEmbeddings(model=config.EMBEDDINGS_MODEL_NAME, api_key=config.GOOGLE_API_KEY)
+        embeddings = BatchEmbeddings.from_config(
+            with_dimensions(embeddings or GoogleGenerativeAIEmbeddings(model=config.EMBEDDINGS_MODEL_NAME, api_key=config.GOOGLE_API_KEY), config),
+            config,
+        )
     except Exception as e:
         logger.error(f"Error creating embeddings: {e}")
         return None
 
+    manager = create_store_manager(config)
+    writer = None
+    import_stats = {"resumed": 0, "failed": 0}
+    # Files with chunks the writer could not store; kept out of the manifest so the next run retries them
+    failed_sources = set()
     try:
-        # Use the v4 client with langchain-weaviate
-        client = weaviate.connect_to_local()
-        vectorstore = WeaviateVectorStore.from_documents(
-            documents=chunks,
-            embedding=embeddings,
-            client=client,
-            index_name="Documents",
-            text_key="text"
-        )
-        client.close()
+        vectorstore = manager.vectorstore(embeddings, target.index_name)
+        if config.VECTOR_STORE_BACKEND == "weaviate":
+            writer = manager.bulk_writer(embeddings, target.index_name, tenant=target.tenant)
+        for source in deleted:
+            old_ids = manifest.remove(source) + checkpoint.remove(source)
+            if old_ids:
+                vectorstore.delete(ids=old_ids, **target.store_kwargs)
+            if keyword_index is not None:
+                keyword_index.delete(old_ids)
+                keyword_index.remove_source(source)
+            logger.info(f"Removed {len(old_ids)} chunks of deleted document {source}")
+            manifest.save()
+            checkpoint.save()
+
+        def write_batch(batch: IngestBatch):
+            """Replace stale chunks, store the batch and record finished files."""
+            for source in batch.started:
+                entry = manifest.get(source)
+                # Objects an interrupted run already stored for this version are kept
+                stale = set(entry["chunk_ids"] if entry else ()) | checkpoint.stale(source, changed[source])
+                stale -= checkpoint.written(source, changed[source])
+                if stale:
+                    vectorstore.delete(ids=sorted(stale), **target.store_kwargs)
+                    if keyword_index is not None:
+                        keyword_index.delete(sorted(stale))
+            chunks, ids = [], []
+            for chunk, chunk_id in zip(batch.chunks, batch.ids):
+                if chunk_id in checkpoint.written(chunk.metadata["source"], changed[chunk.metadata["source"]]):
+                    import_stats["resumed"] += 1
+                else:
+                    chunks.append(chunk)
+                    ids.append(chunk_id)
+            failed = set()
+            if chunks:
+                texts = [chunk.page_content for chunk in chunks]
+                metadatas = [chunk.metadata for chunk in chunks]
+                with metrics.span("ingest.write", trace):
+                    if writer is not None:
+                        failed = set(writer.write(ids, texts, metadatas, embeddings.embed_documents(texts)))
+                    else:
+                        vectorstore.add_documents(chunks, ids=ids, **target.store_kwargs)
+                stored = [i for i, chunk_id in enumerate(ids) if chunk_id not in failed]
+                metrics.inc("ingest_chunks_total", len(stored))
+                if keyword_index is not None:
+                    with metrics.span("ingest.keyword_index", trace):
+                        keyword_index.add([ids[i] for i in stored], [texts[i] for i in stored], [metadatas[i] for i in stored])
+                for i in stored:
+                    source = metadatas[i]["source"]
+                    checkpoint.add(source, changed[source], [ids[i]])
+                for i, chunk_id in enumerate(ids):
+                    if chunk_id in failed:
+                        failed_sources.add(metadatas[i]["source"])
+                import_stats["failed"] += len(failed)
+            # Record each file as soon as it is stored so an interrupted run can resume
+            for source, (content_hash, chunk_ids) in batch.finished.items():
+                if source in failed_sources:
+                    logger.error(f"Some chunks of {source} could not be stored; it will be retried on the next run")
+                    continue
+                manifest.record(source, content_hash, chunk_ids)
+                checkpoint.remove(source)
+                if keyword_index is not None:
+                    keyword_index.record_source(source, content_hash)
+                logger.info(f"Loaded {len(chunk_ids)} chunks of {source}")
+            if batch.finished:
+                manifest.save()
+            checkpoint.save()
+
+        with metrics.span("ingest.pipeline", trace):
+            total_chunks = run_pipeline(
+                changed,
+                write_batch,
+                chunk_size=config.CHUNK_SIZE,
+                chunk_overlap=config.CHUNK_OVERLAP,
+                workers=config.INGEST_WORKERS,
+                batch_size=config.INGEST_BATCH_SIZE,
+                queue_size=config.INGEST_QUEUE_SIZE,
+            )
+        if isinstance(vectorstore, LocalVectorStore) and config.LOCAL_INDEX_IVF_LISTS:
+            with metrics.span("ingest.build_ivf", trace):
+                vectorstore.build_ivf(config.LOCAL_INDEX_IVF_LISTS)
     except Exception as e:
-        logger.error(f"Error creating vectorstore: {e}")
+        logger.error(f"Error updating vectorstore: {e}")
         return None
+    finally:
+        manager.close()
+        if keyword_index is not None:
+            keyword_index.close()
 
-    logger.info(f"Loaded {len(chunks)} chunks into vectorstore")
-    return vectorstore
+    logger.info(
+        f"Loaded {total_chunks} chunks into corpus {target.name}; embeddings: {embeddings.stats['embedded']} computed, "
+        f"{embeddings.stats['cached']} from cache, {embeddings.chunks_per_second:.1f} chunks/s"
+    )
+    if import_stats["resumed"]:
+        logger.info(f"Skipped {import_stats['resumed']} chunks stored by an interrupted run")
+    if writer is not None:
+        logger.info(
+            f"Weaviate bulk import: {writer.stats['objects']} objects in {writer.stats['seconds']:.1f}s "
+            f"({writer.objects_per_second:.1f} objects/s), {writer.stats['retried']} retried, {writer.stats['failed']} failed"
+        )
+    metrics.inc("ingest_failed_objects_total", import_stats["failed"])
+    metrics.inc("ingest_documents_total", len(changed))
+    metrics.inc("ingest_embedding_requests_total", embeddings.stats["requests"])
+    metrics.log_request(
+        operation="ingest",
+        documents=len(changed),
+        deleted=len(deleted),
+        chunks=total_chunks,
+        resumed=import_stats["resumed"],
+        failed=import_stats["failed"],
+        embeddings=embeddings.stats,
+        bulk_import=writer.stats if writer is not None else None,
+        stages_ms=trace,
+    )
+    return ingest_stats(target.name, len(changed), len(deleted), total_chunks, import_stats["resumed"], import_stats["failed"])
 
 if __name__ == "__main__":
-    load_documents("documents/*.pdf")
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Incrementally load PDFs into a corpus.")
+    parser.add_argument("path", nargs="?", default="documents/*.pdf", help="Glob of the PDFs to load")
+    parser.add_argument("--corpus", help="Corpus to load into (default: Config.CORPUS)")
+    args = parser.parse_args()
+    stats = load_documents(args.path, corpus=args.corpus)
+    sys.exit(0 if stats is not None and not stats["failed"] else 1)
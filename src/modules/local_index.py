@@ -0,0 +1,377 @@
+import asyncio
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from typing import Any, Iterable, Iterator, List, Optional, Tuple
+import numpy as np
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+from langchain_core.vectorstores import VectorStore
+from src.config.logs import logger
+
+
+def _appended(buffer: np.ndarray, size: int, values: np.ndarray) -> np.ndarray:
+    """Write values after the first `size` items of a growable buffer, doubling it when full."""
+    if size + len(values) > len(buffer):
+        grown = np.zeros(max(2 * len(buffer), size + len(values)), dtype=buffer.dtype)
+        grown[:size] = buffer[:size]
+        buffer = grown
+    buffer[size:size + len(values)] = values
+    return buffer
+
+
+class LocalVectorStore(VectorStore):
+    """In-process vector index: float32 vectors in a memory-mapped file plus a SQLite sidecar.
+
+    Vectors are L2-normalized on insert so cosine similarity is a single matrix-vector
+    product. Rows are append-only; deletes and updates mark the old row as deleted
+    until `compact()` rewrites the files. An optional IVF index (k-means lists) makes
+    search approximate and sublinear for larger corpora.
+    """
+    VECTORS_FILE = "vectors.f32"
+    META_FILE = "meta.db"
+    IVF_FILE = "ivf.npz"
+
+    def __init__(self, path: str, embedding: Embeddings, ivf_probes: int = 8):
+        """Open (or create) the index stored in the `path` directory."""
+        os.makedirs(path, exist_ok=True)
+        self.path = path
+        self._embedding = embedding
+        self.ivf_probes = ivf_probes
+        self._lock = threading.RLock()
+        self._conn = sqlite3.connect(os.path.join(path, self.META_FILE), check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS chunks (
+                row INTEGER PRIMARY KEY,
+                id TEXT NOT NULL,
+                text TEXT NOT NULL,
+                metadata TEXT NOT NULL,
+                deleted INTEGER NOT NULL DEFAULT 0
+            )
+        """)
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_chunks_id ON chunks (id)")
+        self._conn.execute("CREATE TABLE IF NOT EXISTS info (key TEXT PRIMARY KEY, value TEXT NOT NULL)")
+        self._conn.commit()
+        self._data_version = None
+        self.refresh()
+
+    @property
+    def embeddings(self) -> Optional[Embeddings]:
+        return self._embedding
+
+    @property
+    def _vectors_path(self) -> str:
+        return os.path.join(self.path, self.VECTORS_FILE)
+
+    def _get_info(self, key: str) -> Optional[str]:
+        row = self._conn.execute("SELECT value FROM info WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else None
+
+    def refresh(self):
+        """Re-map the vector file if another connection (e.g. ingestion) changed the index."""
+        with self._lock:
+            data_version = self._conn.execute("PRAGMA data_version").fetchone()[0]
+            if data_version == self._data_version:
+                return
+            self._data_version = data_version
+            dim = self._get_info("dim")
+            self.dim = int(dim) if dim else 0
+            rows = self._conn.execute("SELECT COUNT(*) FROM chunks").fetchone()[0]
+            self._map_vectors(rows)
+            self._deleted_buffer = np.zeros(rows, dtype=bool)
+            deleted_rows = [row for (row,) in self._conn.execute("SELECT row FROM chunks WHERE deleted = 1")]
+            self._deleted_buffer[deleted_rows] = True
+            self._deleted = self._deleted_buffer[:rows]
+            self._load_ivf(rows)
+
+    def _map_vectors(self, rows: int):
+        if self.dim and rows:
+            self._vectors = np.memmap(self._vectors_path, dtype=np.float32, mode="r", shape=(rows, self.dim))
+        else:
+            self._vectors = np.zeros((0, self.dim), dtype=np.float32)
+
+    def _appended_rows(self, vectors: np.ndarray, deleted_rows: List[int]):
+        """Bring the in-memory state up to date after this process appended `vectors` and deleted rows.
+
+        Only the new rows are mapped, flagged and assigned to IVF lists; a full refresh is
+        left to changes made by other processes, which show up in PRAGMA data_version.
+        """
+        start = len(self._deleted)
+        rows = start + len(vectors)
+        self._map_vectors(rows)
+        self._deleted_buffer = _appended(self._deleted_buffer, start, np.zeros(len(vectors), dtype=bool))
+        self._deleted = self._deleted_buffer[:rows]
+        self._deleted[deleted_rows] = True
+        if self._centroids is not None and len(vectors):
+            self._assignments_buffer = _appended(
+                self._assignments_buffer, start, np.argmax(vectors @ self._centroids.T, axis=1).astype(np.int32)
+            )
+            self._assignments = self._assignments_buffer[:rows]
+
+    def _reload(self):
+        # data_version only changes for commits made by other connections
+        self._data_version = None
+        self.refresh()
+
+    def _load_ivf(self, rows: int):
+        ivf_path = os.path.join(self.path, self.IVF_FILE)
+        self._centroids = None
+        self._assignments = None
+        self._assignments_buffer = None
+        if not os.path.exists(ivf_path):
+            return
+        ivf = np.load(ivf_path)
+        centroids, assignments = ivf["centroids"], ivf["assignments"]
+        if rows > len(assignments):
+            # Rows added after the index was built go to their nearest list
+            new_rows = np.asarray(self._vectors[len(assignments):rows])
+            assignments = np.concatenate([assignments, np.argmax(new_rows @ centroids.T, axis=1).astype(np.int32)])
+        self._centroids, self._assignments = centroids, assignments
+        self._assignments_buffer = assignments
+
+    def __len__(self) -> int:
+        """Number of live (not deleted) vectors."""
+        return int(len(self._deleted) - self._deleted.sum())
+
+    def add_texts(self, texts: Iterable[str], metadatas: Optional[List[dict]] = None, ids: Optional[List[str]] = None, **kwargs: Any) -> List[str]:
+        """Embed and append texts; an existing id is replaced."""
+        texts = list(texts)
+        if not texts:
+            return []
+        ids = list(ids) if ids else [str(uuid.uuid4()) for _ in texts]
+        metadatas = metadatas or [{} for _ in texts]
+        vectors = kwargs.get("vectors")
+        if vectors is None:
+            vectors = self._embedding.embed_documents(texts)
+        return self.add_vectors(np.asarray(vectors, dtype=np.float32), texts, metadatas, ids)
+
+    def add_vectors(self, vectors: np.ndarray, texts: List[str], metadatas: List[dict], ids: List[str]) -> List[str]:
+        """Append precomputed vectors with their texts, metadata and ids."""
+        vectors = vectors / np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+        with self._lock:
+            self.refresh()
+            if not self.dim:
+                self.dim = vectors.shape[1]
+                self._conn.execute("INSERT OR REPLACE INTO info (key, value) VALUES ('dim', ?)", (str(self.dim),))
+            elif vectors.shape[1] != self.dim:
+                raise ValueError(f"Vector dimension {vectors.shape[1]} does not match index dimension {self.dim}")
+            start = self._conn.execute("SELECT COALESCE(MAX(row) + 1, 0) FROM chunks").fetchone()[0]
+            # Vectors are written first so a crash never leaves metadata pointing past the file
+            with open(self._vectors_path, "r+b" if os.path.exists(self._vectors_path) else "wb") as f:
+                f.seek(start * self.dim * 4)
+                f.write(vectors.astype(np.float32).tobytes())
+                f.truncate()
+            with self._conn:
+                deleted_rows = self._mark_deleted(ids)
+                self._conn.executemany(
+                    "INSERT INTO chunks (row, id, text, metadata) VALUES (?, ?, ?, ?)",
+                    [(start + i, ids[i], texts[i], json.dumps(metadatas[i], default=str)) for i in range(len(texts))],
+                )
+            if start == len(self._deleted):
+                self._appended_rows(vectors.astype(np.float32), deleted_rows)
+            else:
+                self._reload()
+        return ids
+
+    def _mark_deleted(self, ids: List[str]) -> List[int]:
+        """Flag the live rows of these ids as deleted and return them."""
+        deleted_rows = []
+        for i in range(0, len(ids), 500):
+            part = ids[i:i + 500]
+            placeholders = ",".join("?" * len(part))
+            deleted_rows.extend(row for (row,) in self._conn.execute(
+                f"SELECT row FROM chunks WHERE deleted = 0 AND id IN ({placeholders})", part
+            ))
+            self._conn.execute(f"UPDATE chunks SET deleted = 1 WHERE deleted = 0 AND id IN ({placeholders})", part)
+        return deleted_rows
+
+    def delete(self, ids: Optional[List[str]] = None, **kwargs: Any) -> Optional[bool]:
+        """Delete vectors by id."""
+        if ids is None:
+            raise ValueError("No ids provided to delete.")
+        with self._lock:
+            self.refresh()
+            with self._conn:
+                deleted_rows = self._mark_deleted(list(ids))
+            self._deleted[deleted_rows] = True
+        return True
+
+    def _candidate_rows(self, query: np.ndarray) -> Optional[np.ndarray]:
+        """Rows of the IVF lists closest to the query, or None for exact search."""
+        if self._centroids is None:
+            return None
+        probes = min(self.ivf_probes, len(self._centroids))
+        lists = np.argpartition(-(self._centroids @ query), probes - 1)[:probes]
+        return np.flatnonzero(np.isin(self._assignments, lists))
+
+    def _filtered_rows(self, filter, limit: int) -> np.ndarray:
+        """Live rows whose metadata matches a MetadataFilter, looked up in the sidecar."""
+        clause, params = filter.to_sql("metadata")
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT row FROM chunks WHERE deleted = 0 AND row < ? AND {clause}", [limit, *params]
+            ).fetchall()
+        return np.fromiter((row for row, in rows), dtype=np.int64, count=len(rows))
+
+    def search_by_vector(self, embedding: List[float], k: int = 4, filter=None) -> List[Tuple[int, float]]:
+        """Top-k (row, cosine similarity) pairs for a query vector.
+
+        With a MetadataFilter only the matching rows are scored (exactly, bypassing IVF lists).
+        """
+        self.refresh()
+        vectors, deleted = self._vectors, self._deleted
+        if not len(vectors):
+            return []
+        query = np.asarray(embedding, dtype=np.float32)
+        query = query / max(float(np.linalg.norm(query)), 1e-12)
+        rows = self._filtered_rows(filter, len(vectors)) if filter is not None else self._candidate_rows(query)
+        if rows is None:
+            scores = vectors @ query
+            scores[deleted] = -np.inf
+            rows = np.arange(len(scores))
+        else:
+            rows = rows[~deleted[rows]]
+            scores = vectors[rows] @ query
+        if not len(rows):
+            return []
+        k = min(k, len(rows))
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return [(int(rows[i]), float(scores[i])) for i in top if np.isfinite(scores[i])]
+
+    def _documents(self, hits: List[Tuple[int, float]]) -> List[Tuple[Document, float]]:
+        if not hits:
+            return []
+        rows = [row for row, _ in hits]
+        with self._lock:
+            found = {
+                row: (chunk_id, text, metadata)
+                for row, chunk_id, text, metadata in self._conn.execute(
+                    f"SELECT row, id, text, metadata FROM chunks WHERE row IN ({','.join('?' * len(rows))})", rows
+                )
+            }
+        return [
+            (Document(id=found[row][0], page_content=found[row][1], metadata=json.loads(found[row][2])), score)
+            for row, score in hits if row in found
+        ]
+
+    def similarity_search_with_score(self, query: str, k: int = 4, **kwargs: Any) -> List[Tuple[Document, float]]:
+        """Return documents most similar to the query with their cosine similarity (`filter`: a MetadataFilter)."""
+        return self._documents(self.search_by_vector(self._embedding.embed_query(query), k, kwargs.get("filter")))
+
+    def similarity_search_by_vector(self, embedding: List[float], k: int = 4, **kwargs: Any) -> List[Document]:
+        """Return documents most similar to the query vector."""
+        return [doc for doc, _ in self._documents(self.search_by_vector(embedding, k, kwargs.get("filter")))]
+
+    def similarity_search(self, query: str, k: int = 4, **kwargs: Any) -> List[Document]:
+        """Return documents most similar to the query."""
+        return [doc for doc, _ in self.similarity_search_with_score(query, k, **kwargs)]
+
+    async def asimilarity_search_with_score(self, query: str, k: int = 4, **kwargs: Any) -> List[Tuple[Document, float]]:
+        """Embed the query on the event loop and scan the index in a worker thread."""
+        embedding = await self._embedding.aembed_query(query)
+        return await asyncio.to_thread(lambda: self._documents(self.search_by_vector(embedding, k, kwargs.get("filter"))))
+
+    async def asimilarity_search(self, query: str, k: int = 4, **kwargs: Any) -> List[Document]:
+        """Async variant of similarity_search."""
+        return [doc for doc, _ in await self.asimilarity_search_with_score(query, k, **kwargs)]
+
+    def _select_relevance_score_fn(self):
+        # Cosine similarity in [-1, 1] to a relevance score in [0, 1]
+        return lambda score: (score + 1) / 2
+
+    def build_ivf(self, lists: int, iterations: int = 10, sample_size: int = 50000):
+        """Build the approximate IVF index with `lists` k-means centroids."""
+        self.refresh()
+        live = np.flatnonzero(~self._deleted)
+        if len(live) < lists:
+            logger.info(f"Not enough vectors ({len(live)}) for {lists} IVF lists, keeping exact search")
+            return
+        start = time.perf_counter()
+        rng = np.random.default_rng(0)
+        sample = np.asarray(self._vectors[np.sort(rng.choice(live, min(sample_size, len(live)), replace=False))])
+        centroids = sample[rng.choice(len(sample), lists, replace=False)]
+        for _ in range(iterations):
+            assignments = np.argmax(sample @ centroids.T, axis=1)
+            for i in range(lists):
+                members = sample[assignments == i]
+                if len(members):
+                    centroid = members.mean(axis=0)
+                    centroids[i] = centroid / max(float(np.linalg.norm(centroid)), 1e-12)
+        # Assign all rows in blocks to keep memory flat
+        assignments = np.concatenate([
+            np.argmax(np.asarray(self._vectors[i:i + 65536]) @ centroids.T, axis=1)
+            for i in range(0, len(self._vectors), 65536)
+        ]).astype(np.int32)
+        with self._lock:
+            np.savez(os.path.join(self.path, self.IVF_FILE), centroids=centroids.astype(np.float32), assignments=assignments)
+            # Recorded in the sidecar so other processes notice the new index on refresh
+            with self._conn:
+                self._conn.execute("INSERT OR REPLACE INTO info (key, value) VALUES ('ivf_lists', ?)", (str(lists),))
+            self._reload()
+        logger.info(f"Built IVF index with {lists} lists over {len(self._vectors)} vectors in {time.perf_counter() - start:.1f}s")
+
+    def ids(self) -> List[str]:
+        """Ids of the live chunks."""
+        with self._lock:
+            return [chunk_id for (chunk_id,) in self._conn.execute("SELECT id FROM chunks WHERE deleted = 0")]
+
+    def iter_chunks(self, batch_size: int = 1000) -> Iterator[Tuple[List[str], List[str], List[dict], np.ndarray]]:
+        """Live chunks in insertion order as (ids, texts, metadatas, vectors) batches."""
+        self.refresh()
+        vectors = self._vectors
+        last = -1
+        while True:
+            with self._lock:
+                rows = self._conn.execute(
+                    "SELECT row, id, text, metadata FROM chunks WHERE deleted = 0 AND row > ? AND row < ? ORDER BY row LIMIT ?",
+                    (last, len(vectors), batch_size),
+                ).fetchall()
+            if not rows:
+                return
+            last = rows[-1][0]
+            yield (
+                [chunk_id for _, chunk_id, _, _ in rows],
+                [text for _, _, text, _ in rows],
+                [json.loads(metadata) for _, _, _, metadata in rows],
+                np.asarray(vectors[[row for row, _, _, _ in rows]]),
+            )
+
+    def compact(self):
+        """Rewrite the index without deleted rows."""
+        with self._lock:
+            self.refresh()
+            live = np.flatnonzero(~self._deleted)
+            vectors = np.asarray(self._vectors[live])
+            rows = self._conn.execute("SELECT id, text, metadata FROM chunks WHERE deleted = 0 ORDER BY row").fetchall()
+            tmp_path = f"{self._vectors_path}.tmp"
+            vectors.astype(np.float32).tofile(tmp_path)
+            with self._conn:
+                self._conn.execute("DELETE FROM info WHERE key = 'ivf_lists'")
+                self._conn.execute("DELETE FROM chunks")
+                self._conn.executemany(
+                    "INSERT INTO chunks (row, id, text, metadata) VALUES (?, ?, ?, ?)",
+                    [(i, *row) for i, row in enumerate(rows)],
+                )
+                self._vectors = np.zeros((0, self.dim), dtype=np.float32)
+                os.replace(tmp_path, self._vectors_path)
+            ivf_path = os.path.join(self.path, self.IVF_FILE)
+            if os.path.exists(ivf_path):
+                os.remove(ivf_path)
+            self._reload()
+        logger.info(f"Compacted local index to {len(rows)} vectors")
+
+    @classmethod
+    def from_texts(cls, texts: List[str], embedding: Embeddings, metadatas: Optional[List[dict]] = None, path: str = "local_index", **kwargs: Any) -> "LocalVectorStore":
+        """Create an index at `path` from texts."""
+        store = cls(path, embedding)
+        store.add_texts(texts, metadatas, ids=kwargs.get("ids"))
+        return store
+
+    def close(self):
+        """Close the metadata database."""
+        self._conn.close()
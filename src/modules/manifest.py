@@ -0,0 +1,93 @@
+import hashlib
+import json
+import os
+import uuid
+from typing import Dict, List, Optional
+from src.config.logs import logger
+
+# Namespace for deterministic chunk ids, so re-ingesting the same file yields the same uuids
+CHUNK_NAMESPACE = uuid.UUID("6f1c2a4e-9b7d-4c35-8e21-3a5d0f9b7c11")
+
+
+def file_sha256(path: str, block_size: int = 1 << 20) -> str:
+    """Compute the sha256 of a file without reading it fully into memory."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(block_size), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def chunk_uuid(source: str, content_hash: str, index: int) -> str:
+    """Deterministic id for the index-th chunk of a given version of a source file."""
+    return str(uuid.uuid5(CHUNK_NAMESPACE, f"{source}:{content_hash}:{index}"))
+
+
+class IngestionManifest:
+    """Manifest of ingested files: path, size, mtime, content hash and chunk ids."""
+    def __init__(self, path: str = "ingestion_manifest.json"):
+        """Initialize the manifest class."""
+        self.path = path
+        self.entries: Dict[str, Dict] = {}
+
+    def load(self) -> "IngestionManifest":
+        """Load the manifest from disk, starting empty if it does not exist."""
+        if os.path.exists(self.path):
+            with open(self.path, "r", encoding="utf-8") as f:
+                self.entries = json.load(f).get("files", {})
+            logger.info(f"Loaded ingestion manifest with {len(self.entries)} files")
+        return self
+
+    def save(self):
+        """Atomically write the manifest to disk."""
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"version": self.version, "files": self.entries}, f, indent=2)
+        os.replace(tmp_path, self.path)
+
+    @property
+    def version(self) -> str:
+        """Corpus version: changes whenever any file is added, changed or removed."""
+        digest = hashlib.sha256()
+        for source in sorted(self.entries):
+            digest.update(f"{source}:{self.entries[source]['sha256']}\n".encode())
+        return digest.hexdigest()[:16]
+
+    def get(self, source: str) -> Optional[Dict]:
+        """Return the manifest entry for a file, if any."""
+        return self.entries.get(source)
+
+    def sources(self) -> List[str]:
+        """Return all files recorded in the manifest."""
+        return list(self.entries)
+
+    def check(self, source: str) -> Optional[str]:
+        """Return the content hash of a file if it changed since the last ingestion, else None.
+
+        Size and mtime are compared first so unchanged files are never re-hashed.
+        """
+        stat = os.stat(source)
+        entry = self.entries.get(source)
+        if entry and entry["size"] == stat.st_size and entry["mtime"] == stat.st_mtime:
+            return None
+        content_hash = file_sha256(source)
+        if entry and entry["sha256"] == content_hash:
+            # Touched but not modified: refresh stat info so the next run skips hashing
+            entry["size"], entry["mtime"] = stat.st_size, stat.st_mtime
+            return None
+        return content_hash
+
+    def record(self, source: str, content_hash: str, chunk_ids: List[str]):
+        """Record a freshly ingested file."""
+        stat = os.stat(source)
+        self.entries[source] = {
+            "size": stat.st_size,
+            "mtime": stat.st_mtime,
+            "sha256": content_hash,
+            "chunk_ids": chunk_ids,
+        }
+
+    def remove(self, source: str) -> List[str]:
+        """Drop a file from the manifest and return the chunk ids it owned."""
+        entry = self.entries.pop(source, None)
+        return entry["chunk_ids"] if entry else []
@@ -0,0 +1,175 @@
+import datetime
+import os
+import queue
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from dataclasses import dataclass, field
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+from langchain_community.document_loaders import PyPDFLoader
+from langchain_core.documents import Document
+from langchain_text_splitters import RecursiveCharacterTextSplitter
+from src.config.logs import logger
+from src.modules.manifest import chunk_uuid
+
+_text_splitter = None
+
+
+def sanitize_metadata(metadata: Dict) -> Dict:
+    """Sanitize metadata keys to be valid GraphQL property names."""
+    sanitized_metadata = {}
+    for key, value in metadata.items():
+        # Replace dots and other invalid chars with underscores
+        sanitized_key = key.replace('.', '_').replace('-', '_').replace(' ', '_')
+        # Ensure it starts with a letter or underscore
+        if sanitized_key and not sanitized_key[0].isalpha() and sanitized_key[0] != '_':
+            sanitized_key = '_' + sanitized_key
+        # Truncate to 230 characters (GraphQL limit)
+        sanitized_key = sanitized_key[:230]
+        sanitized_metadata[sanitized_key] = value
+    return sanitized_metadata
+
+
+def document_date(metadata: Dict) -> Optional[str]:
+    """Creation date of a PDF as an RFC 3339 UTC timestamp (the `date` property retrieval filters on)."""
+    try:
+        parsed = datetime.datetime.fromisoformat(str(metadata.get("creationdate") or "").strip())
+    except ValueError:
+        return None
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=datetime.timezone.utc)
+    return parsed.astimezone(datetime.timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ")
+
+
+def split_pdf(path: str, chunk_size: int, chunk_overlap: int) -> Tuple[List[Document], int]:
+    """Parse a single PDF page by page and split each page as it is read.
+
+    Runs inside a worker process. Returns the chunks and the number of pages.
+    """
+    global _text_splitter
+    if _text_splitter is None:
+        _text_splitter = RecursiveCharacterTextSplitter(chunk_size=chunk_size, chunk_overlap=chunk_overlap, add_start_index=True)
+    chunks = []
+    pages = 0
+    for page in PyPDFLoader(path).lazy_load():
+        pages += 1
+        date = document_date(page.metadata)
+        if date:
+            page.metadata["date"] = date
+        for chunk in _text_splitter.split_documents([page]):
+            if chunk.metadata:
+                chunk.metadata = sanitize_metadata(chunk.metadata)
+            chunks.append(chunk)
+    return chunks, pages
+
+
+def iter_parsed(sources: List[str], chunk_size: int, chunk_overlap: int, workers: int, max_pending: int) -> Iterator[Tuple[str, List[Document], int]]:
+    """Parse PDFs in a process pool, yielding (source, chunks, pages) as files complete.
+
+    At most `max_pending` files are in flight so memory does not grow with the corpus.
+    """
+    pending = {}
+    remaining = iter(sources)
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        while True:
+            while len(pending) < max_pending:
+                source = next(remaining, None)
+                if source is None:
+                    break
+                pending[executor.submit(split_pdf, source, chunk_size, chunk_overlap)] = source
+            if not pending:
+                return
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                source = pending.pop(future)
+                try:
+                    chunks, pages = future.result()
+                except Exception as e:
+                    logger.error(f"Error loading document {source}: {e}")
+                    continue
+                yield source, chunks, pages
+
+
+@dataclass
+class IngestBatch:
+    """A fixed-size batch of chunks flowing from the parsers to the writer."""
+    chunks: List[Document] = field(default_factory=list)
+    ids: List[str] = field(default_factory=list)
+    # Files whose first chunk is in this batch (stale chunks must be removed first)
+    started: List[str] = field(default_factory=list)
+    # Files whose last chunk is in this batch, with all of their chunk ids
+    finished: Dict[str, Tuple[str, List[str]]] = field(default_factory=dict)
+
+
+class BatchWriter(threading.Thread):
+    """Background thread draining a bounded queue of batches into `write_batch`."""
+    def __init__(self, write_batch: Callable[[IngestBatch], None], queue_size: int):
+        """Initialize the batch writer thread."""
+        super().__init__(daemon=True)
+        self.write_batch = write_batch
+        self.queue = queue.Queue(maxsize=queue_size)
+        self.error = None
+
+    def run(self):
+        """Write batches until the sentinel is received."""
+        while True:
+            batch = self.queue.get()
+            if batch is None:
+                return
+            if self.error is not None:
+                # Keep draining so the producer never blocks on a dead writer
+                continue
+            try:
+                self.write_batch(batch)
+            except Exception as e:
+                self.error = e
+
+
+def run_pipeline(files: Dict[str, str], write_batch: Callable[[IngestBatch], None], chunk_size: int, chunk_overlap: int, workers: int = 0, batch_size: int = 100, queue_size: int = 4) -> int:
+    """Stream files through parse -> split -> fixed-size batches -> write_batch.
+
+    Args:
+        files: Mapping of source path to content hash.
+        write_batch: Callback that stores a batch; called from a single writer thread.
+        workers: Number of parser processes, 0 for one per core.
+        batch_size: Number of chunks per batch.
+        queue_size: Maximum number of batches waiting for the writer.
+    Returns:
+        The number of chunks written.
+    """
+    workers = workers or os.cpu_count() or 1
+    writer = BatchWriter(write_batch, queue_size)
+    writer.start()
+    start = time.perf_counter()
+    total_pages = 0
+    total_chunks = 0
+    batch = IngestBatch()
+    try:
+        for source, chunks, pages in iter_parsed(list(files), chunk_size, chunk_overlap, workers, max_pending=workers * 2):
+            if writer.error is not None:
+                break
+            content_hash = files[source]
+            ids = [chunk_uuid(source, content_hash, i) for i in range(len(chunks))]
+            batch.started.append(source)
+            for chunk, chunk_id in zip(chunks, ids):
+                batch.chunks.append(chunk)
+                batch.ids.append(chunk_id)
+                if len(batch.chunks) >= batch_size:
+                    writer.queue.put(batch)
+                    batch = IngestBatch()
+            batch.finished[source] = (content_hash, ids)
+            total_pages += pages
+            total_chunks += len(chunks)
+        if batch.chunks or batch.started or batch.finished:
+            writer.queue.put(batch)
+    finally:
+        writer.queue.put(None)
+        writer.join()
+    if writer.error is not None:
+        raise writer.error
+    elapsed = time.perf_counter() - start
+    logger.info(
+        f"Ingested {len(files)} files, {total_pages} pages, {total_chunks} chunks in {elapsed:.1f}s "
+        f"({total_pages / max(elapsed, 1e-9):.1f} pages/s, {total_chunks / max(elapsed, 1e-9):.1f} chunks/s)"
+    )
+    return total_chunks
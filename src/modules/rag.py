@@ -1,93 +1,632 @@
+import asyncio
+import threading
+import time
+import uuid
+from contextlib import aclosing, closing
+from functools import partial
 from pathlib import Path
+from typing import AsyncIterator, Callable, Dict, Iterator, List, Optional, Tuple, Union
 from langchain_google_genai import GoogleGenerativeAI
 from langchain_core.prompts import PromptTemplate
-from langchain_core.runnables import RunnablePassthrough
 from langchain_core.output_parsers import StrOutputParser
+from langchain_core.embeddings import Embeddings
 from langchain_google_genai import GoogleGenerativeAIEmbeddings
 from src.config.config import Config
 from src.config.logs import logger
-import weaviate
+from src.config.metrics import metrics
+from src.modules.admission import AdmissionController, AdmissionTimeout, SingleFlight
+from src.modules.cache import CachedQueryEmbeddings, CorpusVersion, TTLCache, normalize_question, text_digest
+from src.modules.context import pack_context
+from src.modules.corpora import Corpus, MetadataFilter, TenantActivity, resolve_corpus
 from src.modules.db import Database
+from src.modules.embeddings import BatchEmbeddings, RateLimiter, acall_with_retry, call_with_retry, estimate_tokens, with_dimensions
+from src.modules.history import HistoryManager
+from src.modules.keyword_index import open_keyword_index
+from src.modules.retrieval import Retriever
+from src.modules.vectorstore import create_store_manager
 import os
-from langchain_weaviate import WeaviateVectorStore
+
+BUSY_MESSAGE = "The assistant is busy right now, please try again in a moment."
+INTERRUPTED_MESSAGE = "\n\n_The answer was interrupted, please ask again._"
+# Turn statuses whose stream is an answer rather than an error notice
+ANSWERED_STATUSES = ("ok", "cache_hit", "coalesced")
 
 class Rag:
-    def __init__(self):
-        self.config = Config()
+    def __init__(self, config: Optional[Config] = None, embeddings: Optional[Embeddings] = None, model=None, db: Optional[Database] = None):
+        """Initialize the RAG engine; Gemini clients and the default database are used unless given."""
+        self.config = config or Config()
         os.environ["GOOGLE_API_KEY"] = self.config.GOOGLE_API_KEY
-        self.embeddings = GoogleGenerativeAIEmbeddings(model=self.config.EMBEDDINGS_MODEL_NAME)
-        self.model = GoogleGenerativeAI(model=self.config.LLM_MODEL_NAME)
-        self.db = Database()
+        self.query_cache = TTLCache(self.config.QUERY_CACHE_SIZE, self.config.QUERY_CACHE_TTL)
+        # Query embeddings get the same kind of rate limit and retries as ingestion, but their own
+        # buckets: each BatchEmbeddings (and each process) counts only its own calls against the quota
+        self.embeddings = CachedQueryEmbeddings(
+            BatchEmbeddings.from_config(
+                with_dimensions(embeddings or GoogleGenerativeAIEmbeddings(model=self.config.EMBEDDINGS_MODEL_NAME), self.config),
+                self.config,
+            ),
+            self.query_cache,
+        )
+        self.model = model or GoogleGenerativeAI(model=self.config.LLM_MODEL_NAME)
+        # Process-wide limits on model calls: concurrent turns, requests and tokens per minute,
+        # and one generation per identical prompt in flight
+        self.admission = AdmissionController(self.config.LLM_MAX_CONCURRENT, self.config.LLM_QUEUE_TIMEOUT)
+        self.llm_limiter = RateLimiter(self.config.LLM_REQUESTS_PER_MINUTE, self.config.LLM_TOKENS_PER_MINUTE)
+        self.flights = SingleFlight()
+        # Candidate vectors for MMR come from the ingestion embedding cache. The keyword index
+        # of the default corpus is opened up front, those of other corpora on first use
+        self.corpus = resolve_corpus(self.config)
+        self.keyword_index = open_keyword_index(self.corpus.config)
+        self.keyword_indexes = {self.corpus.name: self.keyword_index}
+        self._corpora_lock = threading.Lock()
+        self.retriever = Retriever(
+            self.config,
+            self.keyword_index,
+            document_embeddings=self.embeddings.embeddings if self.config.MMR_ENABLED else None,
+        )
+        self.db = db or Database(self.config.DB_PATH)
+        self.history = HistoryManager(
+            self.model,
+            self.db,
+            max_turns=self.config.HISTORY_MAX_TURNS,
+            token_budget=self.config.HISTORY_TOKEN_BUDGET,
+            summary_batch=self.config.HISTORY_SUMMARY_BATCH,
+            admission=self.admission,
+            limiter=self.llm_limiter,
+            retries=self.config.LLM_RETRIES,
+        )
+        # Retrieved documents keyed by (question, corpus, corpus version, filters) and answers
+        # keyed by the same plus the chat history
+        self.retrieval_cache = TTLCache(self.config.ANSWER_CACHE_SIZE, self.config.ANSWER_CACHE_TTL)
+        self.answer_cache = TTLCache(self.config.ANSWER_CACHE_SIZE, self.config.ANSWER_CACHE_TTL)
+        self.corpus_versions = {self.corpus.name: CorpusVersion(self.corpus.config.MANIFEST_PATH)}
+        self._cached_versions: Dict[str, str] = {}
+        # Corpora queried recently, when they are tenants that can be deactivated once idle
+        if self.config.CORPUS_IDLE_SECONDS > 0 and self.config.CORPUS_IDLE_STATUS != "inactive":
+            # Queries reactivate inactive tenants only; an offloaded corpus would stop answering
+            raise ValueError(f"Unsupported CORPUS_IDLE_STATUS: {self.config.CORPUS_IDLE_STATUS} (idle corpora can only be made inactive)")
+        self.tenant_activity = TenantActivity()
+        self._next_idle_check = time.monotonic() + self.config.CORPUS_IDLE_SECONDS
+        # One long-lived vectorstore client shared by every question instead of connecting per question
+        self.store = create_store_manager(self.config)
+        self.template_path = Path(__file__).parent / "../prompts" / "rag.jinja2"
+        self._template_mtime = None
+        self._chain = None
 
+    def _current_corpus_version(self, corpus: Corpus) -> str:
+        """Return the corpus version, dropping retrieval and answer caches when it changed."""
+        with self._corpora_lock:
+            if corpus.name not in self.corpus_versions:
+                self.corpus_versions[corpus.name] = CorpusVersion(corpus.config.MANIFEST_PATH)
+            reader = self.corpus_versions[corpus.name]
+        version = reader.get()
+        cached = self._cached_versions.get(corpus.name)
+        if version != cached:
+            if cached is not None:
+                logger.info(f"Corpus {corpus.name} changed ({cached} -> {version}), invalidating answer cache")
+                self.retrieval_cache.clear()
+                self.answer_cache.clear()
+            self._cached_versions[corpus.name] = version
+        return version
 
-    def get_response(self, question: str, session_id: str) -> str:
-        """Get a response from the RAG model.
-        Args:
-            question: The question to answer.
-            session_id: The session ID to get the conversation history from.
-        Returns:
-            The response from the RAG model.
-        """
-        # Get conversation history from database
+    def _keyword_index(self, corpus: Corpus):
+        """The corpus' keyword index (None in vector mode), opened on first use."""
+        with self._corpora_lock:
+            if corpus.name not in self.keyword_indexes:
+                self.keyword_indexes[corpus.name] = open_keyword_index(corpus.config)
+            return self.keyword_indexes[corpus.name]
+
+    def _search_kwargs(self, corpus: Corpus, filters: Optional[MetadataFilter]) -> Dict:
+        """Vectorstore search arguments scoping a search to the corpus' tenant and pre-filtering by metadata."""
+        if self.config.VECTOR_STORE_BACKEND != "weaviate":
+            return {"filter": filters} if filters is not None else {}
+        search_kwargs = dict(corpus.store_kwargs)
+        if filters is not None:
+            search_kwargs["filters"] = filters.to_weaviate()
+        return search_kwargs
+
+    def _deactivate_idle_tenants(self, corpus: Corpus):
+        """Record a query on a tenant corpus and, every CORPUS_IDLE_SECONDS, move tenants idle that long to CORPUS_IDLE_STATUS."""
+        if corpus.tenant is None or self.config.CORPUS_IDLE_SECONDS <= 0:
+            return
+        self.tenant_activity.touch(corpus.tenant)
+        now = time.monotonic()
+        if now < self._next_idle_check:
+            return
+        self._next_idle_check = now + self.config.CORPUS_IDLE_SECONDS
+        idle = self.tenant_activity.idle(self.config.CORPUS_IDLE_SECONDS)
         try:
-            messages = self.db.get_session(session_id)
-            chat_history = ""
-            if messages:
-                chat_history = "\n".join([f"{msg['role']}: {msg['content']}" for msg in messages])
+            self.store.set_tenant_status(corpus.index_name, idle, self.config.CORPUS_IDLE_STATUS)
         except Exception as e:
-            logger.error(f"Error getting conversation history: {e}")
-            chat_history = ""
-        
-        # Template with chat history
-        try:
-            template_path = Path(__file__).parent / "../prompts" / "rag.jinja2"
-            with open(template_path, 'r', encoding='utf-8') as f:
+            logger.warning(f"Could not mark idle corpora {idle} {self.config.CORPUS_IDLE_STATUS}: {e}")
+
+    def _generation_chain(self):
+        """Return the compiled prompt | model chain, rebuilt only when the template file changes."""
+        mtime = os.stat(self.template_path).st_mtime
+        if self._chain is None or mtime != self._template_mtime:
+            with open(self.template_path, 'r', encoding='utf-8') as f:
                 template_content = f.read()
             # Contextualize the question
             prompt = PromptTemplate(
                 input_variables=["chat_history", "context", "question"],
                 template=template_content
             )
-        except Exception as e:
-            logger.error(f"Error creating prompt: {e}")
-
-        # Use context manager to properly close the connection
-        with weaviate.connect_to_local() as client:
-            vectorstore = WeaviateVectorStore(
-                client=client,
-                index_name="Documents",
-                text_key="text",
-                embedding=self.embeddings,
-            )
-            # Create a retriever
+            self._chain = prompt | self.model | StrOutputParser()
+            self._template_mtime = mtime
+            logger.info(f"Loaded prompt template {self.template_path}")
+        return self._chain
+
+    def _retrieve(self, question: str, corpus: Corpus, filters: Optional[MetadataFilter]):
+        """Retrieve context from the corpus through the shared vectorstore, reconnecting once on failure."""
+        self._deactivate_idle_tenants(corpus)
+        for attempt in range(2):
             try:
-                retriever = vectorstore.as_retriever(
-                        search_type="similarity",
-                        search_kwargs={"k": 5}
-                    )
+                vectorstore = self.store.vectorstore(self.embeddings, corpus.index_name)
+                return self.retriever.retrieve(
+                    vectorstore, question, keyword_index=self._keyword_index(corpus),
+                    filters=filters, search_kwargs=self._search_kwargs(corpus, filters),
+                )
             except Exception as e:
-                logger.error(f"Error creating retriever: {e}")
-            # Create a retrieval chain
-            retrieval_chain = (
-                {
-                    "context": retriever, 
-                    "question": RunnablePassthrough(),
-                    "chat_history": lambda _: chat_history
-                }
-                | prompt
-                | self.model
-                | StrOutputParser()
+                if attempt:
+                    raise
+                logger.warning(f"Retrieval failed ({e}), reconnecting to the vectorstore")
+                self.store.invalidate()
+
+    async def _aretrieve(self, question: str, corpus: Corpus, filters: Optional[MetadataFilter]):
+        """Async variant of _retrieve using the async vectorstore client."""
+        await asyncio.to_thread(self._deactivate_idle_tenants, corpus)
+        for attempt in range(2):
+            try:
+                vectorstore = await self.store.avectorstore(self.embeddings, corpus.index_name)
+                keyword_index = await asyncio.to_thread(self._keyword_index, corpus)
+                return await self.retriever.aretrieve(
+                    vectorstore, question, keyword_index=keyword_index,
+                    filters=filters, search_kwargs=self._search_kwargs(corpus, filters),
+                )
+            except Exception as e:
+                if attempt:
+                    raise
+                logger.warning(f"Retrieval failed ({e}), reconnecting to the vectorstore")
+                await self.store.ainvalidate()
+
+    def _pack(self, documents: List, trace: Dict) -> Tuple[str, Dict]:
+        """Deduplicate, merge and pack retrieved candidates into the context token budget."""
+        with metrics.span("context_packing", trace):
+            context, stats = pack_context(
+                documents,
+                self.config.CONTEXT_TOKEN_BUDGET,
+                self.config.CONTEXT_DUPLICATE_THRESHOLD,
             )
-            # Invoke the retrieval chain
+        metrics.inc("rag_context_tokens_total", stats["tokens_raw"], stage="raw")
+        metrics.inc("rag_context_tokens_total", stats["tokens_packed"], stage="packed")
+        logger.info(
+            f"Context: {stats['candidates']} candidates -> {stats['passages']} passages "
+            f"({stats['merged']} merged, {stats['duplicates']} duplicates), "
+            f"~{stats['tokens_raw']} -> ~{stats['tokens_packed']} tokens"
+        )
+        return context, stats
+
+    def _retrieve_cached(self, question: str, corpus: Corpus, filters: Optional[MetadataFilter],
+                         retrieval_key, trace: Dict) -> Tuple[str, Dict]:
+        """Return the cached packed context for the question or retrieve, pack and cache it."""
+        packed = self.retrieval_cache.get(retrieval_key)
+        if packed is None:
+            with metrics.span("retrieval", trace):
+                documents = self._retrieve(question, corpus, filters)
+            packed = self._pack(documents, trace)
+            self.retrieval_cache.set(retrieval_key, packed)
+        return packed
+
+    async def _aretrieve_cached(self, question: str, corpus: Corpus, filters: Optional[MetadataFilter],
+                                retrieval_key, trace: Dict) -> Tuple[str, Dict]:
+        """Async variant of _retrieve_cached."""
+        packed = self.retrieval_cache.get(retrieval_key)
+        if packed is None:
+            with metrics.span("retrieval", trace):
+                documents = await self._aretrieve(question, corpus, filters)
+            packed = self._pack(documents, trace)
+            self.retrieval_cache.set(retrieval_key, packed)
+        return packed
+
+    def _close_keyword_indexes(self):
+        for keyword_index in self.keyword_indexes.values():
+            if keyword_index is not None:
+                keyword_index.close()
+
+    def close(self):
+        """Close the shared vectorstore client and the keyword indexes."""
+        self.store.close()
+        self._close_keyword_indexes()
+
+    async def aclose(self):
+        """Close the shared vectorstore clients from the event loop that uses them."""
+        await self.store.aclose()
+        self._close_keyword_indexes()
+
+    def cache_stats(self) -> dict:
+        """Hit/miss counters of the query embedding, retrieval and answer caches."""
+        return {
+            "query_embeddings": self.query_cache.stats(),
+            "retrieval": self.retrieval_cache.stats(),
+            "answers": self.answer_cache.stats(),
+        }
+
+    def _stream_answer(self, chain, inputs: Dict, tokens: int) -> Iterator[str]:
+        """Stream the model's answer within the rate limit, backing off on quota errors until the first chunk.
+
+        Errors after the first chunk are not retried, the partial answer is already on screen.
+        """
+        def start():
+            self.llm_limiter.acquire(tokens)
+            stream = chain.stream(inputs)
+            return next(stream, None), stream
+        first, stream = call_with_retry(start, retries=self.config.LLM_RETRIES)
+        if first is not None:
+            yield first
+            yield from stream
+
+    async def _astream_answer(self, chain, inputs: Dict, tokens: int) -> AsyncIterator[str]:
+        """Async variant of _stream_answer."""
+        async def start():
+            await self.llm_limiter.aacquire(tokens)
+            stream = chain.astream(inputs)
             try:
-                response = retrieval_chain.stream(question)
-                for chunk in response:
+                return await anext(stream), stream
+            except StopAsyncIteration:
+                return None, stream
+            except BaseException:
+                await stream.aclose()
+                raise
+        first, stream = await acall_with_retry(start, retries=self.config.LLM_RETRIES)
+        # aclosing stops the model stream as soon as the consumer goes away
+        async with aclosing(stream):
+            if first is not None:
+                yield first
+                async for chunk in stream:
                     yield chunk
-            except Exception as e:
-                logger.error(f"Error invoking retrieval chain: {e}")
-                yield f"Error invoking retrieval chain: {e}"
+
+    # Steps shared by the sync and async turns: the variants only differ in how they wait
+
+    def _new_turn(self) -> Dict:
+        """Bookkeeping of one turn: how it ended, what it retrieved and when it started."""
+        metrics.inc("rag_requests_total")
+        return {"request_id": uuid.uuid4().hex[:12], "status": "ok", "retrieved": 0, "context": {}, "start": time.perf_counter()}
+
+    def _end_turn(self, turn: Dict, session_id: str, trace: Dict, outcome: Optional[Dict]):
+        """Report the turn's status to the caller and record its latency and trace."""
+        if outcome is not None:
+            outcome["status"] = turn["status"]
+        total = time.perf_counter() - turn["start"]
+        metrics.observe("rag_request_seconds", total, status=turn["status"])
+        metrics.log_request(
+            request_id=turn["request_id"],
+            session_id=session_id,
+            status=turn["status"],
+            retrieved_chunks=turn["retrieved"],
+            context=turn["context"],
+            total_ms=round(total * 1000, 3),
+            stages_ms=trace,
+        )
+
+    def _chat_history(self, session_id: str, messages: Optional[List[Dict]]) -> str:
+        """The token-budgeted conversation history, empty if it cannot be loaded."""
+        try:
+            return self.history.build(session_id, messages)
+        except Exception as e:
+            logger.error(f"Error getting conversation history: {e}")
+            return ""
+
+    def _retrieval_key(self, question: str, corpus: Corpus, filters: Optional[MetadataFilter], corpus_version: str) -> Tuple:
+        return normalize_question(question), corpus.name, corpus_version, filters
+
+    def _cached_answer(self, retrieval_key: Tuple, chat_history: str, session_id: str, turn: Dict) -> Tuple[Tuple, Optional[str]]:
+        """The answer cache key of the turn and the cached answer, if any."""
+        answer_key = (*retrieval_key, text_digest(chat_history))
+        answer = self.answer_cache.get(answer_key)
+        if answer is not None:
+            turn["status"] = "cache_hit"
+            logger.info(f"Answer cache hit for session {session_id}: {self.cache_stats()}")
+        return answer_key, answer
+
+    def _retrieval_failed(self, error: Exception, turn: Dict) -> str:
+        """Record a failed retrieval and return the notice streamed instead of an answer."""
+        # Counted in rag_errors_total by the retrieval span, in both variants
+        turn["status"] = "retrieval_error"
+        logger.error(f"Error retrieving context: {error}")
+        return f"Error invoking retrieval chain: {error}"
+
+    def _use_context(self, packed: Tuple[str, Dict], turn: Dict) -> str:
+        context, turn["context"] = packed
+        turn["retrieved"] = turn["context"]["candidates"]
+        metrics.inc("rag_retrieved_chunks_total", turn["retrieved"])
+        return context
+
+    def _admitted(self, ticket, trace: Dict):
+        trace["admission"] = round(ticket.waited * 1000, 3)
+        metrics.observe("rag_stage_seconds", ticket.waited, stage="admission")
+
+    def _generation_inputs(self, context: str, question: str, chat_history: str, trace: Dict) -> Tuple:
+        """The generation chain, its inputs and their estimated token count."""
+        with metrics.span("prompt", trace):
+            chain = self._generation_chain()
+        inputs = {"context": context, "question": question, "chat_history": chat_history}
+        return chain, inputs, estimate_tokens(f"{chat_history}{context}{question}")
+
+    def _first_token(self, llm_start: float, trace: Dict):
+        first_token = time.perf_counter() - llm_start
+        metrics.observe("rag_stage_seconds", first_token, stage="llm_first_token")
+        trace["llm_first_token"] = round(first_token * 1000, 3)
+
+    def _answered(self, answer: str, answer_key: Tuple, prompt_tokens: int, llm_start: float, trace: Dict):
+        """Record a complete answer and cache it."""
+        streaming = time.perf_counter() - llm_start
+        metrics.observe("rag_stage_seconds", streaming, stage="llm_stream")
+        trace["llm_stream"] = round(streaming * 1000, 3)
+        metrics.inc("rag_prompt_tokens_total", prompt_tokens)
+        metrics.inc("rag_output_tokens_total", estimate_tokens(answer))
+        self.answer_cache.set(answer_key, answer)
+
+    def _generation_failed(self, error: Exception, turn: Dict) -> str:
+        """Record a failed model call and return the notice streamed instead of the rest of the answer."""
+        turn["status"] = "llm_error"
+        metrics.inc("rag_errors_total", stage="llm")
+        logger.error(f"Error invoking retrieval chain: {error}")
+        return f"Error invoking retrieval chain: {error}"
+
+    def _rejected(self, error: AdmissionTimeout, turn: Dict) -> str:
+        """Record a turn that found no free generation slot and return the busy notice."""
+        turn["status"] = "rejected"
+        metrics.inc("rag_rejected_total")
+        logger.warning(f"Turn rejected: {error} ({self.admission.stats()})")
+        return BUSY_MESSAGE
+
+    def _lead(self, answer_key: Tuple, flight, completed: bool, turn: Dict):
+        """End a flight this turn produced, handing its status to the followers."""
+        flight.finish(abandoned=not completed, status=turn["status"])
+        self.flights.leave(answer_key, flight)
+
+    def _followed(self, flight, streamed: bool, turn: Dict) -> bool:
+        """Record how following a flight ended; False if the leader went away before its first chunk."""
+        if not flight.abandoned:
+            # Followers share the leader's answer, or the error it ended with
+            turn["status"] = "coalesced" if flight.status == "ok" else flight.status
+            metrics.inc("rag_coalesced_total")
+            return True
+        if streamed:
+            turn["status"] = "interrupted"
+            return True
+        return False
+
+    def _generate(self, question: str, corpus: Corpus, filters: Optional[MetadataFilter], chat_history: str, answer_key,
+                  retrieval_key, trace: Dict, turn: Dict, user_id: str, on_queued: Optional[Callable[[int], None]]) -> Iterator[str]:
+        """Retrieve context, wait for a generation slot and stream the answer; failures become messages."""
+        # Retrieve context, reusing documents already retrieved for this question
+        try:
+            packed = self._retrieve_cached(question, corpus, filters, retrieval_key, trace)
+        except Exception as e:
+            yield self._retrieval_failed(e, turn)
+            return
+        context = self._use_context(packed, turn)
+
+        # Invoke the generation chain once a slot is free
+        try:
+            with self.admission.slot(user_id, on_queued) as ticket:
+                self._admitted(ticket, trace)
+                try:
+                    chain, inputs, prompt_tokens = self._generation_inputs(context, question, chat_history, trace)
+                    llm_start = time.perf_counter()
+                    answer = ""
+                    with closing(self._stream_answer(chain, inputs, prompt_tokens)) as response:
+                        for chunk in response:
+                            if not answer:
+                                self._first_token(llm_start, trace)
+                            answer += chunk
+                            yield chunk
+                    self._answered(answer, answer_key, prompt_tokens, llm_start, trace)
+                except Exception as e:
+                    yield self._generation_failed(e, turn)
+        except AdmissionTimeout as e:
+            yield self._rejected(e, turn)
+
+    async def _agenerate(self, question: str, chat_history: str, answer_key, retrieval: asyncio.Task, trace: Dict,
+                         turn: Dict, user_id: str, on_queued: Optional[Callable[[int], None]]) -> AsyncIterator[str]:
+        """Async variant of _generate, awaiting the retrieval started by aget_response."""
+        try:
+            packed = await retrieval
+        except Exception as e:
+            yield self._retrieval_failed(e, turn)
+            return
+        context = self._use_context(packed, turn)
+
+        # Invoke the generation chain once a slot is free
+        try:
+            async with self.admission.aslot(user_id, on_queued) as ticket:
+                self._admitted(ticket, trace)
+                try:
+                    chain, inputs, prompt_tokens = self._generation_inputs(context, question, chat_history, trace)
+                    llm_start = time.perf_counter()
+                    answer = ""
+                    async with aclosing(self._astream_answer(chain, inputs, prompt_tokens)) as response:
+                        async for chunk in response:
+                            if not answer:
+                                self._first_token(llm_start, trace)
+                            answer += chunk
+                            yield chunk
+                    self._answered(answer, answer_key, prompt_tokens, llm_start, trace)
+                except Exception as e:
+                    yield self._generation_failed(e, turn)
+        except AdmissionTimeout as e:
+            yield self._rejected(e, turn)
+
+    def _shared(self, answer_key, generate: Callable[[], Iterator[str]], turn: Dict) -> Iterator[str]:
+        """Produce the answer once per prompt; identical concurrent requests follow the first one's stream."""
+        while True:
+            flight, leader = self.flights.join(answer_key)
+            if leader:
+                completed = False
+                try:
+                    with closing(generate()) as response:
+                        for chunk in response:
+                            flight.publish(chunk)
+                            yield chunk
+                    completed = True
+                finally:
+                    self._lead(answer_key, flight, completed, turn)
+                return
+            streamed = False
+            for chunk in flight.follow():
+                streamed = True
+                yield chunk
+            if self._followed(flight, streamed, turn):
+                if turn["status"] == "interrupted":
+                    yield INTERRUPTED_MESSAGE
+                return
+            # The leader went away before the first chunk: produce the answer ourselves
+
+    async def _ashared(self, answer_key, generate: Callable[[], AsyncIterator[str]], turn: Dict) -> AsyncIterator[str]:
+        """Async variant of _shared."""
+        while True:
+            flight, leader = self.flights.join(answer_key)
+            if leader:
+                completed = False
+                try:
+                    async with aclosing(generate()) as response:
+                        async for chunk in response:
+                            flight.publish(chunk)
+                            yield chunk
+                    completed = True
+                finally:
+                    self._lead(answer_key, flight, completed, turn)
+                return
+            streamed = False
+            async with aclosing(flight.afollow()) as response:
+                async for chunk in response:
+                    streamed = True
+                    yield chunk
+            if self._followed(flight, streamed, turn):
+                if turn["status"] == "interrupted":
+                    yield INTERRUPTED_MESSAGE
+                return
+
+    def get_response(self, question: str, session_id: str, messages: Optional[List[Dict]] = None,
+                     user_id: Optional[str] = None, on_queued: Optional[Callable[[int], None]] = None,
+                     corpus: Optional[str] = None, filters: Union[Dict, MetadataFilter, None] = None,
+                     outcome: Optional[Dict] = None) -> str:
+        """Get a response from the RAG model.
+        Args:
+            question: The question to answer.
+            session_id: The session ID to get the conversation history from.
+            messages: The conversation so far, if already in memory (read from the database otherwise).
+            user_id: Who is asking; turns waiting for the model are admitted round-robin per user (per session if None).
+            on_queued: Called with the turn's place in line while it waits for the model.
+            corpus: Corpus to answer from (Config.CORPUS if None).
+            filters: Restrict retrieval by source file, page range or document date (see MetadataFilter).
+            outcome: If given, its "status" is set when the turn ends: "ok", "cache_hit" or "coalesced" for
+                an answer, else "retrieval_error", "llm_error", "rejected", "interrupted" or "cancelled"
+                (the streamed text is then an error notice, not an answer).
+        Returns:
+            The response from the RAG model.
+        """
+        corpus = resolve_corpus(self.config, corpus)
+        filters = MetadataFilter.from_dict(filters)
+        trace = {}
+        turn = self._new_turn()
+        try:
+            # Get the token-budgeted conversation history (from the database unless the caller has it)
+            with metrics.span("history", trace):
+                chat_history = self._chat_history(session_id, messages)
+
+            # Serve repeated questions straight from the cache
+            with metrics.span("answer_cache", trace):
+                retrieval_key = self._retrieval_key(question, corpus, filters, self._current_corpus_version(corpus))
+                answer_key, cached_answer = self._cached_answer(retrieval_key, chat_history, session_id, turn)
+            if cached_answer is not None:
+                yield cached_answer
+                return
+
+            generate = partial(
+                self._generate, question, corpus, filters, chat_history, answer_key, retrieval_key,
+                trace, turn, user_id or session_id, on_queued,
+            )
+            yield from self._shared(answer_key, generate, turn)
+        finally:
+            self._end_turn(turn, session_id, trace, outcome)
+
+    async def aget_response(self, question: str, session_id: str, messages: Optional[List[Dict]] = None,
+                            user_id: Optional[str] = None, on_queued: Optional[Callable[[int], None]] = None,
+                            corpus: Optional[str] = None, filters: Union[Dict, MetadataFilter, None] = None,
+                            outcome: Optional[Dict] = None) -> AsyncIterator[str]:
+        """Async variant of get_response for event-loop servers.
+
+        History loading and query embedding + vector search run concurrently, and the answer
+        is streamed with the model's astream. Closing the generator or cancelling the task that
+        consumes it abandons the turn: pending retrieval and the LLM stream are cancelled and
+        the partial answer is not cached.
+        Args:
+            question: The question to answer.
+            session_id: The session ID to get the conversation history from.
+            messages: The conversation so far, if already in memory (read from the database otherwise).
+            user_id: Who is asking; turns waiting for the model are admitted round-robin per user (per session if None).
+            on_queued: Called with the turn's place in line while it waits for the model.
+            corpus: Corpus to answer from (Config.CORPUS if None).
+            filters: Restrict retrieval by source file, page range or document date (see MetadataFilter).
+            outcome: If given, its "status" is set when the turn ends: "ok", "cache_hit" or "coalesced" for
+                an answer, else "retrieval_error", "llm_error", "rejected", "interrupted" or "cancelled"
+                (the streamed text is then an error notice, not an answer).
+        Returns:
+            The response from the RAG model, as an async stream of chunks.
+        """
+        corpus = resolve_corpus(self.config, corpus)
+        filters = MetadataFilter.from_dict(filters)
+        trace = {}
+        turn = self._new_turn()
+        retrieval = None
+        try:
+            # The corpus manifest is checked off the event loop
+            corpus_version = await asyncio.to_thread(self._current_corpus_version, corpus)
+            retrieval_key = self._retrieval_key(question, corpus, filters, corpus_version)
+            retrieval = asyncio.create_task(self._aretrieve_cached(question, corpus, filters, retrieval_key, trace))
+
+            # The database read runs in a worker thread while the query is embedded and searched
+            with metrics.span("history", trace):
+                chat_history = await asyncio.to_thread(self._chat_history, session_id, messages)
+
+            # Serve repeated questions straight from the cache
+            answer_key, cached_answer = self._cached_answer(retrieval_key, chat_history, session_id, turn)
+            if cached_answer is not None:
+                yield cached_answer
+                return
+
+            generate = partial(
+                self._agenerate, question, chat_history, answer_key, retrieval,
+                trace, turn, user_id or session_id, on_queued,
+            )
+            async with aclosing(self._ashared(answer_key, generate, turn)) as response:
+                async for chunk in response:
+                    yield chunk
+        except (asyncio.CancelledError, GeneratorExit):
+            turn["status"] = "cancelled"
+            metrics.inc("rag_cancelled_total")
+            logger.info(f"Turn {turn['request_id']} of session {session_id} abandoned")
+            raise
+        finally:
+            if retrieval is not None:
+                if not retrieval.done():
+                    retrieval.cancel()
+                elif not retrieval.cancelled():
+                    # Retrieval errors were reported above or the answer came from the cache
+                    retrieval.exception()
+            self._end_turn(turn, session_id, trace, outcome)
 
 if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(description="Ask one question from the command line.")
+    parser.add_argument("question")
+    parser.add_argument("--corpus", help="Corpus to answer from (default: Config.CORPUS)")
+    args = parser.parse_args()
     rag = Rag()
-    response = rag.get_response("Your question here")
-    logger.info(response)
+    try:
+        for chunk in rag.get_response(args.question, str(uuid.uuid4()), [], corpus=args.corpus):
+            print(chunk, end="", flush=True)
+        print()
+    finally:
+        rag.close()
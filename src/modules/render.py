@@ -0,0 +1,148 @@
+import html
+import re
+import threading
+import time
+from functools import lru_cache
+import markdown
+
+MARKDOWN_EXTENSIONS = ["nl2br"]
+# First characters of a line that may continue the block before a blank line (indented
+# continuation, list item, quote); a block break needs a line starting with anything else
+_CONTINUATION = re.compile(r"[\s\d*+\->]")
+_FENCE = re.compile(r"\s*(```|~~~)")
+
+_local = threading.local()
+
+
+def _converter() -> markdown.Markdown:
+    """Per-thread reusable Markdown instance (building one per call dominates small conversions)."""
+    converter = getattr(_local, "converter", None)
+    if converter is None:
+        converter = _local.converter = markdown.Markdown(extensions=MARKDOWN_EXTENSIONS)
+    return converter
+
+
+def to_html(text: str) -> str:
+    """Convert markdown to HTML."""
+    return _converter().reset().convert(text)
+
+
+@lru_cache(maxsize=4096)
+def render_markdown(text: str) -> str:
+    """HTML of a completed message, converted once per process and reused on every rerun."""
+    return to_html(text)
+
+
+def bot_message_html(content_html: str) -> str:
+    """Wrap rendered bot HTML in the chat bubble."""
+    return f"""
+        <div class="bot-message-container">
+            <div class="bot-message">
+                {content_html}
+            </div>
+        </div>
+    """
+
+
+def user_message_html(content: str) -> str:
+    """Wrap a user message in the chat bubble."""
+    return f"""
+        <div class="user-message-container">
+            <div class="user-message">
+                {content}
+            </div>
+        </div>
+    """
+
+
+class IncrementalMarkdown:
+    """Converts a growing markdown text, re-converting only the block still being written.
+
+    Completed blocks (ended by a blank line, outside code fences, before text that cannot
+    continue them) are converted once and kept as HTML. Lines are scanned once as they
+    complete, so the cost of each update depends on the open block, not on the answer.
+    """
+    def __init__(self):
+        """Initialize an empty document."""
+        self.text = ""
+        self._done = 0
+        self._html_parts = []
+        # Start of the first line not scanned yet
+        self._scanned = 0
+        self._fenced = False
+        # End of the last non-blank line since _done, and whether blank lines followed it
+        self._last = None
+        self._gap = False
+
+    def append(self, chunk: str):
+        """Add streamed text, finalizing any blocks it completes."""
+        self.text += chunk
+        cut = None
+        while self._scanned < len(self.text):
+            newline = self.text.find("\n", self._scanned)
+            line = self.text[self._scanned:newline if newline >= 0 else len(self.text)]
+            if not line.strip():
+                if newline < 0:
+                    break
+                self._gap = self._last is not None
+                self._scanned = newline + 1
+                continue
+            if self._gap and not self._fenced and not _CONTINUATION.match(line):
+                # The markdown before the blank lines converts the same on its own as in the whole answer
+                cut = (self._last, self._scanned)
+                self._gap = False
+            if newline < 0:
+                # Whether a line opens a fence is only known once it is complete
+                break
+            if _FENCE.match(line):
+                self._fenced = not self._fenced
+            self._last = newline
+            self._gap = False
+            self._scanned = newline + 1
+        if cut is not None:
+            self._html_parts.append(to_html(self.text[self._done:cut[0]]))
+            self._done = cut[1]
+
+    def html(self) -> str:
+        """HTML of the text so far."""
+        tail = self.text[self._done:]
+        return "\n".join(self._html_parts + ([to_html(tail)] if tail.strip() else []))
+
+
+class StreamRenderer:
+    """Streams an answer into a Streamlit placeholder with throttled, incremental updates.
+
+    The placeholder is redrawn at most every `min_interval` seconds, or earlier once
+    `max_pending_chars` new characters are waiting.
+    """
+    def __init__(self, placeholder, min_interval: float = 0.1, max_pending_chars: int = 2000):
+        """Initialize the renderer."""
+        self.placeholder = placeholder
+        self.min_interval = min_interval
+        self.max_pending_chars = max_pending_chars
+        self.document = IncrementalMarkdown()
+        self._rendered_at = 0.0
+        self._pending = 0
+
+    def feed(self, chunk: str):
+        """Add a streamed chunk and redraw if the throttle allows."""
+        self.document.append(chunk)
+        self._pending += len(chunk)
+        now = time.monotonic()
+        if now - self._rendered_at >= self.min_interval or self._pending >= self.max_pending_chars:
+            self._draw(self.document.html())
+            self._rendered_at = now
+
+    def status(self, text: str):
+        """Show a status line (e.g. the place in the queue) until the first chunk arrives."""
+        if not self.document.text:
+            self._draw(f"<em>{html.escape(text)}</em>")
+
+    def _draw(self, content_html: str):
+        self.placeholder.markdown(bot_message_html(content_html), unsafe_allow_html=True)
+        self._pending = 0
+
+    def finish(self) -> str:
+        """Draw the complete answer and return its text; its HTML is memoized for later reruns."""
+        self._draw(render_markdown(self.document.text))
+        return self.document.text
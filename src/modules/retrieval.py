@@ -0,0 +1,124 @@
+import asyncio
+from typing import Dict, List, Optional
+import numpy as np
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+from langchain_core.vectorstores import VectorStore
+from src.modules.cache import text_digest
+from src.modules.keyword_index import KeywordIndex
+
+RETRIEVAL_MODES = ("vector", "keyword", "hybrid")
+
+
+def document_key(doc: Document) -> str:
+    """Identity of a chunk across retrievers (the vectorstore may not return ids)."""
+    return text_digest(f"{doc.metadata.get('source', '')}\n{doc.page_content}")
+
+
+def reciprocal_rank_fusion(rankings: List[List[Document]], k: int = 60, weights: Optional[List[float]] = None) -> List[Document]:
+    """Fuse ranked lists: each document scores sum(weight / (k + rank)) over the lists it appears in."""
+    weights = weights or [1.0] * len(rankings)
+    scores: Dict[str, float] = {}
+    documents: Dict[str, Document] = {}
+    for ranking, weight in zip(rankings, weights):
+        for rank, doc in enumerate(ranking):
+            key = document_key(doc)
+            scores[key] = scores.get(key, 0.0) + weight / (k + rank + 1)
+            documents.setdefault(key, doc)
+    return [documents[key] for key in sorted(scores, key=scores.get, reverse=True)]
+
+
+def _exact(docs: List[Document], filters) -> List[Document]:
+    """Vector results that pass the filter; a collection created before source filters were indexed lets other sources through."""
+    if filters is None:
+        return docs
+    return [doc for doc in docs if filters.matches(doc.metadata or {})]
+
+
+def maximal_marginal_relevance(relevance: List[float], vectors: List[List[float]], k: int, lambda_mult: float = 0.7) -> List[int]:
+    """Indices of k items trading relevance (weighted by lambda_mult) against cosine redundancy."""
+    if not vectors:
+        return []
+    matrix = np.asarray(vectors, dtype=np.float32)
+    matrix /= np.maximum(np.linalg.norm(matrix, axis=1, keepdims=True), 1e-12)
+    relevance = np.asarray(relevance, dtype=np.float32)
+    selected = [int(np.argmax(relevance))]
+    redundancy = matrix @ matrix[selected[0]]
+    while len(selected) < min(k, len(vectors)):
+        scores = lambda_mult * relevance - (1 - lambda_mult) * redundancy
+        scores[selected] = -np.inf
+        best = int(np.argmax(scores))
+        selected.append(best)
+        redundancy = np.maximum(redundancy, matrix @ matrix[best])
+    return selected
+
+
+class Retriever:
+    """Vector, keyword (BM25) or hybrid retrieval with reciprocal rank fusion and optional MMR.
+
+    Args:
+        config: RETRIEVAL_MODE, RETRIEVAL_CANDIDATES, RRF_K, HYBRID_KEYWORD_WEIGHT, MMR_ENABLED and MMR_LAMBDA.
+        keyword_index: BM25 index used by the keyword and hybrid modes.
+        document_embeddings: Embeds candidates for MMR (the ingestion cache makes this free).
+    """
+    def __init__(self, config, keyword_index: Optional[KeywordIndex] = None, document_embeddings: Optional[Embeddings] = None):
+        """Initialize the retriever."""
+        if config.RETRIEVAL_MODE not in RETRIEVAL_MODES:
+            raise ValueError(f"Unknown retrieval mode: {config.RETRIEVAL_MODE}")
+        self.mode = config.RETRIEVAL_MODE if keyword_index is not None else "vector"
+        self.candidates = config.RETRIEVAL_CANDIDATES
+        self.rrf_k = config.RRF_K
+        self.keyword_weight = config.HYBRID_KEYWORD_WEIGHT
+        self.mmr = config.MMR_ENABLED
+        self.mmr_lambda = config.MMR_LAMBDA
+        self.keyword_index = keyword_index
+        self.document_embeddings = document_embeddings
+
+    def _combine(self, vector_docs: List[Document], keyword_docs: List[Document], k: int) -> List[Document]:
+        if self.mode == "hybrid":
+            documents = reciprocal_rank_fusion([vector_docs, keyword_docs], self.rrf_k, [1.0, self.keyword_weight])
+        else:
+            documents = vector_docs or keyword_docs
+        if self.mmr and len(documents) > 1 and self.document_embeddings:
+            vectors = self.document_embeddings.embed_documents([doc.page_content for doc in documents])
+            # Relevance follows the (fused) ranking so MMR only trades it against redundancy
+            relevance = [1 - i / len(documents) for i in range(len(documents))]
+            order = maximal_marginal_relevance(relevance, vectors, k, self.mmr_lambda)
+            return [documents[i] for i in order]
+        return documents[:k]
+
+    def retrieve(self, vectorstore: VectorStore, question: str, k: Optional[int] = None, keyword_index: Optional[KeywordIndex] = None,
+                 filters=None, search_kwargs: Optional[Dict] = None) -> List[Document]:
+        """Best k (default RETRIEVAL_CANDIDATES) chunks for the question.
+
+        Args:
+            keyword_index: BM25 index of the queried corpus (default: the retriever's own).
+            filters: MetadataFilter applied by the keyword index before ranking.
+            search_kwargs: Extra vectorstore search arguments (tenant, pre-filters).
+        """
+        k = k or self.candidates
+        # Each search fetches at least RETRIEVAL_CANDIDATES so fusion and MMR choose from a deep pool
+        depth = max(k, self.candidates)
+        keyword_index = keyword_index if keyword_index is not None else self.keyword_index
+        vector_docs = vectorstore.similarity_search(question, k=depth, **(search_kwargs or {})) if self.mode != "keyword" else []
+        keyword_docs = keyword_index.search(question, depth, filters) if self.mode != "vector" else []
+        return self._combine(_exact(vector_docs, filters), keyword_docs, k)
+
+    async def aretrieve(self, vectorstore: VectorStore, question: str, k: Optional[int] = None, keyword_index: Optional[KeywordIndex] = None,
+                        filters=None, search_kwargs: Optional[Dict] = None) -> List[Document]:
+        """Async variant of retrieve; vector and keyword searches run concurrently."""
+        k = k or self.candidates
+        depth = max(k, self.candidates)
+        keyword_index = keyword_index if keyword_index is not None else self.keyword_index
+
+        async def vector_search():
+            return await vectorstore.asimilarity_search(question, k=depth, **(search_kwargs or {})) if self.mode != "keyword" else []
+
+        async def keyword_search():
+            return await asyncio.to_thread(keyword_index.search, question, depth, filters) if self.mode != "vector" else []
+
+        vector_docs, keyword_docs = await asyncio.gather(vector_search(), keyword_search())
+        vector_docs = _exact(vector_docs, filters)
+        if self.mmr:
+            return await asyncio.to_thread(self._combine, vector_docs, keyword_docs, k)
+        return self._combine(vector_docs, keyword_docs, k)
@@ -0,0 +1,359 @@
+import argparse
+import datetime
+import json
+import os
+import shutil
+import sqlite3
+import time
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Set, Tuple
+import numpy as np
+from src.config.config import Config
+from src.config.logs import logger
+from src.config.metrics import metrics
+from src.modules.corpora import resolve_corpus
+from src.modules.embeddings import embedding_model_name
+from src.modules.keyword_index import open_keyword_index
+from src.modules.manifest import IngestionManifest, file_sha256
+from src.modules.vectorstore import create_store_manager
+
+SNAPSHOT_FORMAT = 1
+
+Batch = Tuple[List[str], List[str], List[Dict], np.ndarray]
+
+
+class SnapshotError(Exception):
+    """A snapshot is incomplete, corrupted or does not match the configured embedding model."""
+
+
+class CorpusSnapshot:
+    """Portable copy of an embedded corpus that can be restored without embedding anything.
+
+    A snapshot is a directory with the vectors as a raw float32 row-major matrix (memory-mapped
+    on read), a SQLite table of chunk ids, texts and metadata in the same row order, the
+    ingestion manifest of the corpus, and `snapshot.json` recording the embedding model,
+    shape and sha256 of every file.
+    """
+    VECTORS_FILE = "vectors.f32"
+    CHUNKS_FILE = "chunks.db"
+    MANIFEST_FILE = "ingestion_manifest.json"
+    INFO_FILE = "snapshot.json"
+
+    def __init__(self, path: str):
+        """Open the snapshot stored in the `path` directory."""
+        self.path = path
+        info_path = os.path.join(path, self.INFO_FILE)
+        if not os.path.exists(info_path):
+            raise SnapshotError(f"No snapshot at {path}")
+        with open(info_path, "r", encoding="utf-8") as f:
+            self.info = json.load(f)
+        if self.info.get("format") != SNAPSHOT_FORMAT:
+            raise SnapshotError(f"Unsupported snapshot format {self.info.get('format')}")
+
+    @classmethod
+    def write(cls, path: str, batches: Iterable[Batch], model: str, ingestion_manifest: Optional[Dict] = None) -> "CorpusSnapshot":
+        """Write a snapshot from (ids, texts, metadatas, vectors) batches.
+
+        Files are written to a temporary directory that is renamed once complete, so an
+        interrupted export never leaves a snapshot behind.
+        """
+        if os.path.exists(path):
+            raise FileExistsError(f"Snapshot path {path} already exists")
+        tmp_path = f"{path}.tmp"
+        shutil.rmtree(tmp_path, ignore_errors=True)
+        os.makedirs(tmp_path)
+        try:
+            count, dim = 0, 0
+            conn = sqlite3.connect(os.path.join(tmp_path, cls.CHUNKS_FILE))
+            try:
+                conn.execute("CREATE TABLE chunks (row INTEGER PRIMARY KEY, id TEXT NOT NULL, text TEXT NOT NULL, metadata TEXT NOT NULL)")
+                with open(os.path.join(tmp_path, cls.VECTORS_FILE), "wb") as f:
+                    for ids, texts, metadatas, vectors in batches:
+                        vectors = np.asarray(vectors, dtype=np.float32)
+                        if not dim:
+                            dim = vectors.shape[1]
+                        elif vectors.shape[1] != dim:
+                            raise SnapshotError(f"Vector dimension {vectors.shape[1]} does not match {dim}")
+                        f.write(vectors.tobytes())
+                        with conn:
+                            conn.executemany(
+                                "INSERT INTO chunks (row, id, text, metadata) VALUES (?, ?, ?, ?)",
+                                [
+                                    (count + i, ids[i], texts[i], json.dumps(metadatas[i], default=str))
+                                    for i in range(len(ids))
+                                ],
+                            )
+                        count += len(ids)
+            finally:
+                conn.close()
+            files = [cls.VECTORS_FILE, cls.CHUNKS_FILE]
+            if ingestion_manifest is not None:
+                with open(os.path.join(tmp_path, cls.MANIFEST_FILE), "w", encoding="utf-8") as f:
+                    json.dump(ingestion_manifest, f, indent=2)
+                files.append(cls.MANIFEST_FILE)
+            info = {
+                "format": SNAPSHOT_FORMAT,
+                "created": datetime.datetime.now(datetime.timezone.utc).isoformat(timespec="seconds"),
+                "model": model,
+                "count": count,
+                "dim": dim,
+                "sha256": {name: file_sha256(os.path.join(tmp_path, name)) for name in files},
+            }
+            with open(os.path.join(tmp_path, cls.INFO_FILE), "w", encoding="utf-8") as f:
+                json.dump(info, f, indent=2)
+            os.replace(tmp_path, path)
+        except BaseException:
+            shutil.rmtree(tmp_path, ignore_errors=True)
+            raise
+        return cls(path)
+
+    def verify(self):
+        """Check every file against its recorded sha256."""
+        for name, expected in self.info["sha256"].items():
+            file_path = os.path.join(self.path, name)
+            if not os.path.exists(file_path) or file_sha256(file_path) != expected:
+                raise SnapshotError(f"Snapshot file {name} is missing or corrupted")
+
+    @property
+    def count(self) -> int:
+        return self.info["count"]
+
+    @property
+    def dim(self) -> int:
+        return self.info["dim"]
+
+    def vectors(self) -> np.ndarray:
+        """The vector matrix, memory-mapped read-only."""
+        if not self.count:
+            return np.zeros((0, self.dim), dtype=np.float32)
+        return np.memmap(os.path.join(self.path, self.VECTORS_FILE), dtype=np.float32, mode="r", shape=(self.count, self.dim))
+
+    def ingestion_manifest(self) -> Optional[Dict]:
+        """Entries of the ingestion manifest the corpus was built from, if it was exported."""
+        manifest_path = os.path.join(self.path, self.MANIFEST_FILE)
+        if not os.path.exists(manifest_path):
+            return None
+        with open(manifest_path, "r", encoding="utf-8") as f:
+            return json.load(f).get("files", {})
+
+    def ids(self) -> Set[str]:
+        """Ids of every chunk in the snapshot."""
+        conn = sqlite3.connect(os.path.join(self.path, self.CHUNKS_FILE))
+        try:
+            return {chunk_id for (chunk_id,) in conn.execute("SELECT id FROM chunks")}
+        finally:
+            conn.close()
+
+    def batches(self, batch_size: int = 1000) -> Iterator[Batch]:
+        """Chunks in row order as (ids, texts, metadatas, vectors) batches."""
+        vectors = self.vectors()
+        conn = sqlite3.connect(os.path.join(self.path, self.CHUNKS_FILE))
+        try:
+            for start in range(0, self.count, batch_size):
+                rows = conn.execute(
+                    "SELECT id, text, metadata FROM chunks WHERE row >= ? AND row < ? ORDER BY row",
+                    (start, start + batch_size),
+                ).fetchall()
+                yield (
+                    [chunk_id for chunk_id, _, _ in rows],
+                    [text for _, text, _ in rows],
+                    [json.loads(metadata) for _, _, metadata in rows],
+                    np.asarray(vectors[start:start + len(rows)]),
+                )
+        finally:
+            conn.close()
+
+
+def _property(value):
+    """Weaviate property value as stored by ingestion; dates come back as datetimes."""
+    if isinstance(value, datetime.datetime):
+        return value.astimezone(datetime.timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ")
+    return value
+
+
+def weaviate_chunks(collection, text_key: str = "text", batch_size: int = 1000) -> Iterator[Batch]:
+    """Objects of a Weaviate collection (or tenant) with their vectors as (ids, texts, metadatas, vectors) batches."""
+    batch = ([], [], [], [])
+    for obj in collection.iterator(include_vector=True):
+        properties = {key: _property(value) for key, value in obj.properties.items() if value is not None}
+        batch[0].append(str(obj.uuid))
+        batch[1].append(properties.pop(text_key, "") or "")
+        batch[2].append(properties)
+        batch[3].append(obj.vector["default"])
+        if len(batch[0]) == batch_size:
+            yield batch[0], batch[1], batch[2], np.asarray(batch[3], dtype=np.float32)
+            batch = ([], [], [], [])
+    if batch[0]:
+        yield batch[0], batch[1], batch[2], np.asarray(batch[3], dtype=np.float32)
+
+
+def _writer(manager, target, config) -> Callable[[List[str], List[str], List[Dict], np.ndarray], List[str]]:
+    """Function storing a batch of chunks in the corpus and returning the ids that could not be stored."""
+    if config.VECTOR_STORE_BACKEND == "weaviate":
+        return manager.bulk_writer(None, target.index_name, tenant=target.tenant).write
+    vectorstore = manager.vectorstore(None, target.index_name)
+
+    def write(ids: List[str], texts: List[str], metadatas: List[Dict], vectors: np.ndarray) -> List[str]:
+        vectorstore.add_vectors(vectors, texts, metadatas, ids)
+        return []
+    return write
+
+
+def _stored_ids(manager, target, config) -> Set[str]:
+    """Ids of the chunks the corpus holds."""
+    if config.VECTOR_STORE_BACKEND == "weaviate":
+        collection = manager.get().collections.get(target.index_name)
+        if target.tenant:
+            collection = collection.with_tenant(target.tenant)
+        return {str(obj.uuid) for obj in collection.iterator()}
+    return set(manager.vectorstore(None, target.index_name).ids())
+
+
+def export_snapshot(path: str, config: Optional[Config] = None, batch_size: int = 1000, corpus: Optional[str] = None) -> CorpusSnapshot:
+    """Export a corpus (Config.CORPUS by default) of the configured vectorstore to a snapshot at `path`."""
+    target = resolve_corpus(config or Config(), corpus)
+    config = target.config
+    start = time.perf_counter()
+    manifest = IngestionManifest(config.MANIFEST_PATH).load()
+    manager = create_store_manager(config)
+    try:
+        if config.VECTOR_STORE_BACKEND == "weaviate":
+            collection = manager.get().collections.get(target.index_name)
+            if target.tenant:
+                collection = collection.with_tenant(target.tenant)
+            chunks = weaviate_chunks(collection, batch_size=batch_size)
+        else:
+            chunks = manager.vectorstore(None, target.index_name).iter_chunks(batch_size)
+        snapshot = CorpusSnapshot.write(
+            path,
+            chunks,
+            embedding_model_name(config),
+            {"version": manifest.version, "files": manifest.entries} if manifest.entries else None,
+        )
+    finally:
+        manager.close()
+    elapsed = time.perf_counter() - start
+    logger.info(
+        f"Exported {snapshot.count} chunks ({snapshot.dim} dimensions) to {path} in {elapsed:.1f}s "
+        f"({snapshot.count / max(elapsed, 1e-9):.1f} chunks/s)"
+    )
+    metrics.log_request(operation="snapshot_export", chunks=snapshot.count, dim=snapshot.dim, total_ms=round(elapsed * 1000, 3))
+    return snapshot
+
+
+def import_snapshot(path: str, config: Optional[Config] = None, batch_size: int = 1000, verify: bool = True,
+                    force: bool = False, corpus: Optional[str] = None) -> Dict:
+    """Bulk-load a snapshot into a corpus of the configured vectorstore without any embedding calls.
+
+    Chunks keep their ids, so restoring over an existing corpus overwrites objects
+    instead of duplicating them, and chunks that are not in the snapshot are deleted.
+    The keyword index and the ingestion manifest are restored as well, so a following
+    `load_documents` run only ingests what changed. Files with chunks that could not be
+    stored are left out of the manifest, so that run ingests them again.
+    Args:
+        verify: Check the sha256 of every snapshot file first.
+        force: Restore vectors of a different embedding model than the configured one.
+        corpus: Corpus to restore into (Config.CORPUS by default).
+    Returns:
+        Import statistics.
+    """
+    target = resolve_corpus(config or Config(), corpus)
+    config = target.config
+    start = time.perf_counter()
+    snapshot = CorpusSnapshot(path)
+    if verify:
+        snapshot.verify()
+    model = embedding_model_name(config)
+    if snapshot.info["model"] != model and not force:
+        raise SnapshotError(
+            f"Snapshot vectors come from {snapshot.info['model']}, but {model} is configured; "
+            "queries would not match them"
+        )
+
+    stats = {"chunks": 0, "failed": 0, "removed": 0}
+    manager = create_store_manager(config)
+    keyword_index = open_keyword_index(config)
+    failed_sources = set()
+    try:
+        write = _writer(manager, target, config)
+        for ids, texts, metadatas, vectors in snapshot.batches(batch_size):
+            failed = set(write(ids, texts, metadatas, vectors))
+            stored = [i for i, chunk_id in enumerate(ids) if chunk_id not in failed]
+            failed_sources.update(metadatas[i].get("source") for i, chunk_id in enumerate(ids) if chunk_id in failed)
+            if keyword_index is not None:
+                keyword_index.add([ids[i] for i in stored], [texts[i] for i in stored], [metadatas[i] for i in stored])
+            stats["chunks"] += len(stored)
+            stats["failed"] += len(failed)
+            logger.info(f"Restored {stats['chunks']}/{snapshot.count} chunks")
+
+        # The corpus becomes the snapshot: drop chunks it does not have (e.g. of files added since)
+        removed = _stored_ids(manager, target, config) - snapshot.ids()
+        if removed:
+            manager.vectorstore(None, target.index_name).delete(ids=sorted(removed), **target.store_kwargs)
+            if keyword_index is not None:
+                keyword_index.delete(sorted(removed))
+            stats["removed"] = len(removed)
+            logger.info(f"Removed {len(removed)} chunks that are not in the snapshot")
+
+        manifest = IngestionManifest(config.MANIFEST_PATH).load()
+        entries = snapshot.ingestion_manifest()
+        if entries is None:
+            # Without the snapshot's manifest keep the files whose chunks are all still there
+            entries = {source: entry for source, entry in manifest.entries.items() if not removed & set(entry["chunk_ids"])}
+        if failed_sources:
+            logger.error(
+                f"{stats['failed']} chunks could not be stored; {', '.join(sorted(map(str, failed_sources)))} "
+                "will be ingested again by the next load_documents run"
+            )
+        # Always saved: a changed file list is a new corpus version, which retires cached retrievals and answers
+        manifest.entries = {source: entry for source, entry in entries.items() if source not in failed_sources}
+        manifest.save()
+        if keyword_index is not None:
+            for source in set(keyword_index.source_hashes()) - set(manifest.entries):
+                keyword_index.remove_source(source)
+            for source, entry in manifest.entries.items():
+                keyword_index.record_source(source, entry["sha256"])
+        if config.VECTOR_STORE_BACKEND != "weaviate" and config.LOCAL_INDEX_IVF_LISTS:
+            manager.vectorstore(None, target.index_name).build_ivf(config.LOCAL_INDEX_IVF_LISTS)
+    finally:
+        manager.close()
+        if keyword_index is not None:
+            keyword_index.close()
+
+    elapsed = time.perf_counter() - start
+    stats["seconds"] = round(elapsed, 3)
+    stats["chunks_per_s"] = round(stats["chunks"] / max(elapsed, 1e-9), 1)
+    stats["mb_per_s"] = round(snapshot.count * snapshot.dim * 4 / 2**20 / max(elapsed, 1e-9), 1)
+    logger.info(
+        f"Imported {stats['chunks']} chunks from {path} into corpus {target.name} ({config.VECTOR_STORE_BACKEND}) in {elapsed:.1f}s "
+        f"({stats['chunks_per_s']} chunks/s, {stats['failed']} failed, {stats['removed']} removed, no embedding calls)"
+    )
+    metrics.log_request(operation="snapshot_import", **stats)
+    return stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export or restore the embedded corpus without re-embedding it.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    export_parser = commands.add_parser("export", help="Write the vectorstore to a snapshot directory")
+    export_parser.add_argument("path")
+    import_parser = commands.add_parser("import", help="Load a snapshot into the vectorstore")
+    import_parser.add_argument("path")
+    import_parser.add_argument("--no-verify", action="store_true", help="Skip the checksum verification")
+    import_parser.add_argument("--force", action="store_true", help="Restore vectors of another embedding model")
+    for command_parser in (export_parser, import_parser):
+        command_parser.add_argument("--backend", choices=("weaviate", "local"), help="Vectorstore (Config.VECTOR_STORE_BACKEND by default)")
+        command_parser.add_argument("--batch-size", type=int, default=1000)
+        command_parser.add_argument("--corpus", help="Corpus to export or restore (Config.CORPUS by default)")
+    args = parser.parse_args()
+
+    config = Config()
+    if args.backend:
+        config = config.model_copy(update={"VECTOR_STORE_BACKEND": args.backend})
+    if args.command == "export":
+        export_snapshot(args.path, config, args.batch_size, corpus=args.corpus)
+    else:
+        import_snapshot(args.path, config, args.batch_size, verify=not args.no_verify, force=args.force, corpus=args.corpus)
+
+
+if __name__ == "__main__":
+    main()
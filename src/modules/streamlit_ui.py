@@ -1,17 +1,52 @@
 import streamlit as st
+import time
 import uuid
-import markdown
 from datetime import datetime
+from src.config.config import Config
 from src.modules.db import Database
-from src.modules.rag import Rag
+from src.modules.render import StreamRenderer, bot_message_html, render_markdown, user_message_html
 from src.config.logs import logger
 
+# Number of sessions listed per sidebar page
+SESSION_PAGE_SIZE = 20
+SEARCH_PAGE_SIZE = 10
+
+
+@st.cache_resource
+def get_database() -> Database:
+    """Process-wide database handle (Config.DB_PATH), initialized once."""
+    db = Database(Config().DB_PATH)
+    db.init_db()
+    return db
+
+
+@st.cache_resource
+def get_rag():
+    """Process-wide RAG engine shared by all sessions and reruns.
+
+    Imported lazily so langchain/weaviate are only loaded when the first question is asked.
+    """
+    from src.modules.rag import Rag
+    rag = Rag(db=get_database())
+    if rag.config.METRICS_ENABLED and rag.config.METRICS_PORT:
+        from src.config.metrics import start_metrics_server
+        start_metrics_server(rag.config.METRICS_PORT)
+        logger.info(f"Serving metrics on port {rag.config.METRICS_PORT}")
+    return rag
+
+
 def run_ui():
     """Main Streamlit UI function."""
-    # Initialize classes
-    db = Database()
-    rag = Rag()
-    db.init_db()
+    start = time.perf_counter()
+    try:
+        render_ui()
+    finally:
+        logger.debug(f"Rerun script time: {(time.perf_counter() - start) * 1000:.1f}ms")
+
+
+def render_ui():
+    """Render the page for one Streamlit run."""
+    db = get_database()
 
     # Page config
     st.set_page_config(page_title="RAG Chat", layout="wide")
@@ -53,6 +88,25 @@ def run_ui():
     if "pending_user_input" not in st.session_state:
         st.session_state.pending_user_input = None
 
+    if "notice" not in st.session_state:
+        st.session_state.notice = None
+
+    if "session_page" not in st.session_state:
+        st.session_state.session_page = 0
+
+    if "search_page" not in st.session_state:
+        st.session_state.search_page = 0
+        st.session_state.search_text = ""
+
+    def open_session(session_id: str):
+        """Save the current session, then switch to another one."""
+        if st.session_state.messages:
+            db.save_session(st.session_state.session_id, st.session_state.messages, st.user.sub)
+        st.session_state.session_id = session_id
+        st.session_state.messages = db.get_session(session_id)
+        st.session_state.pending_user_input = None
+        st.rerun()
+
     # Custom CSS for chat styling
     st.markdown("""
     <style>
@@ -165,22 +219,56 @@ def run_ui():
                 st.rerun()
             
             st.markdown("---")
+
+            # Full-text search over the user's messages, one page of ranked snippets at a time
+            search_text = st.text_input("🔍 Search conversations", key="session_search", placeholder="Search your messages")
+            if search_text != st.session_state.search_text:
+                st.session_state.search_text = search_text
+                st.session_state.search_page = 0
+            if search_text.strip():
+                offset = st.session_state.search_page * SEARCH_PAGE_SIZE
+                results = db.search_messages(st.user.sub, search_text, limit=SEARCH_PAGE_SIZE + 1, offset=offset, highlight=("**", "**"))
+                has_next_page = len(results) > SEARCH_PAGE_SIZE
+                results = results[:SEARCH_PAGE_SIZE]
+                if results:
+                    for result in results:
+                        speaker = "You" if result["role"] == "user" else "Assistant"
+                        if st.button(
+                            f"{speaker}: {result['snippet']}",
+                            key=f"search_{result['session_id']}_{result['seq']}",
+                            use_container_width=True,
+                        ):
+                            open_session(result["session_id"])
+                    if st.session_state.search_page > 0 or has_next_page:
+                        prev_col, next_col = st.columns(2)
+                        with prev_col:
+                            if st.button("← Better", use_container_width=True, disabled=st.session_state.search_page == 0, key="search_prev"):
+                                st.session_state.search_page -= 1
+                                st.rerun()
+                        with next_col:
+                            if st.button("More →", use_container_width=True, disabled=not has_next_page, key="search_next"):
+                                st.session_state.search_page += 1
+                                st.rerun()
+                else:
+                    st.info("No messages match your search.")
+                st.markdown("---")
+
             st.markdown("### 📚 Session History")
             
             # Create a scrollable container for session history
             st.markdown('<div class="session-history-container">', unsafe_allow_html=True)
             
-            # Get all sessions for the current user
-            user_sessions = db.get_user_sessions(st.user.sub)
+            # Get one page of session summaries for the current user (one extra row tells
+            # whether there is a next page)
+            page_size = SESSION_PAGE_SIZE
+            offset = st.session_state.session_page * page_size
+            user_sessions = db.get_user_sessions(st.user.sub, limit=page_size + 1, offset=offset)
+            has_next_page = len(user_sessions) > page_size
+            user_sessions = user_sessions[:page_size]
             
             if user_sessions:
                 for idx, session in enumerate(user_sessions):
-                    # Get the first user message for preview
-                    first_message = ""
-                    for msg in session["messages"]:
-                        if msg["role"] == "user":
-                            first_message = msg["content"]
-                            break
+                    first_message = session["preview"]
                     
                     # Truncate preview to fit inline with date
                     preview = first_message[:24] + ".." if len(first_message) > 24 else first_message
@@ -207,19 +295,21 @@ def run_ui():
                     st.markdown('</div>', unsafe_allow_html=True)
                     
                     if session_clicked:
-                        # Save current session before switching
-                        if st.session_state.messages:
-                            db.save_session(
-                                st.session_state.session_id, 
-                                st.session_state.messages, 
-                                st.user.sub
-                            )
-                        
-                        # Load the selected session
-                        st.session_state.session_id = session["session_id"]
-                        st.session_state.messages = session["messages"]
-                        st.session_state.pending_user_input = None
-                        st.rerun()
+                        open_session(session["session_id"])
+                # Pagination controls
+                if st.session_state.session_page > 0 or has_next_page:
+                    prev_col, next_col = st.columns(2)
+                    with prev_col:
+                        if st.button("← Newer", use_container_width=True, disabled=st.session_state.session_page == 0, key="sessions_newer"):
+                            st.session_state.session_page -= 1
+                            st.rerun()
+                    with next_col:
+                        if st.button("Older →", use_container_width=True, disabled=not has_next_page, key="sessions_older"):
+                            st.session_state.session_page += 1
+                            st.rerun()
+            elif st.session_state.session_page > 0:
+                st.session_state.session_page = 0
+                st.rerun()
             else:
                 st.info("No previous sessions found. Start chatting to create your first session!")
             
@@ -232,23 +322,15 @@ def run_ui():
         # Display chat messages
         for message in st.session_state.messages:
             if message["role"] == "user":
-                st.markdown(f"""
-                    <div class="user-message-container">
-                        <div class="user-message">
-                            {message["content"]}
-                        </div>
-                    </div>
-                """, unsafe_allow_html=True)
+                st.markdown(user_message_html(message["content"]), unsafe_allow_html=True)
             else:
-                # Convert markdown to HTML for bot messages
-                content_html = markdown.markdown(message["content"], extensions=['nl2br'])
-                st.markdown(f"""
-                    <div class="bot-message-container">
-                        <div class="bot-message">
-                            {content_html}
-                        </div>
-                    </div>
-                """, unsafe_allow_html=True)
+                # Bot messages are converted to HTML once and reused on later reruns
+                st.markdown(bot_message_html(render_markdown(message["content"])), unsafe_allow_html=True)
+        if st.session_state.notice:
+            # Shown once with the question it answers, then gone like any unsaved reply
+            st.markdown(user_message_html(st.session_state.notice["question"]), unsafe_allow_html=True)
+            st.markdown(bot_message_html(render_markdown(st.session_state.notice["text"])), unsafe_allow_html=True)
+            st.session_state.notice = None
 
     # Message input and send button (using form to enable Enter key submission)
     with st.form(key="message_form", clear_on_submit=True):
@@ -262,30 +344,38 @@ def run_ui():
     if st.session_state.pending_user_input:
         # Stream bot response
         with chat_container:
-            # Create a placeholder for the streaming response
-            message_placeholder = st.empty()
-            full_response = ""
-            
-            # Stream the response and update the placeholder
-            for chunk in rag.get_response(st.session_state.pending_user_input, st.session_state.session_id):
-                full_response += chunk
-                # Convert markdown to HTML for consistent rendering
-                content_html = markdown.markdown(full_response, extensions=['nl2br'])
-                # Update the placeholder with the accumulated response in styled container
-                message_placeholder.markdown(f"""
-                    <div class="bot-message-container">
-                        <div class="bot-message">
-                            {content_html}
-                        </div>
-                    </div>
-                """, unsafe_allow_html=True)
-        
-        # Add bot message to history
-        st.session_state.messages.append({"role": "bot", "content": full_response})
-        
-        # Save session to database with user_id if logged in
-        user_id = st.user.sub if st.user.is_logged_in else None
-        db.save_session(st.session_state.session_id, st.session_state.messages, user_id)
+            # Stream into a placeholder, redrawing it incrementally at a throttled rate
+            renderer = StreamRenderer(st.empty())
+            # The pending question is the last message; pass the conversation before it as history
+            history = st.session_state.messages[:-1]
+            user_id = st.user.sub if st.user.is_logged_in else None
+            outcome = {}
+            response = get_rag().get_response(
+                st.session_state.pending_user_input,
+                st.session_state.session_id,
+                history,
+                user_id=user_id,
+                on_queued=lambda position: renderer.status(f"Many questions right now, you are #{position} in line..."),
+                outcome=outcome,
+            )
+            for chunk in response:
+                renderer.feed(chunk)
+            full_response = renderer.finish()
+
+        from src.modules.rag import ANSWERED_STATUSES
+        status = outcome.get("status", "ok")
+        if status in ANSWERED_STATUSES:
+            # Add bot message to history
+            st.session_state.messages.append({"role": "bot", "content": full_response})
+
+            # Save session to database with user_id if logged in
+            db.save_session(st.session_state.session_id, st.session_state.messages, user_id)
+        else:
+            # A rejection or error notice is not a reply worth keeping in the conversation:
+            # show it once and leave the unanswered question out of the history
+            question = st.session_state.messages.pop()
+            st.session_state.notice = {"question": question["content"], "text": full_response}
+            logger.info(f"Turn of session {st.session_state.session_id} ended with {status}, not saved")
         
         # Clear pending input
         st.session_state.pending_user_input = None
@@ -0,0 +1,391 @@
+import asyncio
+import atexit
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Optional
+from urllib.parse import urlparse
+import weaviate
+from weaviate.classes.config import Reconfigure, Tokenization
+from weaviate.classes.init import Auth
+from weaviate.classes.tenants import Tenant, TenantActivityStatus
+from langchain_core.embeddings import Embeddings
+from langchain_core.vectorstores import VectorStore
+from langchain_weaviate import WeaviateVectorStore
+from src.config.logs import logger
+from src.modules.bulk_import import WeaviateBulkWriter
+from src.modules.local_index import LocalVectorStore
+
+
+def connection_params(config) -> Optional[dict]:
+    """Parse Config.WEAVIATE_URL into connect_to_custom arguments, None for the local default."""
+    if not config.WEAVIATE_URL:
+        return None
+    url = urlparse(config.WEAVIATE_URL if "://" in config.WEAVIATE_URL else f"http://{config.WEAVIATE_URL}")
+    secure = url.scheme == "https"
+    return {
+        "http_host": url.hostname,
+        "http_port": url.port or (443 if secure else 8080),
+        "http_secure": secure,
+        "grpc_host": url.hostname,
+        "grpc_port": config.WEAVIATE_GRPC_PORT,
+        "grpc_secure": secure,
+        "auth_credentials": Auth.api_key(config.WEAVIATE_API_KEY) if config.WEAVIATE_API_KEY else None,
+    }
+
+
+def connect_weaviate(config) -> weaviate.WeaviateClient:
+    """Connect to the Weaviate instance configured in Config (local by default)."""
+    params = connection_params(config)
+    if params is None:
+        return weaviate.connect_to_local()
+    if params["http_host"].endswith(".weaviate.cloud") or params["http_host"].endswith(".weaviate.network"):
+        return weaviate.connect_to_weaviate_cloud(
+            cluster_url=config.WEAVIATE_URL,
+            auth_credentials=params["auth_credentials"],
+        )
+    return weaviate.connect_to_custom(**params)
+
+
+def async_client(config) -> weaviate.WeaviateAsyncClient:
+    """Create an unconnected async client for the Weaviate instance configured in Config."""
+    params = connection_params(config)
+    if params is None:
+        return weaviate.use_async_with_local()
+    if params["http_host"].endswith(".weaviate.cloud") or params["http_host"].endswith(".weaviate.network"):
+        return weaviate.use_async_with_weaviate_cloud(
+            cluster_url=config.WEAVIATE_URL,
+            auth_credentials=params["auth_credentials"],
+        )
+    return weaviate.use_async_with_custom(**params)
+
+
+QUANTIZATIONS = ("none", "pq", "bq", "sq")
+
+
+def quantizer_config(config) -> Optional[Dict]:
+    """Schema of the configured vector quantizer (Config.WEAVIATE_QUANTIZATION), None when uncompressed."""
+    if config.WEAVIATE_QUANTIZATION not in QUANTIZATIONS:
+        raise ValueError(f"Unknown quantization: {config.WEAVIATE_QUANTIZATION}")
+    if config.WEAVIATE_QUANTIZATION == "none":
+        return None
+    quantizer = {"enabled": True}
+    if config.WEAVIATE_QUANTIZATION in ("pq", "sq"):
+        quantizer["trainingLimit"] = config.WEAVIATE_QUANTIZATION_TRAINING_LIMIT
+    if config.WEAVIATE_QUANTIZATION == "pq" and config.WEAVIATE_PQ_SEGMENTS:
+        quantizer["segments"] = config.WEAVIATE_PQ_SEGMENTS
+    if config.WEAVIATE_QUANTIZATION in ("bq", "sq") and config.WEAVIATE_RESCORE_LIMIT:
+        quantizer["rescoreLimit"] = config.WEAVIATE_RESCORE_LIMIT
+    return quantizer
+
+
+def collection_schema(config, index_name: str = "Documents", text_key: str = "text", multi_tenancy: bool = False) -> Dict:
+    """Collection schema with the HNSW and quantization settings from Config.
+
+    Vectors are computed by the app, so the collection has no vectorizer. The properties
+    retrieval filters on (source, page, date) are declared with filterable indexes; other
+    metadata properties are added by auto-schema on first insert, as with langchain's default.
+    With multi_tenancy every corpus is a tenant, created and reactivated on first use.
+    """
+    index_config = {
+        "distance": "cosine",
+        "ef": config.HNSW_EF,
+        "efConstruction": config.HNSW_EF_CONSTRUCTION,
+        "maxConnections": config.HNSW_MAX_CONNECTIONS,
+    }
+    quantizer = quantizer_config(config)
+    if quantizer is not None:
+        index_config[config.WEAVIATE_QUANTIZATION] = quantizer
+    schema = {
+        "class": index_name,
+        "vectorizer": "none",
+        "vectorIndexType": "hnsw",
+        "vectorIndexConfig": index_config,
+        "properties": [
+            {"name": text_key, "dataType": ["text"]},
+            {"name": "source", "dataType": ["text"], "tokenization": "field", "indexFilterable": True},
+            {"name": "page", "dataType": ["int"], "indexFilterable": True, "indexRangeFilters": True},
+            {"name": "date", "dataType": ["date"], "indexFilterable": True, "indexRangeFilters": True},
+        ],
+    }
+    if multi_tenancy:
+        schema["multiTenancyConfig"] = {"enabled": True, "autoTenantCreation": True, "autoTenantActivation": True}
+    return schema
+
+
+def _quantization(quantizer) -> str:
+    """Name of the quantizer in a collection config ("pq", "bq", ...), "none" if uncompressed."""
+    return type(quantizer).__name__.strip("_").replace("Config", "").lower() if quantizer is not None else "none"
+
+
+def ensure_collection(client: weaviate.WeaviateClient, config, index_name: str = "Documents", text_key: str = "text",
+                      multi_tenancy: bool = False):
+    """Create the collection with the configured index settings, or bring an existing one in line.
+
+    ef and enabling quantization can be changed in place; efConstruction, maxConnections,
+    a different quantizer, the vector size and the tokenization of `source` only take effect
+    on a new collection (see the README for rebuilding one from a snapshot).
+    """
+    if not client.collections.exists(index_name):
+        schema = collection_schema(config, index_name, text_key, multi_tenancy)
+        client.collections.create_from_dict(schema)
+        logger.info(f"Created collection {index_name} with vector index {schema['vectorIndexConfig']}")
+        return
+    collection = client.collections.get(index_name)
+    settings = collection.config.get()
+    source = next((prop for prop in settings.properties if prop.name == "source"), None)
+    if source is not None and source.tokenization != Tokenization.FIELD:
+        # Created before source filters: equality matches any path sharing its words
+        logger.warning(
+            f"Collection {index_name} tokenizes source as {getattr(source.tokenization, 'value', None)}, so source "
+            f"filters are re-checked after each search; rebuild it from a snapshot to filter in the index"
+        )
+    index = settings.vector_index_config
+    if index is None:
+        return
+    if (index.ef_construction, index.max_connections) != (config.HNSW_EF_CONSTRUCTION, config.HNSW_MAX_CONNECTIONS):
+        logger.warning(
+            f"Collection {index_name} was built with efConstruction={index.ef_construction}, "
+            f"maxConnections={index.max_connections}; delete it and re-ingest to apply the configured values"
+        )
+    updates = {}
+    if index.ef != config.HNSW_EF:
+        updates["ef"] = config.HNSW_EF
+    current = _quantization(index.quantizer)
+    if current != config.WEAVIATE_QUANTIZATION:
+        quantizer = quantizer_config(config)
+        if current != "none" or quantizer is None:
+            logger.warning(
+                f"Collection {index_name} uses {current} quantization; delete it and re-ingest to use {config.WEAVIATE_QUANTIZATION}"
+            )
+        else:
+            options = {"trainingLimit": "training_limit", "segments": "segments", "rescoreLimit": "rescore_limit"}
+            updates["quantizer"] = getattr(Reconfigure.VectorIndex.Quantizer, config.WEAVIATE_QUANTIZATION)(
+                **{options[key]: value for key, value in quantizer.items() if key in options}
+            )
+    if updates:
+        collection.config.update(vector_index_config=Reconfigure.VectorIndex.hnsw(**updates))
+        logger.info(f"Updated vector index of collection {index_name}: {', '.join(updates)}")
+
+
+class WeaviateClientManager:
+    """Owns one long-lived, thread-safe Weaviate client with health checks and reconnects."""
+    def __init__(self, config, health_check_interval: float = 30.0):
+        """Initialize the client manager; the connection is opened lazily."""
+        self.config = config
+        self.health_check_interval = health_check_interval
+        self._client: Optional[weaviate.WeaviateClient] = None
+        self._checked_at = 0.0
+        self._vectorstores = {}
+        # Collections already checked against the configured index settings
+        self._collections = set()
+        self._lock = threading.Lock()
+        # The async client is bound to the event loop it was connected on
+        self._async_client: Optional[weaviate.WeaviateAsyncClient] = None
+        self._async_loop = None
+        self._async_lock = None
+        self._close_at_exit = False
+
+    def _healthy(self) -> bool:
+        try:
+            return self._client.is_live()
+        except Exception as e:
+            logger.warning(f"Weaviate health check failed: {e}")
+            return False
+
+    def get(self) -> weaviate.WeaviateClient:
+        """Return a connected client, reconnecting if the last health check failed."""
+        with self._lock:
+            now = time.monotonic()
+            if self._client is not None and now - self._checked_at > self.health_check_interval:
+                self._checked_at = now
+                if not self._healthy():
+                    self._reset()
+            if self._client is None:
+                self._client = connect_weaviate(self.config)
+                self._checked_at = now
+                logger.info("Connected to Weaviate")
+                if not self._close_at_exit:
+                    atexit.register(self.close)
+                    self._close_at_exit = True
+            return self._client
+
+    async def aget(self) -> weaviate.WeaviateAsyncClient:
+        """Return a connected async client for the running event loop."""
+        loop = asyncio.get_running_loop()
+        if self._async_loop is not loop:
+            self._async_loop = loop
+            self._async_client = None
+            self._async_lock = asyncio.Lock()
+        async with self._async_lock:
+            if self._async_client is None:
+                # Stores bound to an earlier async client must not be reused, even if a new
+                # client happens to get the same id
+                self._drop_async_vectorstores()
+                client = async_client(self.config)
+                await client.connect()
+                self._async_client = client
+                logger.info("Connected to Weaviate (async)")
+            return self._async_client
+
+    def vectorstore(self, embeddings: Embeddings, index_name: str = "Documents",
+                    client_async: Optional[weaviate.WeaviateAsyncClient] = None) -> WeaviateVectorStore:
+        """Return a vectorstore bound to the current client, rebuilt only after a reconnect."""
+        client = self.get()
+        with self._lock:
+            key = (id(client), id(client_async), id(embeddings), index_name)
+            if key not in self._vectorstores:
+                if index_name not in self._collections:
+                    ensure_collection(client, self.config, index_name, multi_tenancy=self._multi_tenancy(index_name))
+                    self._collections.add(index_name)
+                self._vectorstores[key] = WeaviateVectorStore(
+                    client=client,
+                    index_name=index_name,
+                    text_key="text",
+                    embedding=embeddings,
+                    client_async=client_async,
+                )
+            return self._vectorstores[key]
+
+    def _multi_tenancy(self, index_name: str) -> bool:
+        """Whether corpora are tenants of this collection (Config.CORPUS_PARTITIONING)."""
+        return self.config.CORPUS_PARTITIONING == "tenants" and index_name == self.config.CORPUS_TENANT_COLLECTION
+
+    def bulk_writer(self, embeddings: Embeddings, index_name: str = "Documents", tenant: Optional[str] = None) -> WeaviateBulkWriter:
+        """Return a bulk writer for the collection (or one of its tenants), creating the collection if needed."""
+        # Building the vectorstore creates the collection if needed
+        self.vectorstore(embeddings, index_name)
+        return WeaviateBulkWriter.from_config(self.get(), index_name, self.config, tenant=tenant)
+
+    def tenant_statuses(self, index_name: str) -> Dict[str, str]:
+        """Activity status ("active", "inactive", "offloaded", ...) of every tenant of a collection."""
+        tenants = self.get().collections.get(index_name).tenants.get()
+        return {name: tenant.activity_status.value.lower() for name, tenant in tenants.items()}
+
+    def set_tenant_status(self, index_name: str, tenants: List[str], status: str):
+        """Activate tenants, deactivate them (vectors leave memory but stay on local disk) or offload them to cloud storage.
+
+        Inactive tenants are reactivated automatically by the next query or write.
+        """
+        if not tenants:
+            return
+        self.get().collections.get(index_name).tenants.update([
+            Tenant(name=tenant, activity_status=TenantActivityStatus[status.upper()]) for tenant in tenants
+        ])
+        logger.info(f"Marked tenants {', '.join(tenants)} of {index_name} {status}")
+
+    async def avectorstore(self, embeddings: Embeddings, index_name: str = "Documents") -> WeaviateVectorStore:
+        """Return a vectorstore whose searches use the async client."""
+        client_async = await self.aget()
+        # Building the store checks the collection schema with the sync client, once per reconnect
+        return await asyncio.to_thread(self.vectorstore, embeddings, index_name, client_async)
+
+    def invalidate(self):
+        """Force a reconnect on the next call, e.g. after a failed request."""
+        with self._lock:
+            self._reset()
+
+    async def ainvalidate(self):
+        """Force a reconnect of both clients on the next call."""
+        await self._aclose_async_client()
+        await asyncio.to_thread(self.invalidate)
+
+    def _drop_async_vectorstores(self):
+        with self._lock:
+            for key in [key for key in self._vectorstores if key[1] != id(None)]:
+                del self._vectorstores[key]
+
+    async def _aclose_async_client(self):
+        client, self._async_client = self._async_client, None
+        self._drop_async_vectorstores()
+        if client is not None:
+            try:
+                await client.close()
+            except Exception as e:
+                logger.warning(f"Error closing async Weaviate client: {e}")
+
+    def _reset(self):
+        if self._client is not None:
+            try:
+                self._client.close()
+            except Exception as e:
+                logger.warning(f"Error closing Weaviate client: {e}")
+        self._client = None
+        self._vectorstores.clear()
+
+    def close(self):
+        """Close the client."""
+        with self._lock:
+            # A closed manager no longer needs closing at exit, nor to be kept alive until then
+            if self._close_at_exit:
+                atexit.unregister(self.close)
+                self._close_at_exit = False
+            if self._client is not None:
+                self._reset()
+                logger.info("Weaviate client closed")
+
+    async def aclose(self):
+        """Close the async client (on its event loop) and the sync client."""
+        await self._aclose_async_client()
+        self.close()
+
+
+class LocalIndexManager:
+    """Same interface as WeaviateClientManager for the in-process local index backend."""
+    def __init__(self, config):
+        """Initialize the local index manager; the index is opened lazily."""
+        self.config = config
+        self._stores = {}
+        self._lock = threading.Lock()
+
+    def vectorstore(self, embeddings: Embeddings, index_name: str = "Documents") -> LocalVectorStore:
+        """Return the memory-mapped local index for `index_name`."""
+        with self._lock:
+            key = (id(embeddings), index_name)
+            if key not in self._stores:
+                self._stores[key] = LocalVectorStore(
+                    f"{self.config.LOCAL_INDEX_PATH}/{index_name}",
+                    embeddings,
+                    ivf_probes=self.config.LOCAL_INDEX_IVF_PROBES,
+                )
+            return self._stores[key]
+
+    async def avectorstore(self, embeddings: Embeddings, index_name: str = "Documents") -> LocalVectorStore:
+        """Same as vectorstore; async searches run the numpy scan in a worker thread."""
+        return self.vectorstore(embeddings, index_name)
+
+    def invalidate(self):
+        """Nothing to reconnect for a local index."""
+
+    async def ainvalidate(self):
+        """Nothing to reconnect for a local index."""
+
+    def close(self):
+        """Close the open indexes."""
+        with self._lock:
+            for store in self._stores.values():
+                store.close()
+            self._stores.clear()
+
+    async def aclose(self):
+        """Close the open indexes."""
+        self.close()
+
+
+def create_store_manager(config):
+    """Return the vectorstore manager for Config.VECTOR_STORE_BACKEND ("weaviate" or "local")."""
+    if config.VECTOR_STORE_BACKEND == "local":
+        return LocalIndexManager(config)
+    if config.VECTOR_STORE_BACKEND != "weaviate":
+        raise ValueError(f"Unknown vector store backend: {config.VECTOR_STORE_BACKEND}")
+    return WeaviateClientManager(config)
+
+
+@contextmanager
+def open_vectorstore(config, embeddings: Embeddings, index_name: str = "Documents") -> Iterator[VectorStore]:
+    """Open the configured vectorstore for a one-off job such as ingestion."""
+    manager = create_store_manager(config)
+    try:
+        yield manager.vectorstore(embeddings, index_name)
+    finally:
+        manager.close()
@@ -0,0 +1,41 @@
+import pytest
+from src.benchmarks.corpus import generate_corpus
+from src.benchmarks.fakes import FakeEmbeddings
+from src.config.config import Config
+from src.modules.load_documents import load_documents
+
+
+def offline_config(tmp_path, **overrides) -> Config:
+    """Configuration without external services: fake models, a local index and files under tmp_path."""
+    settings = {
+        "MODEL_BACKEND": "fake",
+        "VECTOR_STORE_BACKEND": "local",
+        "LOCAL_INDEX_PATH": str(tmp_path / "index"),
+        "MANIFEST_PATH": str(tmp_path / "manifest.json"),
+        "KEYWORD_INDEX_PATH": str(tmp_path / "keywords.db"),
+        "IMPORT_CHECKPOINT_PATH": str(tmp_path / "import_checkpoint.json"),
+        "EMBEDDING_CACHE_PATH": "",
+        "DB_PATH": str(tmp_path / "chat.db"),
+    }
+    settings.update(overrides)
+    return Config(**settings)
+
+
+@pytest.fixture(scope="session")
+def corpus(tmp_path_factory):
+    """Directory of a small synthetic corpus ingested once into a local index (see offline_config)."""
+    tmp_path = tmp_path_factory.mktemp("corpus")
+    generate_corpus(str(tmp_path / "pdfs"), 2, 2)
+    load_documents(str(tmp_path / "pdfs" / "*.pdf"), offline_config(tmp_path), FakeEmbeddings())
+    return tmp_path
+
+
+def corpus_config(corpus, tmp_path, **overrides) -> Config:
+    """offline_config reading the ingested `corpus` and writing everything else under tmp_path."""
+    return offline_config(
+        tmp_path,
+        LOCAL_INDEX_PATH=str(corpus / "index"),
+        MANIFEST_PATH=str(corpus / "manifest.json"),
+        KEYWORD_INDEX_PATH=str(corpus / "keywords.db"),
+        **overrides,
+    )
@@ -0,0 +1,148 @@
+import asyncio
+import threading
+import time
+import pytest
+from src.modules.admission import AdmissionController, AdmissionTimeout, SingleFlight
+
+
+def wait_until(condition, timeout: float = 5.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "condition not reached"
+        time.sleep(0.005)
+
+
+def queue_turns(admission: AdmissionController, users, order, positions):
+    """Start one waiting turn per user id, in order, each recording when it gets a slot."""
+    threads = []
+    for i, user_id in enumerate(users):
+        def turn(user_id=user_id, i=i):
+            with admission.slot(user_id, on_wait=lambda position: positions.setdefault(i, position)):
+                order.append(f"{user_id}{i}")
+        thread = threading.Thread(target=turn)
+        thread.start()
+        threads.append(thread)
+        # Arrivals are serialized so each reports its place before the next one queues
+        wait_until(lambda: i in positions)
+    return threads
+
+
+def test_slots_are_handed_out_round_robin_across_users():
+    admission = AdmissionController(1, queue_timeout=5)
+    order, positions = [], {}
+    with admission.slot("holder"):
+        threads = queue_turns(admission, ["a", "a", "a", "b", "c", "b"], order, positions)
+        assert admission.stats() == {"active": 1, "waiting": 6}
+    for thread in threads:
+        thread.join()
+    # One turn per user per round, first come first served within a user
+    assert order == ["a0", "b3", "c4", "a1", "b5", "a2"]
+    # The place in line reported on arrival is where the turn ended up, given who was already waiting
+    assert positions == {0: 1, 1: 2, 2: 3, 3: 2, 4: 3, 5: 5}
+    assert admission.stats() == {"active": 0, "waiting": 0}
+
+
+def test_timed_out_turn_gives_up_its_place():
+    admission = AdmissionController(1, queue_timeout=0.05)
+    with admission.slot("holder"):
+        with pytest.raises(AdmissionTimeout):
+            with admission.slot("a"):
+                pass
+        assert admission.stats() == {"active": 1, "waiting": 0}
+
+        async def wait():
+            async with admission.aslot("b"):
+                pass
+        with pytest.raises(AdmissionTimeout):
+            asyncio.run(wait())
+        assert admission.stats() == {"active": 1, "waiting": 0}
+    # Nothing leaked: the slot is free again
+    with admission.slot("a") as ticket:
+        assert ticket.granted and ticket.waited < 0.05
+
+
+def test_async_waiters_are_woken_by_thread_releases():
+    admission = AdmissionController(1, queue_timeout=5)
+    release = threading.Event()
+
+    def hold():
+        with admission.slot("holder"):
+            release.wait()
+
+    holder = threading.Thread(target=hold)
+    holder.start()
+    wait_until(lambda: admission.stats()["active"] == 1)
+
+    async def run():
+        positions = []
+
+        async def turn(user_id):
+            async with admission.aslot(user_id, on_wait=positions.append) as ticket:
+                return ticket.waited
+
+        waiting = [asyncio.create_task(turn(user_id)) for user_id in ("a", "b")]
+        await asyncio.sleep(0.02)
+        assert admission.stats() == {"active": 1, "waiting": 2}
+        cancelled = asyncio.create_task(turn("c"))
+        await asyncio.sleep(0.02)
+        cancelled.cancel()
+        await asyncio.gather(cancelled, return_exceptions=True)
+        assert admission.stats()["waiting"] == 2
+        release.set()
+        waited = await asyncio.gather(*waiting)
+        return positions, waited
+
+    positions, waited = asyncio.run(run())
+    holder.join()
+    assert positions[:3] == [1, 2, 3]
+    assert all(seconds > 0 for seconds in waited)
+    assert admission.stats() == {"active": 0, "waiting": 0}
+
+
+def test_followers_replay_the_stream_then_follow_it():
+    flights = SingleFlight()
+    flight, leader = flights.join("key")
+    assert leader
+    follower, leads = flights.join("key")
+    assert follower is flight and not leads
+    flight.publish("a")
+    flight.publish("b")
+    received = []
+    thread = threading.Thread(target=lambda: received.extend(flight.follow()))
+    thread.start()
+
+    async def afollow():
+        return [chunk async for chunk in flight.afollow()]
+
+    async_received = []
+    async_thread = threading.Thread(target=lambda: async_received.extend(asyncio.run(afollow())))
+    async_thread.start()
+    wait_until(lambda: len(received) == 2 and len(flight._waiters) == 1)
+    flight.publish("c")
+    flight.finish(status="llm_error")
+    thread.join()
+    async_thread.join()
+    assert received == async_received == ["a", "b", "c"]
+    assert (flight.done, flight.abandoned, flight.status) == (True, False, "llm_error")
+    flights.leave("key", flight)
+    # A finished flight is not joined again
+    assert flights.join("key")[1]
+
+
+def test_abandoned_leader_ends_the_followers_stream():
+    flights = SingleFlight()
+    flight, _ = flights.join("key")
+    flight.publish("partial")
+    received = []
+    thread = threading.Thread(target=lambda: received.extend(flight.follow()))
+    thread.start()
+    wait_until(lambda: received == ["partial"])
+    flight.finish(abandoned=True)
+    thread.join(timeout=5)
+    assert not thread.is_alive()
+    assert received == ["partial"] and flight.abandoned
+    # The next request for the key leads a new flight instead of following the abandoned one
+    new_flight, leader = flights.join("key")
+    assert leader and new_flight is not flight
+    flights.leave("key", flight)
+    assert flights.join("key") == (new_flight, False)
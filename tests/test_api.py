@@ -0,0 +1,123 @@
+import asyncio
+import json
+import pytest
+from fastapi.testclient import TestClient
+from src.benchmarks.fakes import FakeEmbeddings, FakeLLM
+from src.modules import api
+from src.modules.api import create_app
+from tests.conftest import corpus_config
+
+
+@pytest.fixture
+def llm(monkeypatch):
+    """The fake backend, without the latency it simulates for load tests."""
+    model = FakeLLM(answer_tokens=8)
+    monkeypatch.setattr(api, "create_backends", lambda config: {"embeddings": FakeEmbeddings(), "model": model})
+    return model
+
+
+def client_for(corpus, tmp_path, **overrides) -> TestClient:
+    return TestClient(create_app(corpus_config(corpus, tmp_path, API_HEARTBEAT_INTERVAL=5.0, **overrides)))
+
+
+@pytest.fixture
+def client(corpus, tmp_path, llm):
+    with client_for(corpus, tmp_path) as client:
+        yield client
+
+
+def events(response):
+    """Parse a server-sent event stream into (event, data) pairs."""
+    parsed = []
+    for block in response.text.split("\n\n"):
+        lines = [line for line in block.split("\n") if line and not line.startswith(":")]
+        if lines:
+            event = lines[0][len("event: "):]
+            parsed.append((event, json.loads(lines[1][len("data: "):])))
+    return parsed
+
+
+def chat(client, user, **body):
+    response = client.post("/chat", json={"question": "What do the documents say about retrieval?", **body},
+                           headers={"X-User-Id": user})
+    assert response.status_code == 200, response.text
+    assert response.headers["content-type"].startswith("text/event-stream")
+    return events(response)
+
+
+def test_requests_without_a_user_are_rejected(client):
+    assert client.post("/chat", json={"question": "hi"}).status_code == 401
+    assert client.get("/sessions").status_code == 401
+    assert client.get("/search", params={"q": "hi"}).status_code == 401
+    assert client.get("/sessions/any").status_code == 401
+    assert client.get("/health").status_code == 200
+
+
+def test_bearer_token_is_required_when_configured(corpus, tmp_path, llm):
+    with client_for(corpus, tmp_path, API_AUTH_TOKEN="secret") as client:
+        headers = {"X-User-Id": "alice"}
+        assert client.get("/sessions", headers=headers).status_code == 401
+        assert client.get("/sessions", headers={**headers, "Authorization": "Bearer wrong"}).status_code == 401
+        assert client.get("/sessions", headers={**headers, "Authorization": "Bearer secret"}).status_code == 200
+
+
+def test_chat_streams_and_saves_the_turn(client):
+    stream = chat(client, "alice")
+    kinds = [event for event, _ in stream]
+    assert kinds[0] == "session" and kinds[-1] == "done"
+    assert "token" in kinds
+    session_id = stream[0][1]["session_id"]
+    assert stream[-1][1] == {"session_id": session_id, "status": "ok"}
+    answer = "".join(data["text"] for event, data in stream if event == "token")
+
+    messages = client.get(f"/sessions/{session_id}", headers={"X-User-Id": "alice"}).json()["messages"]
+    assert messages[1] == {"role": "bot", "content": answer}
+
+    # The session continues with its id
+    chat(client, "alice", session_id=session_id, question="And about ranking?")
+    messages = client.get(f"/sessions/{session_id}", headers={"X-User-Id": "alice"}).json()["messages"]
+    assert len(messages) == 4
+    sessions = client.get("/sessions", headers={"X-User-Id": "alice"}).json()["sessions"]
+    assert [session["session_id"] for session in sessions] == [session_id]
+
+
+def test_sessions_are_scoped_to_their_owner(client):
+    session_id = chat(client, "alice")[0][1]["session_id"]
+    bob = {"X-User-Id": "bob"}
+    assert client.get(f"/sessions/{session_id}", headers=bob).status_code == 404
+    assert client.get("/sessions", headers=bob).json()["sessions"] == []
+    assert client.get("/search", params={"q": "retrieval"}, headers=bob).json()["results"] == []
+    assert client.post("/chat", json={"question": "hi", "session_id": session_id}, headers=bob).status_code == 404
+    # Clients cannot pick the id of a new session either
+    assert client.post("/chat", json={"question": "hi", "session_id": "chosen"}, headers=bob).status_code == 404
+    assert client.get("/search", params={"q": "retrieval"}, headers={"X-User-Id": "alice"}).json()["results"]
+
+
+def test_rejected_turn_is_not_saved(corpus, tmp_path, llm):
+    # No generation slot ever frees up
+    with client_for(corpus, tmp_path, LLM_MAX_CONCURRENT=0, LLM_QUEUE_TIMEOUT=0.1) as client:
+        stream = chat(client, "alice")
+        session_id = stream[0][1]["session_id"]
+        assert stream[-1][1]["status"] == "rejected"
+        assert llm.calls == 0
+        # The session exists but the busy notice is not part of it
+        assert client.get(f"/sessions/{session_id}", headers={"X-User-Id": "alice"}).status_code == 404
+        sessions = client.get("/sessions", headers={"X-User-Id": "alice"}).json()["sessions"]
+        assert [(session["session_id"], session["message_count"]) for session in sessions] == [(session_id, 0)]
+
+
+def test_chat_is_rejected_when_all_slots_are_busy(corpus, tmp_path, llm):
+    with client_for(corpus, tmp_path, API_MAX_CONCURRENT_CHATS=2, API_QUEUE_TIMEOUT=0.2) as client:
+        chat(client, "alice")
+        chat(client, "bob")
+        # Every finished stream gave its slot back
+        slots = client.app.state.chat_slots
+        assert slots._value == 2
+
+        calls = llm.calls
+        client.app.state.chat_slots = asyncio.Semaphore(0)
+        response = client.post("/chat", json={"question": "hi"}, headers={"X-User-Id": "alice"})
+        assert response.status_code == 503
+        assert response.headers["Retry-After"] == "1"
+        assert llm.calls == calls
+        client.app.state.chat_slots = slots
@@ -0,0 +1,62 @@
+from langchain_core.documents import Document
+from src.modules.context import _truncate, pack_context
+from src.modules.embeddings import estimate_tokens
+
+
+def chunk(text: str, source: str = "data/a.pdf", page: int = 0, start: int = None) -> Document:
+    metadata = {"source": source, "page": page}
+    if start is not None:
+        metadata["start_index"] = start
+    return Document(page_content=text, metadata=metadata)
+
+
+def sentence(topic: str, words: int = 40) -> str:
+    return " ".join(f"{topic}{i}" for i in range(words)) + "."
+
+
+def test_merges_overlapping_chunks_of_a_page():
+    first = sentence("alpha")
+    # Chunks overlap by their last/first 100 characters, as the splitter leaves them
+    second = first[-100:] + " " + sentence("beta")
+    context, stats = pack_context([chunk(first, start=0), chunk(second, start=len(first) - 100)], 10_000)
+    assert stats["merged"] == 1
+    assert stats["passages"] == 1
+    assert context == f"[1] (a.pdf, p. 1)\n{first} {sentence('beta')}"
+
+
+def test_drops_passages_repeating_a_better_one():
+    text = sentence("alpha", 50)
+    # The same words on another page, with the last four replaced (44 of 48 shingles repeated)
+    similar = " ".join(f"beta{i}" if i >= 46 else f"alpha{i}" for i in range(50)) + "."
+    documents = [chunk(text), chunk(similar, page=3), chunk(sentence("gamma"), source="data/b.pdf")]
+    context, stats = pack_context(documents, 10_000)
+    assert stats["duplicates"] == 1
+    assert context.startswith("[1] (a.pdf, p. 1)")
+    assert "[2] (b.pdf, p. 1)" in context
+    # A stricter threshold keeps it
+    context, stats = pack_context(documents, 10_000, duplicate_threshold=0.95)
+    assert stats["duplicates"] == 0
+    assert "[2] (a.pdf, p. 4)" in context
+
+
+def test_stays_within_the_token_budget():
+    documents = [chunk(sentence(f"topic{n}x", 120), page=n) for n in range(6)]
+    for budget in (150, 450, 1000):
+        context, stats = pack_context(documents, budget)
+        assert stats["tokens_packed"] <= budget
+        assert stats["candidates"] == 6
+    # What does not fit whole is truncated if enough budget is left, else dropped
+    context, stats = pack_context(documents, 450)
+    last = context.split("\n\n")[-1]
+    assert last.endswith(" …")
+    assert stats["passages"] == len(context.split("\n\n")) == 2
+    _, stats = pack_context(documents, estimate_tokens(sentence("topic0x", 120)) + 20)
+    assert stats["passages"] == 1
+
+
+def test_truncates_at_a_boundary_or_hard_cut():
+    text = "First sentence here. Second sentence that goes on and on and on."
+    assert _truncate(text, 8) == "First sentence here. …"
+    assert _truncate("word " * 20, 3) == "word word …"
+    # No sentence end and no space: cut where the budget ends
+    assert _truncate("x" * 100, 5) == "x" * 20 + " …"
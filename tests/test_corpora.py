@@ -0,0 +1,110 @@
+import datetime
+import json
+import sqlite3
+from types import SimpleNamespace
+import pytest
+from langchain_core.documents import Document
+from weaviate.classes.config import Tokenization
+from src.benchmarks.fakes import FakeEmbeddings, FakeLLM
+from src.config.logs import logger
+from src.modules.corpora import MetadataFilter, resolve_corpus
+from src.modules.rag import Rag
+from src.modules.retrieval import Retriever
+from src.modules.vectorstore import ensure_collection
+from tests.conftest import offline_config
+
+CHUNKS = [
+    {"source": "data/a.pdf", "page": 0, "date": "2024-03-01T12:00:00Z"},
+    {"source": "data/a.pdf", "page": 4, "date": "2024-03-01T12:00:00Z"},
+    {"source": "data/a.pdf/b.pdf", "page": 1, "date": "2024-03-02T00:00:00Z"},
+    {"source": "data/c.pdf", "page": 2},
+]
+FILTERS = [
+    ({"sources": ["data/a.pdf"]}, [0, 1]),
+    ({"sources": ["data/c.pdf", "data/a.pdf/b.pdf"]}, [2, 3]),
+    ({"page_from": 2, "page_to": 3}, [2, 3]),
+    ({"page_from": 5}, [1]),
+    ({"date_from": "2024-03-02"}, [2]),
+    ({"date_to": "2024-03-01"}, [0, 1]),
+    ({"sources": "data/a.pdf", "page_to": 1, "date_from": "2024-01-01"}, [0]),
+]
+
+
+@pytest.mark.parametrize("filters, expected", FILTERS)
+def test_sql_and_python_filters_agree(filters, expected):
+    metadata_filter = MetadataFilter.from_dict(filters)
+    conn = sqlite3.connect(":memory:")
+    conn.execute("CREATE TABLE chunks (id INTEGER, metadata TEXT)")
+    conn.executemany("INSERT INTO chunks VALUES (?, ?)", [(i, json.dumps(m)) for i, m in enumerate(CHUNKS)])
+    where, params = metadata_filter.to_sql()
+    assert [row[0] for row in conn.execute(f"SELECT id FROM chunks WHERE {where} ORDER BY id", params)] == expected
+    assert [i for i, metadata in enumerate(CHUNKS) if metadata_filter.matches(metadata)] == expected
+
+
+def test_weaviate_filter_uses_zero_based_pages_and_day_bounds():
+    single = MetadataFilter.from_dict({"sources": ["data/a.pdf"]}).to_weaviate()
+    assert (single.target, single.operator.value, single.value) == ("source", "Equal", "data/a.pdf")
+    combined = MetadataFilter.from_dict({
+        "sources": ["data/a.pdf", "data/b.pdf"], "page_from": 2, "page_to": 3, "date_from": "2024-03-01", "date_to": "2024-03-01",
+    }).to_weaviate()
+    sources, page_from, page_to, date_from, date_to = combined.filters
+    assert [(f.target, f.value) for f in sources.filters] == [("source", "data/a.pdf"), ("source", "data/b.pdf")]
+    assert (page_from.operator.value, page_from.value) == ("GreaterThanEqual", 1)
+    assert (page_to.operator.value, page_to.value) == ("LessThanEqual", 2)
+    utc = datetime.timezone.utc
+    assert (date_from.operator.value, date_from.value) == ("GreaterThanEqual", datetime.datetime(2024, 3, 1, tzinfo=utc))
+    assert (date_to.operator.value, date_to.value) == ("LessThan", datetime.datetime(2024, 3, 2, tzinfo=utc))
+    assert MetadataFilter().to_weaviate() is None
+    with pytest.raises(ValueError):
+        MetadataFilter.from_dict({"author": "x"})
+
+
+class StaticStore:
+    """Vectorstore returning fixed results, as a collection that ignored part of the filter."""
+    def __init__(self, docs):
+        self.docs = docs
+
+    def similarity_search(self, question, k, **kwargs):
+        return self.docs[:k]
+
+
+def test_vector_results_outside_the_filter_are_dropped(tmp_path):
+    docs = [Document(page_content=f"chunk {i}", metadata=metadata) for i, metadata in enumerate(CHUNKS)]
+    retriever = Retriever(offline_config(tmp_path, RETRIEVAL_MODE="vector"))
+    filters = MetadataFilter.from_dict({"sources": ["data/a.pdf"]})
+    assert [d.page_content for d in retriever.retrieve(StaticStore(docs), "q", k=4, filters=filters)] == ["chunk 0", "chunk 1"]
+    assert len(retriever.retrieve(StaticStore(docs), "q", k=4)) == 4
+
+
+def fake_client(tokenization):
+    settings = SimpleNamespace(
+        properties=[SimpleNamespace(name="text", tokenization=Tokenization.WORD), SimpleNamespace(name="source", tokenization=tokenization)],
+        vector_index_config=None,
+    )
+    collection = SimpleNamespace(config=SimpleNamespace(get=lambda: settings))
+    return SimpleNamespace(collections=SimpleNamespace(exists=lambda name: True, get=lambda name: collection))
+
+
+@pytest.mark.parametrize("tokenization, warned", [(Tokenization.WORD, True), (Tokenization.FIELD, False)])
+def test_warns_about_word_tokenized_sources(tmp_path, monkeypatch, tokenization, warned):
+    warnings = []
+    monkeypatch.setattr(logger, "warning", warnings.append)
+    ensure_collection(fake_client(tokenization), offline_config(tmp_path))
+    assert any("tokenizes source as word" in w for w in warnings) == warned
+
+
+def test_idle_corpora_can_only_be_made_inactive(tmp_path):
+    config = offline_config(tmp_path, CORPUS_IDLE_SECONDS=60, CORPUS_IDLE_STATUS="offloaded")
+    with pytest.raises(ValueError, match="CORPUS_IDLE_STATUS"):
+        Rag(config, embeddings=FakeEmbeddings(), model=FakeLLM())
+
+
+def test_resolves_corpus_collections_and_files(tmp_path):
+    config = offline_config(tmp_path)
+    default = resolve_corpus(config)
+    assert (default.name, default.index_name, default.tenant) == ("default", "Documents", None)
+    law = resolve_corpus(config, "law")
+    assert law.index_name == "Documents_law"
+    assert law.config.MANIFEST_PATH == str(tmp_path / "manifest.law.json")
+    with pytest.raises(ValueError):
+        resolve_corpus(config, "../etc")
@@ -0,0 +1,173 @@
+import json
+import sqlite3
+import threading
+import pytest
+from src.modules.db import Database
+
+
+def turn(i: int):
+    return [{"role": "user", "content": f"question {i}"}, {"role": "bot", "content": f"answer {i}"}]
+
+
+@pytest.fixture
+def db(tmp_path):
+    db = Database(str(tmp_path / "chat_history.db"))
+    db.init_db()
+    return db
+
+
+def stored_seqs(db: Database, session_id: str):
+    return [row[0] for row in db._connection().execute(
+        "SELECT seq FROM messages WHERE session_id = ? ORDER BY seq", (session_id,)
+    )]
+
+
+def test_save_session_appends_only_new_messages(db):
+    messages = turn(0)
+    db.save_session("s", messages, "alice")
+    messages += turn(1)
+    db.save_session("s", messages, "alice")
+    db.save_session("s", messages, "alice")
+    assert db.get_session("s") == messages
+    assert stored_seqs(db, "s") == [0, 1, 2, 3]
+    session, = db.get_user_sessions("alice")
+    assert session["message_count"] == 4
+    assert session["preview"] == "question 0"
+
+
+def test_append_messages_continues_the_sequence(db):
+    db.append_messages("s", turn(0), "alice")
+    db.append_messages("s", turn(1))
+    assert db.get_session("s") == turn(0) + turn(1)
+    # The owner is kept when later appends do not name one
+    assert db.get_session_owner("s") == (True, "alice")
+    assert db.get_session_owner("missing") == (False, None)
+
+
+def test_concurrent_saves_of_one_session(db):
+    conversation = [message for i in range(5) for message in turn(i)]
+    errors = []
+
+    def save(upto: int):
+        try:
+            # Each thread has its own connection
+            db.save_session("s", conversation[:upto], "alice")
+            db.append_messages("t", turn(upto), "alice")
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=save, args=(upto,)) for upto in range(2, 11, 2) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert errors == []
+    assert db.get_session("s") == conversation
+    assert stored_seqs(db, "t") == list(range(2 * len(threads)))
+
+
+def test_migrates_message_blobs(tmp_path):
+    path = str(tmp_path / "chat_history.db")
+    conn = sqlite3.connect(path)
+    conn.execute("""
+        CREATE TABLE sessions (
+            pk INTEGER PRIMARY KEY AUTOINCREMENT,
+            session_id TEXT NOT NULL UNIQUE,
+            user_id TEXT,
+            messages TEXT NOT NULL,
+            dt_created TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+    conn.executemany(
+        "INSERT INTO sessions (session_id, user_id, messages, dt_created) VALUES (?, ?, ?, ?)",
+        [
+            ("old", "alice", json.dumps(turn(0) + turn(1)), "2024-01-01 10:00:00"),
+            ("empty", "alice", json.dumps([]), "2024-01-02 10:00:00"),
+            ("other", "bob", json.dumps(turn(2)), "2024-01-03 10:00:00"),
+        ],
+    )
+    conn.commit()
+    conn.close()
+
+    db = Database(path)
+    db.init_db()
+    columns = [row[1] for row in db._connection().execute("PRAGMA table_info(sessions)")]
+    assert "messages" not in columns
+    assert db.get_session("old") == turn(0) + turn(1)
+    assert db.get_session("empty") == []
+    sessions = db.get_user_sessions("alice")
+    assert [(s["session_id"], s["message_count"], s["preview"]) for s in sessions] == [
+        ("empty", 0, ""),
+        ("old", 4, "question 0"),
+    ]
+    assert sessions[1]["dt_created"] == "2024-01-01 10:00:00"
+    assert sessions[1]["dt_updated"] is not None
+    assert db.get_history_summary("old") == ("", 0)
+    # Messages stored before the search index existed are searchable
+    assert [r["session_id"] for r in db.search_messages("bob", "answer 2")] == ["other"]
+
+    # Migrated sessions keep growing from where they were, and migrating again is a no-op
+    db.save_session("old", turn(0) + turn(1) + turn(3), "alice")
+    Database(path).init_db()
+    assert stored_seqs(db, "old") == list(range(6))
+
+
+def test_search_ranks_and_highlights_matches(db):
+    db.save_session("s", [
+        {"role": "user", "content": "How do I rotate the Weaviate API key?"},
+        {"role": "bot", "content": "Rotate the key in the console, then update the key in your settings."},
+        {"role": "user", "content": "Thanks"},
+    ], "alice")
+    results = db.search_messages("alice", "rotate ke")
+    # Every term must match, the last one as a prefix; best matches first
+    assert sorted((r["seq"], r["role"]) for r in results) == [(0, "user"), (1, "bot")]
+    assert results[0]["score"] >= results[1]["score"]
+    question, = [r for r in results if r["seq"] == 0]
+    assert question["snippet"] == "How do I <mark>rotate</mark> the Weaviate API <mark>key</mark>?"
+    assert question["preview"] == "How do I rotate the Weaviate API key?"
+    bold, = db.search_messages("alice", "weaviate", highlight=("**", "**"), snippet_tokens=3)
+    assert bold["snippet"] == "…the **Weaviate** API…"
+    assert db.search_messages("alice", "rotate missing") == []
+    assert db.search_messages("alice", " ?! ") == []
+
+
+def test_search_only_sees_the_callers_messages(db):
+    db.save_session("a", [{"role": "user", "content": "shared term alpha"}], "alice")
+    db.save_session("b", [{"role": "user", "content": "shared term beta"}], "bob")
+    # Saved before its user was known, then claimed
+    db.append_messages("c", [{"role": "user", "content": "shared term gamma"}])
+    assert db.search_messages("carol", "shared") == []
+    assert [r["session_id"] for r in db.search_messages("bob", "shared")] == ["b"]
+    assert db.search_messages("bob", "alpha") == []
+    db.append_messages("c", [{"role": "bot", "content": "ok"}], "alice")
+    assert sorted(r["session_id"] for r in db.search_messages("alice", "shared")) == ["a", "c"]
+    # Another user's name in the query does not reach their messages
+    assert db.search_messages("alice", "owner beta") == []
+
+
+def test_migrates_unscoped_search_index(tmp_path):
+    path = str(tmp_path / "chat_history.db")
+    db = Database(path)
+    db.init_db()
+    db.save_session("a", turn(0), "alice")
+    db.save_session("b", turn(0), "bob")
+    conn = sqlite3.connect(path)
+    # Index and messages as they were before searches were scoped by owner
+    conn.executescript("""
+        DROP TRIGGER messages_fts_insert;
+        DROP TRIGGER messages_fts_delete;
+        DROP TRIGGER messages_fts_update;
+        DROP TABLE messages_fts;
+        ALTER TABLE messages DROP COLUMN owner;
+        CREATE VIRTUAL TABLE messages_fts USING fts5(content, content='messages', content_rowid='pk');
+        INSERT INTO messages_fts (messages_fts) VALUES ('rebuild');
+    """)
+    conn.close()
+
+    db = Database(path)
+    db.init_db()
+    columns = [row[1] for row in db._connection().execute("PRAGMA table_info(messages_fts)")]
+    assert columns == ["content", "owner"]
+    assert [r["session_id"] for r in db.search_messages("alice", "answer")] == ["a"]
+    db.save_session("b", turn(0) + turn(1), "bob")
+    assert [r["seq"] for r in db.search_messages("bob", "answer")] == [3, 1]
@@ -0,0 +1,150 @@
+import pytest
+from src.benchmarks.fakes import FakeEmbeddings
+from src.config.config import Config
+from src.modules import embeddings
+from src.modules.embeddings import BatchEmbeddings, EmbeddingCache, call_with_retry, is_transient_error
+
+
+class FlakyEmbeddings(FakeEmbeddings):
+    """Fake embeddings failing the first `failures` requests with `error`."""
+    def __init__(self, failures: int, error: Exception = RuntimeError("429 RESOURCE_EXHAUSTED: quota exceeded")):
+        super().__init__(size=32)
+        self.failures = failures
+        self.error = error
+
+    def embed_documents(self, texts):
+        if self.failures:
+            self.failures -= 1
+            raise self.error
+        return super().embed_documents(texts)
+
+
+@pytest.fixture
+def sleeps(monkeypatch):
+    """Record backoff delays instead of sleeping; jitter is pinned to its maximum."""
+    delays = []
+    monkeypatch.setattr(embeddings.time, "sleep", delays.append)
+    monkeypatch.setattr(embeddings.random, "random", lambda: 1.0)
+    return delays
+
+
+def failing(errors):
+    """Function raising the given errors in turn, then returning "ok"."""
+    errors = list(errors)
+    calls = []
+
+    def fn(*args):
+        calls.append(args)
+        if errors:
+            raise errors.pop(0)
+        return "ok"
+    fn.calls = calls
+    return fn
+
+
+def test_transient_errors():
+    assert is_transient_error(RuntimeError("429 Too Many Requests"))
+    assert is_transient_error(RuntimeError("503 Service Unavailable"))
+    assert is_transient_error(TimeoutError("read timed out"))
+    assert not is_transient_error(ValueError("400 invalid argument"))
+
+
+def test_call_with_retry_backs_off_exponentially(sleeps):
+    fn = failing([RuntimeError("429")] * 3)
+    assert call_with_retry(fn, "a", retries=5, base_delay=1.0) == "ok"
+    assert fn.calls == [("a",)] * 4
+    assert sleeps == [1.0, 2.0, 4.0]
+
+
+def test_call_with_retry_caps_delay(sleeps):
+    fn = failing([RuntimeError("503")] * 4)
+    call_with_retry(fn, retries=5, base_delay=1.0, max_delay=3.0)
+    assert sleeps == [1.0, 2.0, 3.0, 3.0]
+
+
+def test_call_with_retry_jitter(monkeypatch, sleeps):
+    monkeypatch.setattr(embeddings.random, "random", lambda: 0.0)
+    call_with_retry(failing([RuntimeError("429")] * 2), base_delay=2.0)
+    assert sleeps == [1.0, 2.0]
+
+
+def test_call_with_retry_gives_up(sleeps):
+    fn = failing([RuntimeError("429")] * 10)
+    with pytest.raises(RuntimeError):
+        call_with_retry(fn, retries=2)
+    assert len(fn.calls) == 3
+    assert len(sleeps) == 2
+
+
+def test_call_with_retry_does_not_retry_permanent_errors(sleeps):
+    fn = failing([ValueError("400 invalid argument")])
+    with pytest.raises(ValueError):
+        call_with_retry(fn)
+    assert len(fn.calls) == 1
+    assert sleeps == []
+
+
+def test_batch_embeddings_retries_transient_errors(sleeps):
+    backend = FlakyEmbeddings(failures=2)
+    texts = [f"chunk {i}" for i in range(5)]
+    layer = BatchEmbeddings(backend, "fake", batch_size=10)
+    assert layer.embed_documents(texts) == FakeEmbeddings(size=32).embed_documents(texts)
+    assert backend.calls == 1
+    assert len(sleeps) == 2
+    assert layer.stats["requests"] == 1
+
+
+def test_batch_embeddings_raises_permanent_errors(sleeps):
+    layer = BatchEmbeddings(FlakyEmbeddings(failures=1, error=ValueError("400 invalid argument")), "fake")
+    with pytest.raises(ValueError):
+        layer.embed_documents(["chunk"])
+    assert sleeps == []
+
+
+def test_batch_embeddings_batches_and_deduplicates():
+    backend = FakeEmbeddings(size=32)
+    layer = BatchEmbeddings(backend, "fake", batch_size=50, concurrency=2)
+    texts = [f"chunk {i}" for i in range(120)] + ["chunk 0", "chunk 1"]
+    vectors = layer.embed_documents(texts)
+    assert vectors == backend.embed_documents(texts)
+    assert layer.stats["requests"] == 3
+    assert layer.stats["embedded"] == 120
+
+
+def test_batch_embeddings_cache_hits(tmp_path):
+    path = str(tmp_path / "embeddings_cache.db")
+    texts = [f"chunk {i}" for i in range(10)]
+
+    cache = EmbeddingCache(path)
+    first = BatchEmbeddings(FakeEmbeddings(size=32), "fake", cache=cache)
+    expected = first.embed_documents(texts)
+    cache.close()
+
+    # A new process sees the vectors written by the previous one
+    cache = EmbeddingCache(path)
+    backend = FakeEmbeddings(size=32)
+    second = BatchEmbeddings(backend, "fake", cache=cache)
+    assert second.embed_documents(texts) == expected
+    assert backend.calls == 0
+    assert second.stats["cached"] == 10
+
+    # Only the misses are sent upstream
+    second.embed_documents(texts + ["new chunk"])
+    assert backend.calls == 1
+    assert second.stats["embedded"] == 1
+
+    # Vectors of another model are not reused
+    other = BatchEmbeddings(backend, "other", cache=cache)
+    other.embed_documents(texts)
+    assert other.stats["cached"] == 0
+    cache.close()
+
+
+def test_batch_embeddings_from_config(tmp_path):
+    config = Config(EMBEDDING_CACHE_PATH=str(tmp_path / "cache.db"), EMBED_BATCH_SIZE=7, EMBEDDING_DIMENSIONS=256)
+    layer = BatchEmbeddings.from_config(FakeEmbeddings(size=32), config)
+    assert layer.batch_size == 7
+    assert layer.model_name.endswith("@256")
+    assert layer.cache is not None
+    layer.cache.close()
+    assert BatchEmbeddings.from_config(FakeEmbeddings(size=32), Config(EMBEDDING_CACHE_PATH="")).cache is None
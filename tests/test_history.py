@@ -0,0 +1,132 @@
+import threading
+import pytest
+from src.benchmarks.fakes import FakeLLM
+from src.modules.db import Database
+from src.modules.embeddings import estimate_tokens
+from src.modules.history import HistoryManager
+
+
+def conversation(turns: int, words: int = 10):
+    """Alternating user/bot messages, each `words` words long and numbered."""
+    messages = []
+    for i in range(turns * 2):
+        role = "user" if i % 2 == 0 else "bot"
+        messages.append({"role": role, "content": f"m{i} " + " ".join(["word"] * (words - 1))})
+    return messages
+
+
+def wait_for_folds(timeout: float = 5.0):
+    """Wait for the background folds started so far."""
+    for thread in threading.enumerate():
+        if thread.name.startswith("history-fold-"):
+            thread.join(timeout)
+            assert not thread.is_alive()
+
+
+@pytest.fixture
+def db(tmp_path):
+    db = Database(str(tmp_path / "chat_history.db"))
+    db.init_db()
+    return db
+
+
+@pytest.fixture
+def model():
+    return FakeLLM(answer_tokens=5)
+
+
+def test_short_conversation_is_verbatim(db, model):
+    history = HistoryManager(model, db, max_turns=6, token_budget=2000)
+    messages = conversation(2)
+    assert history.build("s", messages) == "\n".join(f"{m['role']}: {m['content']}" for m in messages)
+    assert model.calls == 0
+
+
+def test_window_respects_turns_and_budget(db, model):
+    history = HistoryManager(model, db, max_turns=2, token_budget=2000, summary_batch=100)
+    messages = conversation(6)
+    assert history._window_start(messages) == len(messages) - 4
+
+    tokens = estimate_tokens(messages[-1]["content"])
+    history = HistoryManager(model, db, max_turns=6, token_budget=tokens * 3, summary_batch=100)
+    assert history._window_start(messages) == len(messages) - 3
+
+
+def test_messages_waiting_for_a_fold_stay_verbatim(db, model):
+    messages = conversation(4)
+    db.save_session("s", messages, "alice")
+    # Only the last 2 messages fit the window, the 6 before it wait for a batch of 10
+    history = HistoryManager(model, db, max_turns=1, token_budget=2000, summary_batch=10)
+    chat_history = history.build("s", messages)
+    for message in messages:
+        assert message["content"] in chat_history
+    wait_for_folds()
+    assert model.calls == 0
+    assert db.get_history_summary("s") == ("", 0)
+
+
+def test_full_batch_is_folded_in_the_background(db, model):
+    messages = conversation(4)
+    db.save_session("s", messages, "alice")
+    history = HistoryManager(model, db, max_turns=1, token_budget=2000, summary_batch=6)
+    first = history.build("s", messages)
+    # The batch is still verbatim in the turn that starts the fold
+    assert messages[0]["content"] in first
+    wait_for_folds()
+    summary, summarized = db.get_history_summary("s")
+    assert summary and summarized == 6
+    assert model.calls == 1
+
+    second = history.build("s", messages)
+    assert second.startswith(f"Summary of the earlier conversation: {summary}")
+    assert messages[5]["content"] not in second
+    assert messages[6]["content"] in second and messages[7]["content"] in second
+
+
+def test_messages_over_budget_are_folded_before_answering(db, model):
+    messages = conversation(6)
+    db.save_session("s", messages, "alice")
+    tokens = estimate_tokens(messages[-1]["content"])
+    # Window of 2 messages; the 10 waiting ones exceed the budget on their own
+    history = HistoryManager(model, db, max_turns=1, token_budget=tokens * 2, summary_batch=100)
+    chat_history = history.build("s", messages)
+    summary, summarized = db.get_history_summary("s")
+    assert summarized == 10
+    assert chat_history.startswith(f"Summary of the earlier conversation: {summary}")
+    assert model.calls == 1
+
+
+def test_unsaved_session_is_not_folded_in_the_background(db, model):
+    messages = conversation(4)
+    history = HistoryManager(model, db, max_turns=1, token_budget=2000, summary_batch=2)
+    chat_history = history.build("new", messages)
+    wait_for_folds()
+    assert model.calls == 0
+    assert messages[0]["content"] in chat_history
+
+    # Once the turn is saved the next one folds
+    db.save_session("new", messages, "alice")
+    history.build("new", messages)
+    wait_for_folds()
+    assert db.get_history_summary("new")[1] == 6
+
+
+def test_fold_skips_session_already_folding(db, model):
+    messages = conversation(4)
+    db.save_session("s", messages, "alice")
+    history = HistoryManager(model, db)
+    history._folding.add("s")
+    assert history.fold("s", messages, 6) is None
+    history._folding.clear()
+    summary, upto = history.fold("s", messages, 6)
+    assert upto == 6 and db.get_history_summary("s") == (summary, 6)
+    # Nothing new to fold
+    assert history.fold("s", messages, 4) == (summary, 6)
+    assert model.calls == 1
+
+
+def test_fold_of_missing_session_is_not_saved(db, model):
+    history = HistoryManager(model, db)
+    summary, upto = history.fold("missing", conversation(3), 4)
+    assert summary and upto == 4
+    assert db.get_history_summary("missing") == ("", 0)
@@ -0,0 +1,32 @@
+import os
+from src.benchmarks.corpus import generate_corpus
+from src.benchmarks.fakes import FakeEmbeddings
+from src.modules.load_documents import load_documents
+from tests.conftest import offline_config
+
+
+class FailingEmbeddings(FakeEmbeddings):
+    def embed_documents(self, texts):
+        raise ValueError("malformed request")
+
+
+def test_reports_what_each_run_did(tmp_path):
+    paths = generate_corpus(str(tmp_path / "pdfs"), 2, 2)
+    pattern = str(tmp_path / "pdfs" / "*.pdf")
+    config = offline_config(tmp_path)
+    stats = load_documents(pattern, config, FakeEmbeddings())
+    assert stats["corpus"] == config.CORPUS
+    assert (stats["documents"], stats["deleted"], stats["failed"]) == (2, 0, 0)
+    assert stats["chunks"] > 0
+    # Nothing changed: zero counts, not the None of a failed run
+    assert load_documents(pattern, config, FakeEmbeddings()) == {
+        "corpus": config.CORPUS, "documents": 0, "deleted": 0, "chunks": 0, "resumed": 0, "failed": 0,
+    }
+    os.remove(paths[0])
+    stats = load_documents(pattern, config, FakeEmbeddings())
+    assert (stats["documents"], stats["deleted"], stats["chunks"]) == (0, 1, 0)
+
+
+def test_failed_run_returns_none(tmp_path):
+    generate_corpus(str(tmp_path / "pdfs"), 1, 1)
+    assert load_documents(str(tmp_path / "pdfs" / "*.pdf"), offline_config(tmp_path), FailingEmbeddings()) is None
@@ -0,0 +1,109 @@
+import os
+import numpy as np
+import pytest
+from src.benchmarks.fakes import FakeEmbeddings
+from src.modules.corpora import MetadataFilter
+from src.modules.local_index import LocalVectorStore
+
+DIM = 16
+
+
+def vectors(n: int, seed: int = 0) -> np.ndarray:
+    return np.random.default_rng(seed).normal(size=(n, DIM)).astype(np.float32)
+
+
+def add(store: LocalVectorStore, matrix: np.ndarray, first: int = 0, source: str = "a.pdf"):
+    ids = [f"id{first + i}" for i in range(len(matrix))]
+    texts = [f"text {first + i}" for i in range(len(matrix))]
+    metadatas = [{"source": source, "page": (first + i) % 4} for i in range(len(matrix))]
+    return store.add_vectors(matrix, texts, metadatas, ids)
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = LocalVectorStore(str(tmp_path / "index"), FakeEmbeddings(size=DIM))
+    yield store
+    store.close()
+
+
+def nearest(store: LocalVectorStore, query: np.ndarray, k: int = 1, **kwargs):
+    return [doc.page_content for doc in store.similarity_search_by_vector(list(query), k=k, **kwargs)]
+
+
+def test_added_vectors_are_found_and_persisted(store, tmp_path):
+    matrix = vectors(20)
+    add(store, matrix)
+    assert len(store) == 20
+    assert nearest(store, matrix[7]) == ["text 7"]
+    doc, score = store._documents(store.search_by_vector(list(matrix[7]), 1))[0]
+    assert doc.id == "id7" and doc.metadata == {"source": "a.pdf", "page": 3}
+    assert score == pytest.approx(1.0)
+    reopened = LocalVectorStore(store.path, FakeEmbeddings(size=DIM))
+    assert len(reopened) == 20
+    assert nearest(reopened, matrix[12], k=2)[0] == "text 12"
+    reopened.close()
+    with pytest.raises(ValueError):
+        store.add_vectors(vectors(1)[:, :8], ["x"], [{}], ["x"])
+
+
+def test_re_added_id_replaces_the_old_row(store):
+    matrix = vectors(10)
+    add(store, matrix)
+    other = LocalVectorStore(store.path, FakeEmbeddings(size=DIM))
+    replacement = vectors(1, seed=1)
+    store.add_vectors(replacement, ["new text 3"], [{"source": "a.pdf"}], ["id3"])
+    assert len(store) == 10
+    assert nearest(store, replacement[0]) == ["new text 3"]
+    assert "text 3" not in nearest(store, matrix[3], k=10)
+    # Another handle on the index (another process) picks the change up on its next search
+    assert nearest(other, replacement[0]) == ["new text 3"]
+    assert len(other) == 10
+    other.close()
+
+
+def test_deleted_rows_are_skipped_then_compacted_away(store):
+    matrix = vectors(10)
+    add(store, matrix)
+    store.delete(["id2", "id5", "missing"])
+    assert len(store) == 8
+    assert not {"text 2", "text 5"} & set(nearest(store, matrix[2], k=10))
+    size = os.path.getsize(store._vectors_path)
+    store.compact()
+    assert os.path.getsize(store._vectors_path) == size * 8 // 10
+    assert len(store) == 8 and len(store._deleted) == 8
+    assert nearest(store, matrix[9]) == ["text 9"]
+    assert [ids for ids, _, _, _ in store.iter_chunks(batch_size=3)] == [
+        ["id0", "id1", "id3"], ["id4", "id6", "id7"], ["id8", "id9"],
+    ]
+    with pytest.raises(ValueError):
+        store.delete()
+
+
+def test_ivf_search_with_filters_and_later_rows(store):
+    matrix = vectors(200)
+    add(store, matrix)
+    exact = [nearest(store, query, k=5) for query in matrix[:20]]
+    store.build_ivf(8)
+    assert store._centroids is not None and len(store._assignments) == 200
+    # Probing every list is exact
+    store.ivf_probes = 8
+    assert [nearest(store, query, k=5) for query in matrix[:20]] == exact
+    store.ivf_probes = 2
+    assert sum(nearest(store, query)[0] == f"text {i}" for i, query in enumerate(matrix[:20])) == 20
+
+    # Rows added after the index was built are assigned to their nearest list, here and on reopen
+    later = vectors(30, seed=2)
+    add(store, later, first=200, source="b.pdf")
+    assert len(store._assignments) == 230
+    assert np.array_equal(store._assignments[200:], np.argmax(later / np.linalg.norm(later, axis=1, keepdims=True) @ store._centroids.T, axis=1))
+    assert all(nearest(store, query) == [f"text {200 + i}"] for i, query in enumerate(later))
+    reopened = LocalVectorStore(store.path, FakeEmbeddings(size=DIM), ivf_probes=2)
+    assert np.array_equal(reopened._assignments, store._assignments)
+    reopened.close()
+
+    # A filter scores exactly the matching rows, whichever lists they are in
+    only_b = MetadataFilter.from_dict({"sources": ["b.pdf"], "page_from": 2, "page_to": 2})
+    hits = store.similarity_search_by_vector(list(matrix[0]), k=50, filter=only_b)
+    assert sorted(int(doc.id[2:]) for doc in hits) == [i for i in range(200, 230) if i % 4 == 1]
+    store.delete(["id201"])
+    assert "text 201" not in [doc.page_content for doc in store.similarity_search_by_vector(list(later[1]), k=50, filter=only_b)]
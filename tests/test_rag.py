@@ -0,0 +1,146 @@
+import asyncio
+import threading
+import time
+import pytest
+from src.benchmarks.fakes import FakeEmbeddings, FakeLLM
+from src.config.metrics import metrics
+from src.modules.db import Database
+from src.modules.rag import INTERRUPTED_MESSAGE, Rag
+from tests.conftest import corpus_config
+
+QUESTION = "What do the documents say about retrieval?"
+
+
+@pytest.fixture
+def counters(monkeypatch):
+    """Enable metrics for the test and return a function reading a counter."""
+    monkeypatch.setattr(metrics, "enabled", True)
+    monkeypatch.setattr(metrics, "_counters", {})
+
+    def counter(name: str, **labels) -> float:
+        key = name + ("{" + ",".join(f'{k}="{v}"' for k, v in sorted(labels.items())) + "}" if labels else "")
+        return metrics.snapshot()["counters"].get(key, 0)
+    return counter
+
+
+@pytest.fixture
+def rag(corpus, tmp_path):
+    db = Database(str(tmp_path / "chat.db"))
+    db.init_db()
+    rag = Rag(corpus_config(corpus, tmp_path), embeddings=FakeEmbeddings(), model=FakeLLM(answer_tokens=8), db=db)
+    yield rag
+    rag.close()
+
+
+def ask(rag: Rag, question: str = QUESTION, session_id: str = "s"):
+    outcome = {}
+    answer = "".join(rag.get_response(question, session_id, [], outcome=outcome))
+    return answer, outcome["status"]
+
+
+def aask(rag: Rag, question: str = QUESTION, session_id: str = "s"):
+    async def run():
+        outcome = {}
+        answer = "".join([chunk async for chunk in rag.aget_response(question, session_id, [], outcome=outcome)])
+        return answer, outcome["status"]
+    return asyncio.run(run())
+
+
+@pytest.mark.parametrize("respond", [ask, aask])
+def test_answers_then_serves_from_cache(rag, respond):
+    answer, status = respond(rag)
+    assert answer and status == "ok"
+    assert rag.model.calls == 1
+    assert respond(rag) == (answer, "cache_hit")
+    assert rag.model.calls == 1
+
+
+def test_sync_and_async_answers_match(rag):
+    answer, _ = ask(rag)
+    rag.answer_cache.clear()
+    rag.retrieval_cache.clear()
+    assert aask(rag) == (answer, "ok")
+
+
+@pytest.mark.parametrize("respond", [ask, aask])
+def test_retrieval_errors_are_reported_and_counted(rag, respond, counters, monkeypatch):
+    def broken(*args, **kwargs):
+        raise RuntimeError("index unavailable")
+    monkeypatch.setattr(rag.retriever, "retrieve", broken)
+    monkeypatch.setattr(rag.retriever, "aretrieve", broken)
+    answer, status = respond(rag)
+    assert status == "retrieval_error"
+    assert "index unavailable" in answer
+    assert counters("rag_errors_total", stage="retrieval") == 1
+    assert rag.model.calls == 0
+
+
+@pytest.mark.parametrize("respond", [ask, aask])
+def test_generation_errors_are_reported_and_counted(rag, respond, counters, monkeypatch):
+    def broken(*args, **kwargs):
+        raise ValueError("400 invalid argument")
+    monkeypatch.setattr(rag, "_generation_chain", broken)
+    answer, status = respond(rag)
+    assert status == "llm_error"
+    assert "invalid argument" in answer
+    assert counters("rag_errors_total", stage="llm") == 1
+    # Failed answers are not cached
+    assert respond(rag)[1] == "llm_error"
+
+
+def test_async_turn_checks_the_corpus_version_off_the_event_loop(rag, monkeypatch):
+    threads = []
+    current_version = rag._current_corpus_version
+
+    def recording(corpus):
+        threads.append(threading.current_thread())
+        return current_version(corpus)
+    monkeypatch.setattr(rag, "_current_corpus_version", recording)
+    aask(rag)
+    assert threads and threading.main_thread() not in threads
+
+
+def test_abandoned_async_turn_is_cancelled_not_failed(rag, counters):
+    async def run():
+        outcome = {}
+        stream = rag.aget_response(QUESTION, "s", [], outcome=outcome)
+        await stream.__anext__()
+        await stream.aclose()
+        return outcome["status"]
+    rag.model.tokens_per_second = 100
+    assert asyncio.run(run()) == "cancelled"
+    assert counters("rag_cancelled_total") == 1
+    assert counters("rag_errors_total", stage="retrieval") == 0
+    # The partial answer was not cached
+    assert ask(rag)[1] == "ok"
+
+
+def stream(*chunks):
+    yield from chunks
+
+
+def test_follower_answers_itself_when_the_leader_leaves_before_answering(rag):
+    flight, _ = rag.flights.join("key")
+    turn = {"status": "ok"}
+    received = []
+    follower = threading.Thread(target=lambda: received.extend(rag._shared("key", lambda: stream("own ", "answer"), turn)))
+    follower.start()
+    # Whether the follower joined before or after, it ends up producing the answer
+    rag._lead("key", flight, False, {"status": "cancelled"})
+    follower.join(timeout=5)
+    assert received == ["own ", "answer"] and turn["status"] == "ok"
+
+
+def test_follower_is_interrupted_when_the_leader_leaves_mid_answer(rag):
+    flight, _ = rag.flights.join("key")
+    flight.publish("partial")
+    turn = {"status": "ok"}
+    received = []
+    follower = threading.Thread(target=lambda: received.extend(rag._shared("key", lambda: stream("unused"), turn)))
+    follower.start()
+    deadline = time.monotonic() + 5
+    while not received and time.monotonic() < deadline:
+        time.sleep(0.005)
+    rag._lead("key", flight, False, {"status": "cancelled"})
+    follower.join(timeout=5)
+    assert received == ["partial", INTERRUPTED_MESSAGE] and turn["status"] == "interrupted"
@@ -0,0 +1,56 @@
+import re
+import pytest
+from src.modules import render
+from src.modules.render import IncrementalMarkdown, to_html
+
+ANSWER = """Intro paragraph with **bold** text.
+
+- first item
+- second item
+
+  continued item
+
+1. numbered
+2. list
+
+```python
+def f():
+
+    return 1
+```
+
+> quoted
+
+Closing paragraph.
+"""
+
+
+def normalized(html: str) -> str:
+    return re.sub(r">\s+<", "><", html.strip())
+
+
+@pytest.mark.parametrize("size", [1, 3, 7, 64, len(ANSWER)])
+def test_streamed_html_matches_the_whole_answer(size):
+    document = IncrementalMarkdown()
+    for i in range(0, len(ANSWER), size):
+        document.append(ANSWER[i:i + size])
+        assert normalized(document.html()) == normalized(to_html(document.text))
+    assert document.text == ANSWER
+    # Everything up to the closing paragraph was finalized
+    assert document._html_parts
+    assert normalized(document.html()).endswith("<p>Closing paragraph.</p>")
+
+
+def test_blocks_inside_a_code_fence_stay_open(monkeypatch):
+    converted = []
+    monkeypatch.setattr(render, "to_html", lambda text: converted.append(text) or text)
+    document = IncrementalMarkdown()
+    document.append("Before.\n\n```\n")
+    for i in range(200):
+        document.append(f"line {i}\n\n")
+    assert converted == ["Before."]
+    # Each chunk scans only the lines it completes
+    assert document._scanned == len(document.text)
+    document.append("```\n\nAfter.")
+    assert converted == ["Before.", document.text[len("Before.\n\n"):document.text.index("```\n\nAfter.") + 3]]
+    assert document.html().endswith("After.")
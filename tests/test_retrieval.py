@@ -0,0 +1,102 @@
+import pytest
+from langchain_core.documents import Document
+from src.config.config import Config
+from src.modules.corpora import MetadataFilter
+from src.modules.keyword_index import KeywordIndex, keyword_query
+from src.modules.retrieval import Retriever, reciprocal_rank_fusion
+from tests.conftest import offline_config
+
+
+def doc(name: str, source: str = "a.pdf") -> Document:
+    return Document(page_content=name, metadata={"source": source})
+
+
+def names(docs):
+    return [d.page_content for d in docs]
+
+
+def test_rrf_favours_documents_ranked_by_both_lists():
+    vector = [doc("a"), doc("b"), doc("c")]
+    keyword = [doc("d"), doc("c"), doc("e")]
+    # c: 1/63 + 1/62 beats a: 1/61 alone; then the first places of each list
+    assert names(reciprocal_rank_fusion([vector, keyword], k=60)) == ["c", "a", "d", "b", "e"]
+    # A heavier keyword list moves its documents ahead
+    assert names(reciprocal_rank_fusion([vector, keyword], k=60, weights=[1.0, 2.0]))[:2] == ["c", "d"]
+
+
+def test_rrf_ties_keep_first_seen_order_and_chunks_are_matched_by_source_and_text():
+    vector = [doc("a"), doc("b")]
+    keyword = [doc("x"), doc("y")]
+    # Equal scores: the vector list's document comes first at each rank
+    assert names(reciprocal_rank_fusion([vector, keyword])) == ["a", "x", "b", "y"]
+    # Same text in another file is another chunk
+    fused = reciprocal_rank_fusion([[doc("a")], [doc("a", "b.pdf"), doc("a")]])
+    assert [(d.page_content, d.metadata["source"]) for d in fused] == [("a", "a.pdf"), ("a", "b.pdf")]
+
+
+def test_keyword_query_keeps_significant_terms_once():
+    assert keyword_query("What does the paper say about HNSW and hnsw graphs?") == '"hnsw" OR "graphs"'
+    assert keyword_query("what is it?") == ""
+
+
+@pytest.fixture
+def index(tmp_path):
+    index = KeywordIndex(str(tmp_path / "keywords.db"))
+    yield index
+    index.close()
+
+
+def test_keyword_index_add_replace_remove(index):
+    index.add(
+        ["1", "2", "3"],
+        ["HNSW graphs index vectors", "BM25 ranks keyword matches", "HNSW ef trades recall for speed"],
+        [{"source": "a.pdf", "page": 0}, {"source": "a.pdf", "page": 1}, {"source": "b.pdf", "page": 0}],
+    )
+    assert len(index) == 3
+    assert sorted(d.id for d in index.search("hnsw")) == ["1", "3"]
+    assert [d.id for d in index.search("hnsw", filters=MetadataFilter.from_dict({"sources": ["b.pdf"]}))] == ["3"]
+    scored = index.search_with_score("recall speed hnsw")
+    assert scored[0][0].id == "3" and scored[0][1] > scored[1][1] > 0
+    # Re-adding an id replaces the chunk, in the table and in the full-text index
+    index.add(["1"], ["IVF lists partition vectors"], [{"source": "a.pdf", "page": 0}])
+    assert len(index) == 3
+    assert [d.id for d in index.search("hnsw")] == ["3"]
+    assert [d.page_content for d in index.search("ivf")] == ["IVF lists partition vectors"]
+    index.delete(["3", "missing"])
+    assert index.search("hnsw") == [] and len(index) == 2
+    # Punctuation and FTS syntax in a question are plain text
+    assert index.search('"C++" AND (vectors') != []
+
+
+def test_keyword_index_records_sources(index, tmp_path):
+    index.record_source("a.pdf", "hash1")
+    index.record_source("b.pdf", "hash2")
+    index.record_source("a.pdf", "hash3")
+    assert index.source_hashes() == {"a.pdf": "hash3", "b.pdf": "hash2"}
+    index.remove_source("b.pdf")
+    reopened = KeywordIndex(index.path)
+    assert reopened.source_hashes() == {"a.pdf": "hash3"}
+    reopened.close()
+
+
+class StaticStore:
+    def __init__(self, docs):
+        self.docs = docs
+
+    def similarity_search(self, question, k, **kwargs):
+        return self.docs[:k]
+
+
+def test_retriever_modes(index, tmp_path):
+    assert Config.model_fields["RETRIEVAL_MODE"].default == "hybrid"
+    index.add(["k1", "k2"], ["keyword only chunk", "shared chunk"], [{"source": "a.pdf"}, {"source": "a.pdf"}])
+    store = StaticStore([doc("vector only chunk"), doc("shared chunk")])
+    hybrid = Retriever(offline_config(tmp_path), index)
+    assert hybrid.mode == "hybrid"
+    assert names(hybrid.retrieve(store, "chunk", k=3)) == ["shared chunk", "vector only chunk", "keyword only chunk"]
+    # Without a keyword index hybrid retrieval falls back to vector search
+    assert Retriever(offline_config(tmp_path)).mode == "vector"
+    keyword = Retriever(offline_config(tmp_path, RETRIEVAL_MODE="keyword"), index)
+    assert names(keyword.retrieve(store, "keyword", k=3)) == ["keyword only chunk"]
+    with pytest.raises(ValueError):
+        Retriever(offline_config(tmp_path, RETRIEVAL_MODE="semantic"))
@@ -0,0 +1,94 @@
+import pytest
+from src.benchmarks.corpus import generate_corpus
+from src.benchmarks.fakes import FakeEmbeddings
+from src.modules import snapshot
+from src.modules.cache import CorpusVersion
+from src.modules.corpora import resolve_corpus
+from src.modules.keyword_index import KeywordIndex
+from src.modules.load_documents import load_documents
+from src.modules.local_index import LocalVectorStore
+from src.modules.manifest import IngestionManifest
+from src.modules.snapshot import SnapshotError, export_snapshot, import_snapshot
+from tests.conftest import offline_config
+
+
+def ingest(tmp_path, name: str, documents: int, seed: int = 0):
+    """Config of a local corpus under tmp_path/name holding `documents` synthetic PDFs."""
+    generate_corpus(str(tmp_path / name / "pdfs"), documents, 2, seed=seed)
+    config = offline_config(tmp_path / name)
+    assert load_documents(str(tmp_path / name / "pdfs" / "*.pdf"), config, FakeEmbeddings()) is not None
+    return config
+
+
+def contents(config):
+    store = LocalVectorStore(f"{config.LOCAL_INDEX_PATH}/{resolve_corpus(config).index_name}", FakeEmbeddings())
+    # Vectors are normalized again on import, up to float rounding
+    chunks = {ids[i]: (texts[i], vectors[i].round(5).tolist()) for ids, texts, _, vectors in store.iter_chunks() for i in range(len(ids))}
+    store.close()
+    return chunks
+
+
+def sources(config):
+    index = KeywordIndex(config.KEYWORD_INDEX_PATH)
+    try:
+        return index.source_hashes(), len(index)
+    finally:
+        index.close()
+
+
+def test_round_trip_replaces_the_target_corpus(tmp_path):
+    source = ingest(tmp_path, "source", 2)
+    exported = export_snapshot(str(tmp_path / "snapshot"), source)
+    exported.verify()
+    # The target holds another file that the snapshot does not have
+    target = ingest(tmp_path, "target", 1, seed=7)
+    replaced = contents(target)
+    assert replaced
+    stats = import_snapshot(str(tmp_path / "snapshot"), target)
+    assert (stats["chunks"], stats["failed"], stats["removed"]) == (exported.count, 0, len(replaced))
+    assert contents(target) == contents(source)
+    assert sources(target) == sources(source)
+    assert IngestionManifest(target.MANIFEST_PATH).load().entries == IngestionManifest(source.MANIFEST_PATH).load().entries
+    with pytest.raises(FileExistsError):
+        export_snapshot(str(tmp_path / "snapshot"), source)
+
+
+def test_refuses_corrupted_snapshots_and_other_models(tmp_path):
+    source = ingest(tmp_path, "source", 1)
+    export_snapshot(str(tmp_path / "snapshot"), source)
+    target = offline_config(tmp_path / "target")
+    with pytest.raises(SnapshotError, match="come from"):
+        import_snapshot(str(tmp_path / "snapshot"), offline_config(tmp_path / "target", EMBEDDING_DIMENSIONS=8))
+    with open(tmp_path / "snapshot" / "chunks.db", "ab") as f:
+        f.write(b"\0")
+    with pytest.raises(SnapshotError, match="corrupted"):
+        import_snapshot(str(tmp_path / "snapshot"), target)
+
+
+def test_partly_failed_import_updates_the_manifest(tmp_path, monkeypatch):
+    source = ingest(tmp_path, "source", 2)
+    export_snapshot(str(tmp_path / "snapshot"), source)
+    target = ingest(tmp_path, "target", 1, seed=7)
+    version = CorpusVersion(target.MANIFEST_PATH)
+    before = version.get()
+    failing_source = sorted(IngestionManifest(source.MANIFEST_PATH).load().entries)[0]
+    writer = snapshot._writer
+
+    def failing_writer(*args):
+        write = writer(*args)
+
+        def write_some(ids, texts, metadatas, vectors):
+            keep = [i for i, metadata in enumerate(metadatas) if metadata["source"] != failing_source]
+            write([ids[i] for i in keep], [texts[i] for i in keep], [metadatas[i] for i in keep], vectors[keep])
+            return [ids[i] for i in range(len(ids)) if i not in keep]
+        return write_some
+    monkeypatch.setattr(snapshot, "_writer", failing_writer)
+    stats = import_snapshot(str(tmp_path / "snapshot"), target)
+    assert stats["failed"] > 0
+    # The other file is restored and the target's own file is gone; the failed file is left to ingestion
+    manifest = IngestionManifest(target.MANIFEST_PATH).load()
+    assert list(manifest.entries) == [source for source in IngestionManifest(source.MANIFEST_PATH).load().entries if source != failing_source]
+    assert version.get() != before
+    assert set(sources(target)[0]) == set(manifest.entries)
+    stored = contents(target)
+    assert stored and all(text for text, _ in stored.values())
@@ -0,0 +1,177 @@
+import asyncio
+import gc
+import http.server
+import threading
+import urllib.request
+import weakref
+import pytest
+from src.benchmarks.fakes import FakeEmbeddings
+from src.config.config import Config
+from src.modules import vectorstore
+from src.modules.vectorstore import WeaviateClientManager
+
+
+class StubHandler(http.server.BaseHTTPRequestHandler):
+    """Answers Weaviate's liveness probe with the status set on the server."""
+    def do_GET(self):
+        status = self.server.live_status if self.path == "/v1/.well-known/live" else 404
+        self.send_response(status)
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+    def log_message(self, format, *args):
+        pass
+
+
+class StubServer:
+    """Stand-in Weaviate server that can report itself unhealthy or go away."""
+    def __init__(self):
+        self._server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), StubHandler)
+        self._server.live_status = 200
+        self.url = f"http://127.0.0.1:{self._server.server_address[1]}"
+        threading.Thread(target=self._server.serve_forever, kwargs={"poll_interval": 0.05}, daemon=True).start()
+
+    def set_live(self, live: bool):
+        self._server.live_status = 200 if live else 503
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+
+class StubClient:
+    """Client probing the stub server like `WeaviateClient.is_live`."""
+    def __init__(self, url: str):
+        self.url = url
+        self.closed = False
+
+    def is_live(self) -> bool:
+        with urllib.request.urlopen(f"{self.url}/v1/.well-known/live", timeout=2) as response:
+            return response.status == 200
+
+    def close(self):
+        self.closed = True
+
+
+class StubAsyncClient(StubClient):
+    async def connect(self):
+        pass
+
+    async def close(self):
+        self.closed = True
+
+
+@pytest.fixture
+def server():
+    server = StubServer()
+    yield server
+    server.stop()
+
+
+@pytest.fixture
+def clients(monkeypatch, server):
+    """Every client the manager connects, in order."""
+    created = []
+
+    def connect(config):
+        assert config.WEAVIATE_URL == server.url
+        created.append(StubClient(config.WEAVIATE_URL))
+        return created[-1]
+
+    def use_async(config):
+        created.append(StubAsyncClient(config.WEAVIATE_URL))
+        return created[-1]
+
+    monkeypatch.setattr(vectorstore, "connect_weaviate", connect)
+    monkeypatch.setattr(vectorstore, "async_client", use_async)
+    monkeypatch.setattr(vectorstore, "ensure_collection", lambda *args, **kwargs: None)
+    monkeypatch.setattr(vectorstore, "WeaviateVectorStore", lambda **kwargs: kwargs)
+    return created
+
+
+@pytest.fixture
+def manager(server, clients):
+    manager = WeaviateClientManager(Config(WEAVIATE_URL=server.url), health_check_interval=0)
+    yield manager
+    manager.close()
+
+
+def test_reuses_healthy_client(manager, clients):
+    client = manager.get()
+    assert manager.get() is client
+    assert len(clients) == 1
+    assert not client.closed
+
+
+def test_reconnects_when_server_is_not_live(manager, server, clients):
+    first = manager.get()
+    server.set_live(False)
+    second = manager.get()
+    assert second is not first
+    assert first.closed
+    assert len(clients) == 2
+
+
+def test_reconnects_when_server_is_unreachable(manager, server, clients):
+    first = manager.get()
+    server.stop()
+    assert manager.get() is not first
+    assert first.closed
+
+
+def test_skips_health_check_within_interval(server, clients):
+    manager = WeaviateClientManager(Config(WEAVIATE_URL=server.url), health_check_interval=3600)
+    client = manager.get()
+    server.set_live(False)
+    assert manager.get() is client
+    manager.close()
+    assert client.closed
+
+
+def test_vectorstore_rebuilt_after_reconnect(manager, server):
+    embeddings = FakeEmbeddings(size=8)
+    store = manager.vectorstore(embeddings)
+    assert manager.vectorstore(embeddings) is store
+    server.set_live(False)
+    rebuilt = manager.vectorstore(embeddings)
+    assert rebuilt is not store
+    server.set_live(True)
+    assert rebuilt["client"] is manager.get()
+
+
+def test_invalidate_forces_reconnect(manager, clients):
+    first = manager.get()
+    manager.invalidate()
+    assert first.closed
+    assert manager.get() is not first
+
+
+def test_close_releases_manager(server, clients):
+    manager = WeaviateClientManager(Config(WEAVIATE_URL=server.url))
+    client = manager.get()
+    manager.close()
+    assert client.closed
+    # The atexit hook no longer keeps a closed manager alive
+    ref = weakref.ref(manager)
+    del manager
+    gc.collect()
+    assert ref() is None
+
+
+def test_async_reconnect_drops_async_vectorstores(manager, clients):
+    embeddings = FakeEmbeddings(size=8)
+
+    async def run():
+        store = await manager.avectorstore(embeddings)
+        assert await manager.avectorstore(embeddings) is store
+        first = store["client_async"]
+        await manager.ainvalidate()
+        assert first.closed
+        rebuilt = await manager.avectorstore(embeddings)
+        assert rebuilt is not store
+        assert rebuilt["client_async"] is not first
+        await manager.aclose()
+        return rebuilt["client_async"]
+
+    assert asyncio.run(run()).closed
+    assert manager._vectorstores == {}